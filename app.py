@@ -1,15 +1,6 @@
 import streamlit as st
-from langchain_ollama import ChatOllama
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
-
-# --- CONFIGURATION ---
-LLM_MODEL = "llama3"
-DB_PATH = "./chroma_storage"
-COLLECTION_NAME = "local_brain_docs"
+from module8_rag import timed_stream
+from module14_resources import VECTOR_BACKEND, get_chat_pipeline, get_embedder, get_session_store
 
 # 1. UI PAGE SETUP
 st.set_page_config(page_title="LOCAL_BRAIN Agent", page_icon="🧠", layout="centered")
@@ -17,56 +8,30 @@ st.title("🧠 LOCAL_BRAIN")
 st.caption("Secure, Local RAG Agent running on CPU/GPU")
 
 # 2. CACHE THE HEAVY LIFTING
-# @st.cache_resource ensures the DB and LLM only load ONCE when the app starts.
-@st.cache_resource
-def load_rag_pipeline():
-    # Embeddings & Memory
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    vector_store = Chroma(
-        collection_name=COLLECTION_NAME,
-        persist_directory=DB_PATH,
-        embedding_function=embeddings
-    )
-    retriever = vector_store.as_retriever(search_kwargs={"k": 1})
-    
-    # Brain
-    llm = ChatOllama(model=LLM_MODEL, temperature=0.1)
-    
-    # Prompt Blueprint
-    template = """
-    You are 'LOCAL_BRAIN', a secure, locally-hosted AI agent.
-    Answer the user's question based ONLY on the following context. 
-    If you do not know the answer based on the context, say "I don't have that information in my local memory."
-    
-    Context:
-    {context}
-
-    Question: {question}
-
-    Answer:
-    """
-    prompt = PromptTemplate.from_template(template)
-    
-    def format_docs(docs):
-        return "\n\n".join(doc.page_content for doc in docs)
-        
-    # Assemble Chain
-    rag_chain = (
-        {"context": retriever | format_docs, "question": RunnablePassthrough()}
-        | prompt
-        | llm
-        | StrOutputParser()
-    )
-    return rag_chain
-
-# Initialize the pipeline
+# The shared registry (Module 14) ensures the model, DB and LLM only load ONCE per process,
+# across reruns and browser sessions, just like @st.cache_resource did.
+# The chat pipeline (Module 26) is retriever + llama3 + prompt, plus the conversation
+# history kept server-side, so follow-up questions know what came before. It shares
+# the semantic answer cache (Module 13) with the API's single-shot chain.
 with st.spinner("Initializing Local Brain..."):
-    chain = load_rag_pipeline()
+    chat = get_chat_pipeline()
+
+# Show how much work the embedding cache is saving
+with st.sidebar:
+    st.caption(f"Vector backend: {VECTOR_BACKEND} (set VECTOR_BACKEND=chroma|numpy|numpy-ivf|numpy-int8|numpy-binary)")
+    cache_stats = get_embedder().stats()
+    st.caption(f"Embedding cache: {cache_stats['hits_memory'] + cache_stats['hits_disk']} hits / {cache_stats['misses']} misses")
+    if st.button("New conversation"):
+        st.session_state.pop("session_id", None)
+        st.session_state.messages = []
 
 # 3. SESSION STATE (Chat History)
-# This keeps track of the conversation so it doesn't disappear when you hit enter
+# st.session_state.messages is only what the page renders; the history the
+# LLM sees (summary + recent turns) lives in the server-side session store.
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "session_id" not in st.session_state:
+    st.session_state.session_id = get_session_store().create()
 
 # Render past messages
 for message in st.session_state.messages:
@@ -84,10 +49,19 @@ if user_query := st.chat_input("Ask a question about your documents..."):
 
     # Generate and display AI response
     with st.chat_message("assistant"):
-        with st.spinner("Searching local memory..."):
-            # We invoke the LangChain pipeline we built
-            response = chain.invoke(user_query)
-            st.markdown(response)
+        # We stream the LangChain pipeline we built: tokens render as soon as
+        # llama3 produces them instead of after the whole answer is finished.
+        timings, info = {}, {}
+        response = st.write_stream(timed_stream(chat.stream(st.session_state.session_id, user_query, info), timings))
+        context = info["context"]
+        caption = (f"First token: {timings.get('ttft_s', 0):.2f}s · Total: {timings.get('total_s', 0):.2f}s"
+                   f" · Prompt: {context['prompt_tokens']} tokens ({context['packed']}/{context['candidates']} chunks,"
+                   f" {info['history']['history_turns']} earlier turns)")
+        if info.get("cache_hit"):
+            caption += " · Answered from the semantic cache"
+        if info["standalone_query"] != user_query:
+            caption += f" · Searched for: {info['standalone_query']}"
+        st.caption(caption)
     
     # Save response to history
     st.session_state.messages.append({"role": "assistant", "content": response})
\ No newline at end of file
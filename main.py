@@ -1,27 +1,134 @@
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from module2_ingest import process_data_pipeline # Importing your logic from Module 2!
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
+from typing import Literal, Optional
+import os
+from module2_ingest import iter_chunks, file_fingerprint # Importing your logic from Module 2!
+from module18_chunking import CHUNK_TOKENS, OVERLAP_TOKENS, SentenceChunker
+from module19_bulk_ingest import JOB_WORKERS
+from module8_rag import atimed_stream
+from module24_observability import (
+    PROFILE_SLOW_MS, MetricsMiddleware, SamplingProfiler, configure_logging, health_summary, logger, metrics
+)
+import module14_resources as resources
+import json
 import uvicorn
 
+# --- CONFIGURATION ---
+# PRELOAD=1 loads models, DB and llama3 at startup instead of on the first request.
+PRELOAD = os.getenv("PRELOAD", "0") == "1"
+# RESUME_JOBS=1 restarts bulk ingestion jobs that were interrupted by a crash or restart.
+# With several workers, each job is resumed by exactly one of them (per-job file lock, Module 19).
+RESUME_JOBS = os.getenv("RESUME_JOBS", "1") == "1"
+
+# Every heavy object (embedding model, Chroma, LLM, RAG chain) comes from the
+# shared registry in Module 14: loaded once per worker and reused by all requests.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()
+    if PRELOAD:
+        report = await run_in_threadpool(resources.warm_up)
+        logger.info(f"Worker warm in {report['seconds']}s (peak RSS {report['peak_rss_mb']} MB)")
+    if RESUME_JOBS:
+        resumed = resources.get_job_manager().resume_unfinished()
+        if resumed:
+            logger.info(f"Resumed ingestion jobs: {resumed}")
+    yield
+
 # 1. INITIALIZE THE APP
 app = FastAPI(
     title="Local GenAI Agent",
     description="A production-grade local RAG API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
+# Trace IDs, request/stage metrics and (PROFILE_SLOW_MS > 0) hot stacks of slow requests (Module 24)
+app.add_middleware(MetricsMiddleware, profiler=SamplingProfiler() if PROFILE_SLOW_MS > 0 else None)
 
 # 2. DEFINE DATA MODELS (The Contract)
 # This ensures that if someone sends bad data, the API rejects it automatically.
-class IngestRequest(BaseModel):
+class ChunkingOptions(BaseModel):
+    strategy: Literal["sentence", "fixed"] = "sentence" # Sentence/token-aware (Module 18) or fixed-size characters
+    chunk_size: int = Field(200, gt=0) # Characters per chunk, "fixed" strategy only
+    chunk_tokens: int = Field(CHUNK_TOKENS, gt=0, le=256) # MiniLM reads at most 256 tokens
+    overlap_tokens: int = Field(OVERLAP_TOKENS, ge=0)
+
+class IngestRequest(ChunkingOptions):
     filename: str
-    chunk_size: int = 200 # Default value if not provided
+    force: bool = False # Re-embed every chunk, ignoring the ingestion manifest
+
+class BulkIngestRequest(ChunkingOptions):
+    pattern: str = Field(..., min_length=1) # Glob or directory relative to data/, e.g. "reports/**/*.txt"
+    workers: int = Field(JOB_WORKERS, gt=0, le=32) # Files ingested concurrently
+    force: bool = False
+
+class QueryRequest(BaseModel):
+    question: str = Field(..., min_length=1)
+    stream: bool = True # Server-Sent Events; False returns one JSON body
+
+class ChatRequest(BaseModel):
+    session_id: Optional[str] = None # Omit to start a new conversation
+    question: str = Field(..., min_length=1)
+    stream: bool = True
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 # 3. DEFINE ENDPOINTS (The Counter)
 
 @app.get("/health")
 def health_check():
-    """Simple ping to check if server is alive."""
-    return {"status": "ok", "service": "local-genai-agent"}
+    """Liveness plus uptime, load and error counters (never loads anything)."""
+    return {
+        "status": "ok",
+        "service": "local-genai-agent",
+        "resources_loaded": resources.loaded(),
+        "load_seconds": dict(resources.load_seconds),
+        **health_summary()
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Per-stage counters and latency histograms in the Prometheus text format."""
+    # Cache counters live in their own objects; copy them in as gauges at scrape time
+    if "embedder" in resources.loaded():
+        for name, value in resources.get_embedder().stats().items():
+            if isinstance(value, (int, float)):
+                metrics.set_gauge(f"rag_embedding_cache_{name}", value)
+    if "answer_cache" in resources.loaded():
+        for name, value in resources.get_answer_cache().stats().items():
+            metrics.set_gauge(f"rag_answer_cache_{name}", value)
+    if "rag_chain" in resources.loaded():
+        chain = resources.get_rag_chain()
+        batcher = getattr(chain.retriever, "batcher", None)
+        if batcher is not None:
+            metrics.set_gauge("rag_batcher_queue_depth", batcher.stats()["queue_depth"])
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/store/stats")
+def store_stats():
+    """Size of the columnar chunk store (read from Parquet footers, no chunk text loaded)."""
+    return resources.get_chunk_store().stats()
+
+@app.get("/batching/stats")
+def batching_stats():
+    """Queue depth and batch-size metrics of the query micro-batcher (Module 22), once the chain is loaded."""
+    if "rag_chain" not in resources.loaded():
+        return {"enabled": None, "detail": "RAG chain not loaded yet"}
+    batcher = getattr(resources.get_rag_chain().retriever, "batcher", None)
+    return {"enabled": batcher is not None, **(batcher.stats() if batcher is not None else {})}
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Embedding (and, once loaded, answer and re-rank score) cache hit/miss counters for this worker."""
+    stats = {"embedding_cache": resources.get_embedder().stats()}
+    if "answer_cache" in resources.loaded():
+        stats["answer_cache"] = resources.get_answer_cache().stats()
+    if "reranker" in resources.loaded():
+        stats["rerank_cache"] = resources.get_reranker().stats()
+    return stats
 
 @app.post("/ingest")
 def run_ingestion(request: IngestRequest):
@@ -29,26 +136,167 @@ def run_ingestion(request: IngestRequest):
     Triggers the ETL pipeline for a specific file.
     """
     try:
-        print(f"--- API REQUEST: Ingesting {request.filename} ---")
+        logger.info(f"Ingesting {request.filename}")
+        
+        # Reuse the logic you built in Module 2, in streaming mode:
+        # only one small batch of chunks is held in memory at a time.
+        # PDF, DOCX, HTML, Markdown and CSV files go through Module 28's extractors.
+        chunker = None
+        if request.strategy == "sentence":
+            try:
+                chunker = SentenceChunker(request.chunk_tokens, request.overlap_tokens)
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=str(e))
+        try:
+            fingerprint = file_fingerprint(request.filename, request.chunk_size, chunker)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail=f"File {request.filename} not found.")
         
-        # Reuse the logic you built in Module 2
-        df = process_data_pipeline(request.filename)
+        # Chunks go to the columnar store (Module 20), then Chroma is synced from it
+        # (Module 9 pipeline): only new or changed chunks are embedded; vanished ones are deleted.
+        from module20_chunk_store import sync_source  # Imports pyarrow; keep it off the startup path
+        store = resources.get_chunk_store()
+        stats = sync_source(
+            store,
+            request.filename,
+            iter_chunks(request.filename, request.chunk_size, chunker),
+            resources.get_collection(),
+            resources.get_embedder(),
+            fingerprint=fingerprint,
+            force=request.force,
+            lexical_index=resources.get_lexical_index()
+        )
         
-        if df.empty:
-            raise HTTPException(status_code=404, detail=f"File {request.filename} not found or empty.")
+        if stats["chunks_total"] == 0:
+            raise HTTPException(status_code=404, detail=f"File {request.filename} is empty.")
         
-        # In a real app, we would save to ChromaDB here. 
-        # For now, we return the stats.
         return {
             "status": "success",
             "file": request.filename,
-            "chunks_processed": len(df),
-            "preview_first_chunk": df.iloc[0]['text'] if not df.empty else ""
+            "sync_status": stats["status"],
+            "chunks_processed": stats["chunks_total"],
+            "chunks_embedded": stats["chunks_indexed"],
+            "chunks_skipped": stats["chunks_skipped"],
+            "chunks_deleted": stats["chunks_deleted"],
+            "chunks_per_sec": stats["chunks_per_sec"],
+            "stage_seconds": stats["stage_seconds"],
+            "store": stats["store"],
+            "preview_first_chunk": store.preview(request.filename)
         }
         
+    except HTTPException:
+        raise
+    except ImportError as e:
+        raise HTTPException(status_code=501, detail=str(e))  # A format whose optional parser is missing (pypdf)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/jobs/ingest", status_code=202)
+def start_bulk_ingestion(request: BulkIngestRequest):
+    """
+    Starts a background job that ingests every file matching `pattern`.
+    Returns immediately with the job ID; poll /jobs/{job_id} for progress.
+    """
+    chunking = request.model_dump(include={"strategy", "chunk_size", "chunk_tokens", "overlap_tokens"})
+    if request.strategy == "sentence" and request.overlap_tokens >= request.chunk_tokens:
+        raise HTTPException(status_code=422, detail="overlap_tokens must be smaller than chunk_tokens")
+    try:
+        job = resources.get_job_manager().submit(request.pattern, chunking, request.force, request.workers)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return job.progress()
+
+@app.get("/jobs")
+def list_jobs():
+    return [job.progress() for job in resources.get_job_manager().jobs.values()]
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    """Files done, chunks/sec and ETA for one ingestion job."""
+    job = resources.get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job.progress()
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    job = resources.get_job_manager().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job.progress()
+
+@app.post("/query")
+async def run_query(request: QueryRequest):
+    """
+    Answers a question with the RAG chain.
+    Streams tokens as Server-Sent Events ('token' events, then one 'done'
+    event carrying ttft_s and total_s), or returns the whole answer at once.
+    """
+    # First call loads the models; keep that off the event loop
+    chain = await run_in_threadpool(resources.get_rag_chain)
+    timings, info = {}, {}
+
+    if not request.stream:
+        answer = "".join([token async for token in atimed_stream(chain.astream(request.question, info), timings)])
+        return {"answer": answer, **timings, **info}
+
+    async def event_stream():
+        try:
+            async for token in atimed_stream(chain.astream(request.question, info), timings):
+                yield sse_event("token", {"token": token})
+            yield sse_event("done", {**timings, **info})
+        except Exception as e:
+            # Headers are already sent, so report failures in-band
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@app.post("/chat")
+async def run_chat(request: ChatRequest):
+    """
+    One turn of a conversation (Module 26). History lives on the server:
+    send back the returned session_id to continue. Follow-up questions are
+    rewritten into standalone retrieval queries; the prompt carries a
+    summary plus the last few turns, within a fixed token budget.
+    """
+    chat = await run_in_threadpool(resources.get_chat_pipeline)
+    if request.session_id is None:
+        session_id = await run_in_threadpool(chat.store.create)
+    elif await run_in_threadpool(chat.store.exists, request.session_id):
+        session_id = request.session_id
+    else:
+        raise HTTPException(status_code=404, detail=f"Unknown session {request.session_id}")
+    timings, info = {}, {}
+
+    if not request.stream:
+        answer = "".join([token async for token in atimed_stream(chat.astream(session_id, request.question, info), timings)])
+        return {"session_id": session_id, "answer": answer, **timings, **info}
+
+    async def event_stream():
+        try:
+            async for token in atimed_stream(chat.astream(session_id, request.question, info), timings):
+                yield sse_event("token", {"token": token})
+            yield sse_event("done", {"session_id": session_id, **timings, **info})
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"X-Session-Id": session_id})
+
+@app.get("/chat/{session_id}")
+def chat_history(session_id: str):
+    store = resources.get_session_store()
+    if not store.exists(session_id):
+        raise HTTPException(status_code=404, detail=f"Unknown session {session_id}")
+    return {"session_id": session_id, "turns": store.history(session_id)}
+
+@app.delete("/chat/{session_id}")
+def delete_chat(session_id: str):
+    if not resources.get_session_store().delete(session_id):
+        raise HTTPException(status_code=404, detail=f"Unknown session {session_id}")
+    return {"status": "deleted", "session_id": session_id}
+
 # 4. ENTRY POINT
 if __name__ == "__main__":
     # Host 0.0.0.0 allows other local machines to reach it (optional)
@@ -0,0 +1,269 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+import numpy as np
+
+# --- CONFIGURATION ---
+# Two tiers:
+#   1. Memory: a bounded LRU of recently used vectors (fastest, per process).
+#   2. Disk: an append-only float32 matrix (memory-mapped) + an SQLite index
+#      mapping text hash -> row. Shared by every process on the machine.
+#      SQLite also records how many rows are committed; bytes past that (a torn
+#      write from a crashed process) are cut off and never shift later rows.
+CACHE_DIR = Path("./embedding_cache")
+MODEL_NAME = "all-MiniLM-L6-v2"
+MEMORY_ITEMS = 10_000  # Vectors kept in the in-memory LRU tier
+LOOKUP_BATCH = 500     # Keys per SQLite "IN (...)" lookup
+# encode() kwargs that never change the vectors, so they are left out of the cache key
+# (the cache always returns float32 NumPy, whatever convert_to_* says)
+NEUTRAL_KWARGS = {"batch_size", "show_progress_bar", "device", "convert_to_numpy", "convert_to_tensor"}
+
+def normalize_text(text: str) -> str:
+    """Unicode + whitespace normalisation so trivially different strings share a cache entry."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def text_key(text: str, variant: str = "") -> str:
+    """`variant` describes encode() options that change the vector (e.g. normalize_embeddings)."""
+    normalized = normalize_text(text)
+    return hashlib.sha256((f"{variant}\0{normalized}" if variant else normalized).encode("utf-8")).hexdigest()
+
+def kwargs_variant(kwargs: Dict) -> str:
+    return ",".join(f"{name}={value!r}" for name, value in sorted(kwargs.items()) if name not in NEUTRAL_KWARGS)
+
+class EmbeddingCache:
+    """
+    Disk-backed embedding cache for one model, with an LRU tier in front.
+
+    It behaves like the model it wraps:
+    - encode(texts) mirrors SentenceTransformer.encode (NumPy in, NumPy out),
+      so it can be passed anywhere our code expects a SentenceTransformer.
+    - embed_documents / embed_query mirror LangChain's Embeddings interface,
+      so it can replace HuggingFaceEmbeddings in a LangChain vector store.
+    Only texts that miss both tiers are sent to the model, in one batch.
+    """
+
+    def __init__(self, model_name: str = MODEL_NAME, cache_dir: Path = CACHE_DIR,
+                 memory_items: int = MEMORY_ITEMS, model=None, model_loader=None):
+        self.model_name = model_name
+        self.memory_items = memory_items
+        self._model = model
+        self._model_loader = model_loader  # Called on first miss if no model was given
+        self._lock = threading.RLock()
+        self._memory = OrderedDict()  # key -> vector (LRU order)
+        self._mmap = None
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+        # One sub-directory per model: vectors from different models never mix
+        self.directory = Path(cache_dir) / model_name.replace("/", "__")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._vectors_path = self.directory / "vectors.f32"
+        self._vectors_path.touch(exist_ok=True)
+
+        self._db = sqlite3.connect(self.directory / "index.sqlite", check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        # Under the write lock, so a writer in another process is never cut off mid-append
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._db.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+            self.dim = int(row[0]) if row else None
+            self._truncate_vectors(self._committed_rows())
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+
+    # --- MODEL ---
+
+    @property
+    def model(self):
+        """The underlying SentenceTransformer, loaded only when a miss needs it."""
+        if self._model is None:
+            if self._model_loader is not None:
+                self._model = self._model_loader()
+            else:
+                from sentence_transformers import SentenceTransformer
+                print(f"[+] Embedding cache loading model: {self.model_name}")
+                self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    # --- MEMORY TIER ---
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    # --- DISK TIER ---
+
+    def _read_rows(self, rows: List[int]) -> np.ndarray:
+        # Re-map when another writer (thread or process) has grown the file
+        needed = max(rows) + 1
+        if self._mmap is None or self._mmap.shape[0] < needed:
+            total = self._vectors_path.stat().st_size // (4 * self.dim)
+            self._mmap = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(total, self.dim))
+        return np.array(self._mmap[rows])  # Copy out of the mapping
+
+    def _lookup_disk(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        if self.dim is None or not keys:
+            return {}
+        key_rows = {}
+        for i in range(0, len(keys), LOOKUP_BATCH):
+            part = keys[i : i + LOOKUP_BATCH]
+            placeholders = ",".join("?" * len(part))
+            key_rows.update(self._db.execute(
+                f"SELECT key, row FROM entries WHERE key IN ({placeholders})", part
+            ).fetchall())
+        if not key_rows:
+            return {}
+        found = list(key_rows)
+        vectors = self._read_rows([key_rows[k] for k in found])
+        return dict(zip(found, vectors))
+
+    def _committed_rows(self) -> int:
+        """Rows recorded in SQLite. Call inside a write transaction."""
+        row = self._db.execute("SELECT value FROM meta WHERE name = 'rows'").fetchone()
+        if row:
+            return int(row[0])
+        # Caches written before the row count was recorded
+        return self._db.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM entries").fetchone()[0]
+
+    def _truncate_vectors(self, rows: int):
+        size = rows * 4 * self.dim if self.dim else 0
+        if self._vectors_path.stat().st_size > size:
+            print(f"[!] Embedding cache: dropping a torn write past row {rows} in {self._vectors_path}")
+            os.truncate(self._vectors_path, size)
+
+    def _store_disk(self, keys: List[str], vectors: np.ndarray):
+        # BEGIN IMMEDIATE takes SQLite's write lock, so concurrent processes
+        # append to the vector file one at a time and rows never collide.
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (str(self.dim),))
+            # Row numbers come from the committed count, not the file size, and
+            # leftovers from a writer that died before COMMIT are cut off first
+            first_row = self._committed_rows()
+            self._truncate_vectors(first_row)
+            with open(self._vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            self._db.executemany(
+                "INSERT OR IGNORE INTO entries VALUES (?, ?)",
+                [(key, first_row + i) for i, key in enumerate(keys)]
+            )
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('rows', ?)", (str(first_row + len(keys)),))
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+
+    # --- PUBLIC API ---
+
+    def encode(self, texts: Union[str, List[str]], batch_size: int = 64, **kwargs) -> np.ndarray:
+        """
+        Cached drop-in for SentenceTransformer.encode (always returns float32 NumPy).
+        Extra kwargs are passed to the model; those that change the vectors
+        (normalize_embeddings, prompt_name, ...) are part of the cache key.
+        """
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        variant = kwargs_variant(kwargs)
+        keys = [text_key(t, variant) for t in texts]
+        found = {}
+
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+            memory_hits = len(found)
+
+            from_disk = self._lookup_disk([k for k in dict.fromkeys(keys) if k not in found])
+            for key, vector in from_disk.items():
+                self._remember(key, vector)
+            found.update(from_disk)
+
+        # Encode each distinct missing text once, outside the lock (the slow part)
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            options = {name: value for name, value in kwargs.items() if name not in ("convert_to_numpy", "convert_to_tensor")}
+            new_vectors = np.asarray(
+                self.model.encode(list(missing.values()), batch_size=batch_size, convert_to_numpy=True, **options),
+                dtype=np.float32
+            )
+            with self._lock:
+                self._store_disk(list(missing), new_vectors)
+                for key, vector in zip(missing, new_vectors):
+                    self._remember(key, vector)
+                    found[key] = vector
+
+        with self._lock:
+            self.hits_memory += memory_hits
+            self.hits_disk += len(from_disk)
+            self.misses += len(missing)
+
+        result = np.stack([found[k] for k in keys]) if keys else np.empty((0, self.dim or 0), dtype=np.float32)
+        return result[0] if single else result
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """LangChain Embeddings interface."""
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        """LangChain Embeddings interface."""
+        return self.encode(text).tolist()
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for this process plus the size of the shared disk tier."""
+        with self._lock:
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            disk_entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            return {
+                "model": self.model_name,
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "hit_rate": round((self.hits_memory + self.hits_disk) / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries
+            }
+
+# --- SHARED INSTANCES ---
+# Ingestion, the vector DB helpers and the RAG retrievers all use the same
+# cache object per model, so a text embedded once is never embedded again.
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+def get_embedding_cache(model_name: str = MODEL_NAME, model=None, model_loader=None) -> EmbeddingCache:
+    with _caches_lock:
+        if model_name not in _caches:
+            _caches[model_name] = EmbeddingCache(model_name, model=model, model_loader=model_loader)
+        return _caches[model_name]
+
+if __name__ == "__main__":
+    import time
+
+    print("--- TESTING EMBEDDING CACHE ---")
+    cache = get_embedding_cache()
+    questions = [
+        "What is the new VPN address?",
+        "How do I reset my password?",
+        "What is the new   VPN address?"  # Same after whitespace normalisation
+    ]
+
+    for attempt in (1, 2):
+        start = time.perf_counter()
+        vectors = cache.encode(questions)
+        print(f"[+] Pass {attempt}: {vectors.shape} in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    print(f"[+] Cache stats: {cache.stats()}")
@@ -0,0 +1,149 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+import multiprocessing
+import os
+import time
+import numpy as np
+
+from module5_embeddings import MODEL_NAME, load_embedding_model
+
+# --- CONFIGURATION ---
+# On CPU-only machines one encode() call rarely keeps every core busy.
+# The engine runs several worker processes, each with its own copy of the model.
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+BATCH_SIZE = 64       # Texts per encode() call inside a worker
+WINDOW_SIZE = 4096    # Texts pulled from the input stream and length-sorted together
+
+# Each worker process keeps its own model here (set by the pool initializer).
+_worker_model = None
+
+def _init_worker(model_name: str, torch_threads: int):
+    global _worker_model
+    # Split the cores between workers instead of letting every worker grab all of them
+    import torch
+    torch.set_num_threads(torch_threads)
+    _worker_model = load_embedding_model(model_name)
+
+def _encode_batch(texts: List[str], batch_size: int, options: Dict) -> np.ndarray:
+    return _worker_model.encode(texts, batch_size=batch_size, convert_to_numpy=True, **options)
+
+def length_sorted_batches(texts: List[str], batch_size: int) -> List[List[int]]:
+    """
+    Groups text positions into batches of similar length.
+    The model pads every text in a batch to the longest one, so mixing a
+    5-word title with a 250-word paragraph wastes most of the compute.
+    """
+    order = np.argsort([len(t) for t in texts], kind="stable")
+    return [order[i : i + batch_size].tolist() for i in range(0, len(order), batch_size)]
+
+class EmbeddingEngine:
+    """
+    Batched, multi-process embedding service.
+
+    encode() accepts any iterable of texts and returns one contiguous float32
+    array whose rows are in input order. It mirrors SentenceTransformer.encode,
+    so it can back the EmbeddingCache (Module 10) or the indexing pipeline (Module 9).
+    With workers=1 everything runs in-process, without a pool.
+    """
+
+    def __init__(self, model_name: str = MODEL_NAME, workers: int = DEFAULT_WORKERS,
+                 batch_size: int = BATCH_SIZE, window_size: int = WINDOW_SIZE):
+        self.model_name = model_name
+        self.workers = workers
+        self.batch_size = batch_size
+        self.window_size = window_size
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._local_model = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            torch_threads = max(1, (os.cpu_count() or 1) // self.workers)
+            print(f"[+] Starting {self.workers} embedding workers ({torch_threads} threads each)")
+            # 'spawn' avoids forking a parent that may already hold torch thread pools
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_name, torch_threads)
+            )
+        return self._pool
+
+    def _encode_window(self, texts: List[str], batch_size: int, options: Dict) -> np.ndarray:
+        batches = length_sorted_batches(texts, batch_size)
+        if self.workers <= 1:
+            if self._local_model is None:
+                self._local_model = load_embedding_model(self.model_name)
+            results = [self._local_model.encode([texts[i] for i in b], batch_size=batch_size, convert_to_numpy=True,
+                                                **options)
+                       for b in batches]
+        else:
+            pool = self._get_pool()
+            futures = [pool.submit(_encode_batch, [texts[i] for i in b], batch_size, options) for b in batches]
+            results = [f.result() for f in futures]
+
+        # Scatter the sorted batches back into input order
+        out = np.empty((len(texts), results[0].shape[1]), dtype=np.float32)
+        for positions, vectors in zip(batches, results):
+            out[positions] = vectors
+        return out
+
+    def encode(self, texts: Union[str, Iterable[str]], batch_size: Optional[int] = None, **kwargs) -> np.ndarray:
+        single = isinstance(texts, str)
+        stream = iter([texts] if single else texts)
+        batch_size = batch_size or self.batch_size
+        # Model options (normalize_embeddings, prompt_name, ...) go to every batch; output is always NumPy
+        options = {name: value for name, value in kwargs.items() if name not in ("convert_to_numpy", "convert_to_tensor")}
+
+        # Pull the stream one window at a time so the input never has to be a list
+        parts = []
+        while window := list(islice(stream, self.window_size)):
+            parts.append(self._encode_window(window, batch_size, options))
+
+        if not parts:
+            return np.empty((0, 0), dtype=np.float32)
+        out = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        return out[0] if single else out
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def benchmark(texts: List[str], workers: int = DEFAULT_WORKERS) -> Tuple[float, float]:
+    """Times the old one-at-a-time path against the engine on the same texts."""
+    from module5_embeddings import generate_embedding
+
+    model = load_embedding_model()
+    start = time.perf_counter()
+    single = np.stack([generate_embedding(model, t) for t in texts])
+    single_seconds = time.perf_counter() - start
+
+    with EmbeddingEngine(workers=workers) as engine:
+        engine.encode(texts[: workers * BATCH_SIZE])  # Warm-up: start workers and load models
+        start = time.perf_counter()
+        batched = engine.encode(texts)
+        engine_seconds = time.perf_counter() - start
+
+    # Same vectors, same order (up to float noise from different batch padding)
+    assert np.allclose(single, batched, atol=1e-4), "Engine output does not match the single-text path"
+    return single_seconds, engine_seconds
+
+if __name__ == "__main__":
+    from module2_ingest import load_document
+
+    print("--- BENCHMARKING EMBEDDING ENGINE ---")
+    # Build a corpus with a realistic spread of lengths from the sample document
+    lines = [line for line in load_document("sample_mission.txt").splitlines() if line.strip()]
+    corpus = [" ".join(lines[i % len(lines) : i % len(lines) + 1 + i % 4]) for i in range(2000)]
+
+    single_s, engine_s = benchmark(corpus)
+    print(f"\n[+] One-at-a-time: {single_s:.2f}s ({len(corpus) / single_s:.0f} texts/sec)")
+    print(f"[+] Engine ({DEFAULT_WORKERS} workers): {engine_s:.2f}s ({len(corpus) / engine_s:.0f} texts/sec)")
+    print(f"[+] Speed-up: {single_s / engine_s:.1f}x")
@@ -0,0 +1,233 @@
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import json
+import threading
+import time
+import httpx
+
+# --- CONFIGURATION ---
+OLLAMA_BASE_URL = "http://localhost:11434"
+MODEL_NAME = "llama3"
+MAX_CONCURRENCY = 4        # Requests in flight at once (Ollama queues the rest anyway)
+MAX_CONNECTIONS = 8        # Pooled keep-alive connections
+CONNECT_TIMEOUT = 5.0      # Seconds to open a connection
+READ_TIMEOUT = 120.0       # Seconds to wait between streamed tokens
+RETRIES = 2                # Retries for connection failures before the first token
+
+@dataclass
+class GenerationStats:
+    """Per-request latency numbers. ttft = time to first token."""
+    ttft_s: Optional[float] = None
+    total_s: float = 0.0
+    tokens: int = 0
+    tokens_per_sec: float = 0.0
+    prompt_tokens: Optional[int] = None
+
+@dataclass
+class TokenStream:
+    """
+    Async iterator over generated tokens.
+    `stats` is filled in while streaming and is final once iteration ends.
+    """
+    _tokens: AsyncIterator[str]
+    stats: GenerationStats = field(default_factory=GenerationStats)
+
+    def __aiter__(self):
+        return self._tokens
+
+class AsyncOllamaClient:
+    """
+    Asyncio client for Ollama's /api/generate and /api/chat.
+
+    - One pooled httpx session is reused for every call (no per-call TCP handshake).
+    - A semaphore caps concurrent requests.
+    - Everything is streamed internally, so time-to-first-token is always measured;
+      the non-streaming helpers just join the tokens.
+    """
+
+    def __init__(self, base_url: str = OLLAMA_BASE_URL, model: str = MODEL_NAME,
+                 max_concurrency: int = MAX_CONCURRENCY, max_connections: int = MAX_CONNECTIONS,
+                 connect_timeout: float = CONNECT_TIMEOUT, read_timeout: float = READ_TIMEOUT,
+                 retries: int = RETRIES):
+        self.model = model
+        self.retries = retries
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout)
+        )
+
+    async def close(self):
+        await self._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _stream(self, path: str, payload: Dict, stats: GenerationStats) -> AsyncIterator[str]:
+        payload = {"model": self.model, **payload, "stream": True}
+        async with self._semaphore:
+            start = time.perf_counter()
+            for attempt in range(self.retries + 1):
+                try:
+                    async with self._client.stream("POST", path, json=payload) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line:
+                                continue
+                            data = json.loads(line)
+                            if "error" in data:
+                                raise RuntimeError(f"Ollama error: {data['error']}")
+                            token = data["message"]["content"] if "message" in data else data.get("response", "")
+                            if token:
+                                if stats.ttft_s is None:
+                                    stats.ttft_s = time.perf_counter() - start
+                                stats.tokens += 1
+                                yield token
+                            if data.get("done"):
+                                # Ollama's own counters are more accurate than counting chunks
+                                stats.tokens = data.get("eval_count", stats.tokens)
+                                stats.prompt_tokens = data.get("prompt_eval_count")
+                                break
+                    break
+                except (httpx.ConnectError, httpx.ConnectTimeout):
+                    # Only safe to retry if nothing has been yielded yet
+                    if stats.ttft_s is not None or attempt == self.retries:
+                        raise
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+
+            stats.total_s = time.perf_counter() - start
+            generation_s = stats.total_s - (stats.ttft_s or 0.0)
+            stats.tokens_per_sec = round(stats.tokens / generation_s, 1) if generation_s > 0 else 0.0
+
+    # --- STREAMING API ---
+
+    def stream_generate(self, prompt: str, **options) -> TokenStream:
+        stats = GenerationStats()
+        payload = {"prompt": prompt, "options": options} if options else {"prompt": prompt}
+        return TokenStream(self._stream("/api/generate", payload, stats), stats)
+
+    def stream_chat(self, messages: List[Dict], **options) -> TokenStream:
+        stats = GenerationStats()
+        payload = {"messages": messages, "options": options} if options else {"messages": messages}
+        return TokenStream(self._stream("/api/chat", payload, stats), stats)
+
+    # --- WHOLE-RESPONSE API ---
+
+    async def generate(self, prompt: str, **options) -> Tuple[str, GenerationStats]:
+        stream = self.stream_generate(prompt, **options)
+        text = "".join([token async for token in stream])
+        return text, stream.stats
+
+    async def chat(self, messages: List[Dict], **options) -> Tuple[str, GenerationStats]:
+        stream = self.stream_chat(messages, **options)
+        text = "".join([token async for token in stream])
+        return text, stream.stats
+
+# --- LOCAL STUB SERVER ---
+# Speaks enough of the Ollama streaming protocol to test the client without
+# a real model: it echoes a fixed reply one word at a time.
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass  # Keep test output quiet
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        if self.path not in ("/api/generate", "/api/chat"):
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(obj):
+            data = (json.dumps(obj) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        # Prefill cost grows with the prompt, like a real model's
+        prompt = body.get("prompt") or " ".join(m.get("content", "") for m in body.get("messages", []))
+        prompt_tokens = len(prompt.split())
+        prefill = prompt_tokens / server.prefill_tokens_per_sec if server.prefill_tokens_per_sec else 0.0
+        time.sleep(server.first_token_delay + prefill)
+        words = server.reply.split(" ")
+        for i, word in enumerate(words):
+            token = word if i == 0 else " " + word
+            if self.path == "/api/chat":
+                send({"model": body["model"], "message": {"role": "assistant", "content": token}, "done": False})
+            else:
+                send({"model": body["model"], "response": token, "done": False})
+            time.sleep(server.token_delay)
+        send({"model": body["model"], "done": True, "eval_count": len(words), "prompt_eval_count": prompt_tokens})
+        self.wfile.write(b"0\r\n\r\n")
+
+class StubOllamaServer:
+    """
+    Threaded fake Ollama on 127.0.0.1 (random free port). Use as a context manager.
+    Deterministic timing: `first_token_delay` plus, if `prefill_tokens_per_sec`
+    is set, one "token" per prompt word at that rate, then one reply word
+    every `token_delay` seconds.
+    """
+
+    def __init__(self, reply: str = "This is a stub answer from a fake local model.",
+                 token_delay: float = 0.01, first_token_delay: float = 0.05,
+                 prefill_tokens_per_sec: Optional[float] = None):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+        self._server.daemon_threads = True
+        self._server.reply = reply
+        self._server.token_delay = token_delay
+        self._server.first_token_delay = first_token_delay
+        self._server.prefill_tokens_per_sec = prefill_tokens_per_sec
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+async def _demo(base_url: str):
+    question = "Explain the concept of 'Vector Embeddings' in one sentence."
+    async with AsyncOllamaClient(base_url=base_url) as client:
+        print(f"User: {question}\n")
+        stream = client.stream_generate(question)
+        print("Agent: ", end="", flush=True)
+        async for token in stream:
+            print(token, end="", flush=True)
+        print(f"\n\n[+] TTFT: {stream.stats.ttft_s:.3f}s | total: {stream.stats.total_s:.2f}s "
+              f"| {stream.stats.tokens_per_sec} tokens/sec")
+
+        # Several questions at once share the pooled connections
+        results = await asyncio.gather(*[client.generate(f"Say the number {i}.") for i in range(4)])
+        for text, stats in results:
+            print(f"[+] {stats.tokens} tokens, TTFT {stats.ttft_s:.3f}s, total {stats.total_s:.2f}s")
+
+if __name__ == "__main__":
+    import sys
+
+    # python module12_async_llm.py --stub   -> run against the built-in fake server
+    if "--stub" in sys.argv:
+        with StubOllamaServer() as stub:
+            print(f"--- TESTING ASYNC CLIENT AGAINST STUB ({stub.url}) ---")
+            asyncio.run(_demo(stub.url))
+    else:
+        print(f"--- TESTING ASYNC CLIENT ({MODEL_NAME} @ {OLLAMA_BASE_URL}) ---")
+        asyncio.run(_demo(OLLAMA_BASE_URL))
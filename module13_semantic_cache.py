@@ -0,0 +1,185 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+import hashlib
+import os
+import threading
+import time
+import numpy as np
+
+try:
+    import fcntl  # Unix only; serialises generation bumps across processes
+except ImportError:
+    fcntl = None
+
+# --- CONFIGURATION ---
+SIMILARITY_THRESHOLD = 0.92  # Cosine similarity needed to treat two questions as "the same"
+TTL_SECONDS = 6 * 3600       # Cached answers expire after this long
+MAX_ENTRIES = 2000           # LRU capacity
+# Bumped by the indexing pipeline (Module 9) whenever the collection changes.
+GENERATION_PATH = Path("./chroma_storage/generation")
+
+def read_generation(path: Path = GENERATION_PATH) -> int:
+    try:
+        return int(path.read_text().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+_generation_lock = threading.Lock()  # Bulk jobs (Module 19) sync several files at once
+
+def bump_generation(path: Path = GENERATION_PATH) -> int:
+    """
+    Marks the collection as changed. Every semantic cache sees this on its next lookup.
+    The read-increment-write runs under an exclusive flock on a side file, so
+    API workers and CLI/bulk ingestion never both turn N into N + 1 (a lost
+    invalidation). Without fcntl (Windows) only threads are serialised.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _generation_lock:
+        fd = os.open(path.with_name(f"{path.name}.lock"), os.O_RDWR | os.O_CREAT)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)  # Blocks briefly: the critical section is two tiny file writes
+            generation = read_generation(path) + 1
+            # Temp + rename: readers never see a half-written number
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_text(str(generation))
+            tmp_path.replace(path)
+            return generation
+        finally:
+            os.close(fd)  # Also releases the flock
+
+def context_fingerprint(texts: List[str]) -> str:
+    """Identifies the retrieved context, so an answer is only reused for the same evidence."""
+    digest = hashlib.sha1()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+@dataclass
+class _Entry:
+    question: str
+    context_key: str
+    answer: str
+    created_at: float
+
+class SemanticCache:
+    """
+    Answer cache keyed on question *meaning* rather than exact text.
+
+    Question vectors live in one preallocated, L2-normalised matrix, so a lookup
+    is a single matrix-vector product. A hit needs:
+      1. cosine similarity >= threshold with a cached question,
+      2. the same retrieved context (fingerprint) as when it was answered,
+      3. an entry younger than the TTL, from the current collection generation.
+    `embedder` is anything with encode(text) -> vector (e.g. the Module 10 cache).
+    """
+
+    def __init__(self, embedder, threshold: float = SIMILARITY_THRESHOLD, ttl_seconds: float = TTL_SECONDS,
+                 max_entries: int = MAX_ENTRIES, generation_path: Path = GENERATION_PATH):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.generation_path = generation_path
+        self._generation = read_generation(generation_path)
+        self._lock = threading.Lock()
+        self._matrix = None                  # (max_entries, dim) question vectors
+        self._entries: Dict[int, _Entry] = {}
+        self._lru = OrderedDict()            # slot -> None, oldest first
+        self._free = list(range(max_entries - 1, -1, -1))
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embedder.encode(question), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _evict(self, slot: int):
+        del self._entries[slot]
+        del self._lru[slot]
+        self._free.append(slot)
+
+    def _check_generation(self):
+        generation = read_generation(self.generation_path)
+        if generation != self._generation:
+            # The collection was re-ingested: every cached answer may be stale
+            for slot in list(self._entries):
+                self._evict(slot)
+            self._generation = generation
+            self.invalidations += 1
+
+    def lookup(self, question: str, context_key: str) -> Optional[str]:
+        vector = self._embed(question)
+        with self._lock:
+            self._check_generation()
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            slots = np.fromiter(self._entries, dtype=np.int64)
+            scores = self._matrix[slots] @ vector
+            now = time.time()
+            # Best-scoring candidates first; stop at the first one that is still valid
+            for i in np.argsort(-scores):
+                if scores[i] < self.threshold:
+                    break
+                slot = int(slots[i])
+                entry = self._entries[slot]
+                if now - entry.created_at > self.ttl_seconds:
+                    self._evict(slot)
+                    continue
+                if entry.context_key == context_key:
+                    self._lru.move_to_end(slot)
+                    self.hits += 1
+                    return entry.answer
+
+            self.misses += 1
+            return None
+
+    def store(self, question: str, context_key: str, answer: str):
+        vector = self._embed(question)
+        with self._lock:
+            self._check_generation()
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            if not self._free:
+                self._evict(next(iter(self._lru)))  # Least recently used
+            slot = self._free.pop()
+            self._matrix[slot] = vector
+            self._entries[slot] = _Entry(question, context_key, answer, time.time())
+            self._lru[slot] = None
+
+    def clear(self):
+        with self._lock:
+            for slot in list(self._entries):
+                self._evict(slot)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "generation": self._generation
+            }
+
+if __name__ == "__main__":
+    from module10_embedding_cache import get_embedding_cache
+
+    print("--- TESTING SEMANTIC CACHE ---")
+    cache = SemanticCache(get_embedding_cache())
+    context = context_fingerprint(["The company VPN address changed to vpn.enterprise.local on January 1st."])
+
+    cache.store("What is the VPN address?", context, "The VPN address is vpn.enterprise.local.")
+    for question in ["what's the vpn address", "How do I reset my password?"]:
+        start = time.perf_counter()
+        answer = cache.lookup(question, context)
+        print(f"[+] '{question}' -> {answer!r} ({(time.perf_counter() - start) * 1000:.1f} ms)")
+    print(f"[+] Stats: {cache.stats()}")
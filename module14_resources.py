@@ -0,0 +1,293 @@
+from typing import Callable, Dict, List
+import os
+import threading
+import time
+
+from module24_observability import span
+
+try:
+    import resource  # Unix only; used for the memory report
+except ImportError:
+    resource = None
+
+# --- CONFIGURATION ---
+# Every entry point (Streamlit app, FastAPI server, CLI modules) gets its heavy
+# objects from here, so each process loads them at most once.
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "1"))  # > 1 = multi-process embedding engine (Module 11)
+LLM_KEEP_ALIVE = os.getenv("LLM_KEEP_ALIVE", "30m")   # How long Ollama keeps llama3 in memory after warm-up
+# "chroma", "numpy" (exact), "numpy-ivf" (Module 16), or "numpy-binary" / "numpy-int8" (quantised, Module 25;
+# binary is the fast first pass, int8 only saves memory)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"  # Fuse dense results with BM25 (Module 17)
+# After an ingest the NumPy index is rebuilt in the background once ingestion has been quiet
+# for INDEX_REFRESH_DELAY seconds (a bulk job bumps the generation after every file), and at
+# least every INDEX_REFRESH_MAX_DELAY seconds while it keeps going.
+INDEX_REFRESH_DELAY = float(os.getenv("INDEX_REFRESH_DELAY", "10"))
+INDEX_REFRESH_MAX_DELAY = float(os.getenv("INDEX_REFRESH_MAX_DELAY", "120"))
+
+_resources: Dict[str, object] = {}
+_locks: Dict[str, threading.Lock] = {}
+_registry_lock = threading.Lock()
+load_seconds: Dict[str, float] = {}
+
+def _get(name: str, factory: Callable[[], object]):
+    """
+    Lazily creates a named resource exactly once per process.
+    Double-checked locking: the fast path is a plain dict read, and two
+    requests racing on first use wait for one load instead of doing two.
+    """
+    if name in _resources:
+        return _resources[name]
+    with _registry_lock:
+        lock = _locks.setdefault(name, threading.Lock())
+    with lock:
+        if name not in _resources:
+            with span("load", resource=name) as load:
+                _resources[name] = factory()
+            load_seconds[name] = round(load.seconds, 3)
+    return _resources[name]
+
+def loaded() -> List[str]:
+    """Names of the resources this process has already loaded (never triggers a load)."""
+    return list(_resources)
+
+# --- RESOURCES ---
+
+def get_embedding_model():
+    """The one SentenceTransformer (all-MiniLM-L6-v2) for this process."""
+    from module5_embeddings import load_embedding_model
+    return _get("embedding_model", load_embedding_model)
+
+def get_embedder():
+    """Shared embedding cache (Module 10), backed by the shared model or the multi-process engine."""
+    def build():
+        from module10_embedding_cache import get_embedding_cache
+        if EMBED_WORKERS > 1:
+            from module11_embedding_engine import EmbeddingEngine
+            return get_embedding_cache(model=EmbeddingEngine(workers=EMBED_WORKERS))
+        return get_embedding_cache(model_loader=get_embedding_model)
+    return _get("embedder", build)
+
+def get_chroma_client():
+    def build():
+        import chromadb
+        from module6_vectordb import DB_PATH
+        return chromadb.PersistentClient(path=DB_PATH)
+    return _get("chroma_client", build)
+
+def get_collection():
+    """
+    Raw Chroma collection, used by the ingestion pipeline. Its embedding function is the
+    shared embedder, so with EMBED_WORKERS > 1 no in-process SentenceTransformer is loaded.
+    """
+    def build():
+        from module6_vectordb import setup_database
+        return setup_database(client=get_chroma_client(), embedder=get_embedder())
+    return _get("collection", build)
+
+def get_vector_store():
+    """LangChain view of the same collection, used by the RAG retriever."""
+    def build():
+        from langchain_chroma import Chroma
+        from module6_vectordb import COLLECTION_NAME
+        return Chroma(client=get_chroma_client(), collection_name=COLLECTION_NAME, embedding_function=get_embedder())
+    return _get("vector_store", build)
+
+def _load_numpy_index():
+    from module13_semantic_cache import read_generation
+    from module16_vector_index import INDEX_DIR, NumpyVectorIndex
+    try:
+        index = NumpyVectorIndex(INDEX_DIR)  # Another process may already have exported this generation
+        if index.generation != read_generation():
+            index = None
+    except FileNotFoundError:
+        index = None
+    if index is None:
+        print("[+] Exporting Chroma collection to the NumPy index...")
+        index = NumpyVectorIndex.build_from_chroma(get_collection())
+    if VECTOR_BACKEND in ("numpy-int8", "numpy-binary"):
+        from module25_quantization import QuantizedVectorIndex
+        index = QuantizedVectorIndex(index.directory, mode=VECTOR_BACKEND.split("-")[1])
+    return index
+
+_refresh_lock = threading.Lock()
+_refresh = {"timer": None, "since": 0.0, "generation": None}
+
+def _start_refresh_timer():
+    timer = threading.Timer(INDEX_REFRESH_DELAY, _refresh_numpy_index)
+    timer.daemon = True
+    _refresh["timer"] = timer
+    timer.start()
+
+def _schedule_index_refresh(generation):
+    with _refresh_lock:
+        if _refresh["timer"] is None:  # At most one pending refresh per process
+            _refresh.update(since=time.monotonic(), generation=generation)
+            _start_refresh_timer()
+
+def _refresh_numpy_index():
+    from module13_semantic_cache import read_generation
+    generation = read_generation()
+    with _refresh_lock:
+        # Still ingesting: wait for a quiet period (debounce), but not forever
+        if generation != _refresh["generation"] and time.monotonic() - _refresh["since"] < INDEX_REFRESH_MAX_DELAY:
+            _refresh["generation"] = generation
+            _start_refresh_timer()
+            return
+    try:
+        with span("load", resource="numpy_index") as load:
+            index = _load_numpy_index()
+        with _locks["numpy_index"]:
+            _resources["numpy_index"] = index
+        load_seconds["numpy_index"] = round(load.seconds, 3)
+    except Exception as e:
+        # Searches keep using the current index; the next stale one schedules another attempt
+        print(f"[!] NumPy index refresh failed: {e}")
+    finally:
+        with _refresh_lock:
+            _refresh["timer"] = None
+
+def get_numpy_index():
+    """
+    In-process NumPy index (Module 16). Exported from Chroma if missing, at warm-up.
+    With a quantised VECTOR_BACKEND it searches int8/binary codes and re-ranks on the floats (Module 25).
+    The generation is compared on every call (one small file read). When an /ingest or a bulk job
+    has changed the collection, searches keep using the current index while a debounced
+    background refresh loads (or re-exports) the new one; a request never rebuilds it.
+    """
+    from module13_semantic_cache import read_generation
+    index = _get("numpy_index", _load_numpy_index)
+    generation = read_generation()
+    if index.generation != generation:
+        _schedule_index_refresh(generation)
+    return index
+
+def get_lexical_index():
+    """BM25 inverted index (Module 17), updated by the ingestion pipeline alongside Chroma."""
+    def build():
+        from module17_hybrid_search import BM25Index
+        return BM25Index()
+    return _get("lexical_index", build)
+
+def get_retriever(k: int = 1):
+    """
+    Retriever with the RAG pipeline's invoke/ainvoke interface: the configured
+    VECTOR_BACKEND, fused with BM25 results when HYBRID_SEARCH is on, behind
+    the micro-batcher when MICRO_BATCH is on.
+    """
+    from module22_micro_batching import MICRO_BATCH, BatchingRetriever
+    if HYBRID_SEARCH:
+        from module17_hybrid_search import CANDIDATES, HybridRetriever
+        retriever = HybridRetriever(_dense_retriever(max(k, CANDIDATES), MICRO_BATCH), get_lexical_index(), k)
+    else:
+        retriever = _dense_retriever(k, MICRO_BATCH)
+    # Concurrent async queries share embedding + search calls (Module 22)
+    return BatchingRetriever(retriever) if MICRO_BATCH else retriever
+
+def _dense_retriever(k: int, batchable: bool = False):
+    if VECTOR_BACKEND.startswith("numpy"):
+        from module16_vector_index import NumpyRetriever
+        # Passing the getter (not the index) lets every search pick up a re-export after an ingest
+        return NumpyRetriever(get_numpy_index, get_embedder(), k, approximate=VECTOR_BACKEND == "numpy-ivf")
+    if batchable:
+        from module22_micro_batching import ChromaBatchRetriever
+        return ChromaBatchRetriever(get_collection(), get_embedder(), k)
+    return get_vector_store().as_retriever(search_kwargs={"k": k})
+
+def get_reranker():
+    """Cross-encoder re-ranking stage (Module 27); only loaded when RERANK=1."""
+    def build():
+        from module27_reranking import Reranker, load_cross_encoder
+        reranker = Reranker(load_cross_encoder())
+        reranker.warm_up()
+        return reranker
+    return _get("reranker", build)
+
+def get_llm():
+    def build():
+        from langchain_ollama import ChatOllama
+        from module8_rag import LLM_MODEL
+        # Temperature 0.1 keeps the AI focused and factual, reducing hallucinations
+        return ChatOllama(model=LLM_MODEL, temperature=0.1, keep_alive=LLM_KEEP_ALIVE)
+    return _get("llm", build)
+
+def get_answer_cache():
+    """Semantic answer cache (Module 13), shared by the RAG chain and the chat pipeline."""
+    def build():
+        from module13_semantic_cache import SemanticCache
+        return SemanticCache(get_embedder())
+    return _get("answer_cache", build)
+
+def get_rag_chain():
+    def build():
+        from module8_rag import build_rag_chain
+        return build_rag_chain(use_answer_cache=True)
+    return _get("rag_chain", build)
+
+def get_session_store():
+    """Server-side chat sessions (Module 26), shared by the API and the Streamlit app."""
+    def build():
+        from module26_chat_sessions import SessionStore
+        return SessionStore()
+    return _get("session_store", build)
+
+def get_chat_pipeline():
+    """Conversation-aware RAG with bounded, summarised history (Module 26)."""
+    def build():
+        from module26_chat_sessions import build_chat_pipeline
+        return build_chat_pipeline()
+    return _get("chat_pipeline", build)
+
+def get_chunk_store():
+    """Columnar chunk store (Module 20): every chunk ever ingested, one Parquet file per source."""
+    def build():
+        from module20_chunk_store import ChunkStore
+        return ChunkStore()
+    return _get("chunk_store", build)
+
+def get_job_manager():
+    """Background bulk-ingestion jobs (Module 19); one manager per process."""
+    def build():
+        from module19_bulk_ingest import JobManager
+        return JobManager()
+    return _get("job_manager", build)
+
+# --- WARM-UP ---
+
+def _preload_ollama_model():
+    """Asks Ollama to load llama3 into memory now, so the first question skips the model load."""
+    from module4_inference import OLLAMA_URL, session
+    from module8_rag import LLM_MODEL
+    # A generate request without a prompt only loads the model
+    session.post(OLLAMA_URL, json={"model": LLM_MODEL, "keep_alive": LLM_KEEP_ALIVE}, timeout=(5, 300))
+
+def warm_up(include_llm: bool = True) -> Dict:
+    """
+    Loads everything up front (e.g. from FastAPI's lifespan) and reports the cost.
+    Returns per-resource load seconds and the process's peak resident memory.
+    """
+    start = time.perf_counter()
+    get_embedder().model.encode("warm-up")  # Loads the model and the torch kernels (bypassing the cache)
+    get_collection()
+    if VECTOR_BACKEND.startswith("numpy"):
+        get_numpy_index()  # The first export happens here, not in a request
+    get_rag_chain()
+    if include_llm:
+        try:
+            _preload_ollama_model()
+        except Exception as e:
+            print(f"[!] Could not preload the LLM: {e}")
+
+    return {
+        "seconds": round(time.perf_counter() - start, 3),
+        "load_seconds": dict(load_seconds),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1) if resource else None
+    }
+
+if __name__ == "__main__":
+    print("--- WARMING UP SHARED RESOURCES ---")
+    report = warm_up()
+    print(f"\n[+] Warm in {report['seconds']}s, peak RSS {report['peak_rss_mb']} MB")
+    for name, seconds in report["load_seconds"].items():
+        print(f"    - {name}: {seconds}s")
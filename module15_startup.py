@@ -0,0 +1,124 @@
+from pathlib import Path
+from typing import Dict, List
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+# --- CONFIGURATION ---
+PROJECT_DIR = Path(__file__).resolve().parent
+# Modules whose import cost we track (entry points first)
+MODULES = [
+    "main", "module1_check", "module2_ingest", "module4_inference", "module5_embeddings",
+    "module6_vectordb", "module8_rag", "module9_indexing", "module14_resources"
+]
+TOP_N = 8              # Heaviest imported packages shown per module
+HEALTH_TIMEOUT = 30.0  # Seconds to wait for the API server to answer /health
+
+def profile_import(module: str) -> Dict:
+    """
+    Imports `module` in a fresh interpreter with `python -X importtime` and
+    parses the report. Returns the total import time and the heaviest
+    packages the module imports directly.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return {"module": module, "error": result.stderr.strip().splitlines()[-1]}
+
+    # Lines look like: "import time:   self [us] | cumulative | imported package".
+    # Nested imports are indented two spaces per level and are printed *before*
+    # the import that triggered them, so the packages our module pulled in
+    # directly are the level-1 lines just above its own level-0 line.
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((level, name.strip(), int(cumulative)))
+
+    total_us, packages = 0, []
+    for i, (level, name, cumulative) in enumerate(entries):
+        if level == 0 and name == module:
+            total_us = cumulative
+            for child_level, child, child_us in reversed(entries[:i]):
+                if child_level == 0:
+                    break
+                if child_level == 1:
+                    packages.append((child, child_us))
+            break
+
+    heaviest = sorted(packages, key=lambda x: -x[1])[:TOP_N]
+    return {
+        "module": module,
+        "total_ms": round(total_us / 1000, 1),
+        "heaviest": [{"package": n, "ms": round(us / 1000, 1)} for n, us in heaviest]
+    }
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def benchmark_api_startup() -> Dict:
+    """
+    Starts `uvicorn main:app` in a subprocess and measures how long it takes
+    until /health answers. Nothing heavy should be loaded by then.
+    """
+    port = _free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=PROJECT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < HEALTH_TIMEOUT:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    health = response.read().decode("utf-8")
+                return {"health_ready_s": round(time.perf_counter() - start, 3), "health": health}
+            except OSError:
+                time.sleep(0.02)
+        return {"health_ready_s": None, "error": "server did not become healthy"}
+    finally:
+        server.terminate()
+        server.wait()
+
+def benchmark_warm_up() -> Dict:
+    """Time for a fresh process to become fully warm (models, DB, chain), LLM excluded."""
+    code = "import module14_resources as r, json; print(json.dumps(r.warm_up(include_llm=False)))"
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1]}
+    return {"process_s": round(time.perf_counter() - start, 3), "report": result.stdout.strip().splitlines()[-1]}
+
+def print_import_report(modules: List[str]):
+    print("--- IMPORT-TIME PROFILE (fresh interpreter per module) ---")
+    for module in modules:
+        report = profile_import(module)
+        if "error" in report:
+            print(f"[!] {module}: {report['error']}")
+            continue
+        print(f"\n[+] {module}: {report['total_ms']} ms")
+        for item in report["heaviest"]:
+            print(f"    - {item['package']:<30} {item['ms']:>8} ms")
+
+if __name__ == "__main__":
+    # python module15_startup.py            -> import profile + startup benchmark
+    # python module15_startup.py --imports  -> import profile only
+    # python module15_startup.py --warm     -> also time a full warm-up
+    print_import_report(MODULES)
+
+    if "--imports" not in sys.argv:
+        print("\n--- API STARTUP BENCHMARK ---")
+        startup = benchmark_api_startup()
+        print(f"[+] /health ready after {startup.get('health_ready_s')}s: {startup.get('health', startup.get('error'))}")
+
+    if "--warm" in sys.argv:
+        print("\n--- FULL WARM-UP BENCHMARK ---")
+        print(f"[+] {benchmark_warm_up()}")
@@ -0,0 +1,353 @@
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+import json
+import os
+import shutil
+import threading
+import time
+import numpy as np
+
+# --- CONFIGURATION ---
+# A few hundred thousand 384-dim float32 vectors is only a few hundred MB:
+# small enough to search with one matrix multiply, no database round trip.
+INDEX_DIR = Path("./numpy_index")
+EXPORT_BATCH = 5000   # Rows read from Chroma per page when building the index
+IVF_NPROBE = 8        # Clusters scanned per query in approximate mode
+KMEANS_ITERATIONS = 15
+KMEANS_SAMPLE = 50_000  # Vectors used to train the IVF centroids
+# Each build is a new version directory under INDEX_DIR; the CURRENT file names
+# the published one. Replaced versions are deleted once they are older than
+# VERSION_GRACE_SECONDS and not among the KEEP_VERSIONS newest, so a reader
+# that resolved the pointer just before a publish can still load its files.
+CURRENT_FILE = "CURRENT"
+KEEP_VERSIONS = 2
+VERSION_GRACE_SECONDS = 60
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k best scores, best first. argpartition is O(n), only the k winners get sorted."""
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+def resolve_index_dir(directory: Path) -> Path:
+    """The published version under `directory`; a plain (unversioned) index directory is returned as is."""
+    directory = Path(directory)
+    try:
+        return directory / (directory / CURRENT_FILE).read_text().strip()
+    except FileNotFoundError:
+        return directory
+
+def _publish(new: Path, root: Path) -> Path:
+    """
+    Publishes the finished build `new` as a version directory under `root`,
+    then points CURRENT at it with one atomic rename. Readers resolve the
+    pointer once per load, so they see the old version or the new one, never
+    a missing directory. Files are never rewritten in place: a process that
+    still has an old version mapped keeps reading it (its inodes live on until
+    unmapped), like Module 20's temp + rename.
+    """
+    version = root / f"v-{time.time_ns()}-{os.getpid()}-{threading.get_ident()}"
+    os.replace(new, version)
+    pointer = root / f"{CURRENT_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    pointer.write_text(version.name)
+    os.replace(pointer, root / CURRENT_FILE)
+
+    current = resolve_index_dir(root)  # A concurrent builder may have published after us
+    cutoff = time.time_ns() - VERSION_GRACE_SECONDS * 10**9
+    for old in sorted(root.glob("v-*"))[:-KEEP_VERSIONS]:  # Names start with the build time
+        if old != current and int(old.name.split("-")[1]) < cutoff:
+            shutil.rmtree(old, ignore_errors=True)
+    for leftover in root.iterdir():  # Flat files from before versioned builds
+        if leftover.is_file() and leftover.suffix in (".npy", ".bin", ".json"):
+            leftover.unlink(missing_ok=True)
+    return version
+
+def train_ivf(vectors: np.ndarray, n_lists: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Spherical k-means (cosine) for an inverted-file index.
+    Returns (centroids, assignment of every vector to its closest centroid).
+    """
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), min(len(vectors), KMEANS_SAMPLE), replace=False)]
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(n_lists):
+            members = sample[labels == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids = normalize_rows(centroids)
+
+    # Assign the full set in blocks to keep the temporary score matrix small
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for i in range(0, len(vectors), 65536):
+        assignments[i : i + 65536] = np.argmax(vectors[i : i + 65536] @ centroids.T, axis=1)
+    return centroids, assignments
+
+class NumpyVectorIndex:
+    """
+    In-process vector index over one contiguous, L2-normalised float32 matrix.
+
+    Exact mode scores every vector with a single matrix multiply; IVF mode
+    (if built with n_lists) only scores the `nprobe` closest clusters.
+    Everything lives in .npy files opened with mmap, so loading is instant
+    and the OS page cache is shared between worker processes.
+    Metadata filtering uses per-source boolean masks computed once.
+    """
+
+    def __init__(self, directory: Path = INDEX_DIR):
+        self.directory = resolve_index_dir(directory)  # Resolved once: every file below comes from one version
+        info = json.loads((self.directory / "info.json").read_text())
+        self.generation = info.get("generation", 0)
+        self.sources: List[str] = info["sources"]
+        self.ids: List[str] = json.loads((self.directory / "ids.json").read_text())
+
+        load = lambda name: np.load(self.directory / f"{name}.npy", mmap_mode="r")
+        self.vectors = load("vectors")            # (n, dim) float32
+        self.source_codes = load("source_codes")  # (n,) int32 index into self.sources
+        self._text_offsets = load("text_offsets") # (n + 1,) int64 byte offsets into texts.bin
+        self._texts = np.memmap(self.directory / "texts.bin", dtype=np.uint8, mode="r") \
+            if self._text_offsets[-1] > 0 else np.empty(0, dtype=np.uint8)
+
+        self.centroids = None
+        if (self.directory / "ivf_centroids.npy").exists():
+            self.centroids = load("ivf_centroids")
+            self._ivf_rows = load("ivf_rows")        # row ids grouped by cluster
+            self._ivf_offsets = load("ivf_offsets")  # cluster c = rows[offsets[c]:offsets[c+1]]
+        self._masks: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # --- BUILD ---
+
+    @staticmethod
+    def build(directory: Path, ids: List[str], vectors: np.ndarray, texts: List[str],
+              sources: List[str], n_lists: Optional[int] = None, generation: int = 0) -> "NumpyVectorIndex":
+        """
+        Writes a new index version under `directory` and publishes it.
+        n_lists=None builds exact-only; e.g. int(sqrt(n)) adds IVF.
+        """
+        root = Path(directory)
+        root.mkdir(parents=True, exist_ok=True)
+        directory = root / f".build-{os.getpid()}-{threading.get_ident()}"
+        shutil.rmtree(directory, ignore_errors=True)
+        directory.mkdir()
+        vectors = normalize_rows(vectors)
+        np.save(directory / "vectors.npy", vectors)
+
+        source_names = sorted(set(sources))
+        code_of = {name: i for i, name in enumerate(source_names)}
+        np.save(directory / "source_codes.npy", np.array([code_of[s] for s in sources], dtype=np.int32))
+
+        encoded = [t.encode("utf-8") for t in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        np.save(directory / "text_offsets.npy", offsets)
+        with open(directory / "texts.bin", "wb") as f:
+            for b in encoded:
+                f.write(b)
+
+        if n_lists and len(vectors) >= n_lists:
+            centroids, assignments = train_ivf(vectors, n_lists)
+            rows = np.argsort(assignments, kind="stable").astype(np.int64)
+            list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+            np.cumsum(np.bincount(assignments, minlength=n_lists), out=list_offsets[1:])
+            np.save(directory / "ivf_centroids.npy", centroids)
+            np.save(directory / "ivf_rows.npy", rows)
+            np.save(directory / "ivf_offsets.npy", list_offsets)
+
+        (directory / "ids.json").write_text(json.dumps(ids))
+        (directory / "info.json").write_text(json.dumps({
+            "count": len(ids), "dim": int(vectors.shape[1]), "sources": source_names,
+            "n_lists": n_lists, "generation": generation
+        }))
+        return NumpyVectorIndex(_publish(directory, root))
+
+    @staticmethod
+    def build_from_chroma(collection, directory: Path = INDEX_DIR, n_lists: Optional[int] = None) -> "NumpyVectorIndex":
+        """Exports every stored vector from a Chroma collection (paged) into a new index."""
+        from module13_semantic_cache import read_generation
+
+        generation = read_generation()  # Read first: a concurrent ingest makes the index look stale, not fresh
+        ids, vectors, texts, sources = [], [], [], []
+        offset = 0
+        while True:
+            page = collection.get(include=["embeddings", "documents", "metadatas"], limit=EXPORT_BATCH, offset=offset)
+            if not page["ids"]:
+                break
+            ids.extend(page["ids"])
+            vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+            texts.extend(page["documents"])
+            sources.extend((m or {}).get("source", "") for m in page["metadatas"])
+            offset += len(page["ids"])
+
+        matrix = np.concatenate(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+        if n_lists is None and len(ids) >= 10_000:
+            n_lists = int(np.sqrt(len(ids)))
+        return NumpyVectorIndex.build(directory, ids, matrix, texts, sources, n_lists, generation)
+
+    # --- SEARCH ---
+
+    def text(self, row: int) -> str:
+        start, end = self._text_offsets[row], self._text_offsets[row + 1]
+        return bytes(self._texts[start:end]).decode("utf-8")
+
+    def source_mask(self, sources: Iterable[str]) -> np.ndarray:
+        """Boolean row mask for a set of sources (each per-source mask is computed once and reused)."""
+        mask = np.zeros(len(self), dtype=bool)
+        for source in sources:
+            if source not in self._masks:
+                code = self.sources.index(source) if source in self.sources else -1
+                self._masks[source] = np.asarray(self.source_codes) == code
+            mask |= self._masks[source]
+        return mask
+
+    def search(self, query: np.ndarray, k: int = 4, sources: Optional[Iterable[str]] = None,
+               approximate: bool = False, nprobe: int = IVF_NPROBE) -> List[Tuple[int, float]]:
+        """Returns [(row, cosine score)] best first. `sources` restricts results to those sources."""
+        if not len(self):
+            return []  # Empty export: nothing to multiply against
+        query = normalize_rows(query)
+        mask = self.source_mask(sources) if sources is not None else None
+
+        if approximate and self.centroids is not None:
+            clusters = top_k(self.centroids @ query, nprobe)
+            rows = np.concatenate([self._ivf_rows[self._ivf_offsets[c] : self._ivf_offsets[c + 1]] for c in clusters])
+            if mask is not None:
+                rows = rows[mask[rows]]
+            scores = self.vectors[rows] @ query
+            best = top_k(scores, k)
+            return [(int(rows[i]), float(scores[i])) for i in best]
+
+        scores = self.vectors @ query
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        best = [i for i in top_k(scores, k) if np.isfinite(scores[i])]
+        return [(int(i), float(scores[i])) for i in best]
+
+    def search_batch(self, queries: np.ndarray, k: int = 4) -> List[List[Tuple[int, float]]]:
+        """Exact search for many queries with one (n x b) matrix multiply."""
+        if not len(self):
+            return [[] for _ in queries]
+        scores = self.vectors @ normalize_rows(queries).T
+        return [[(int(i), float(scores[i, j])) for i in top_k(scores[:, j], k)] for j in range(scores.shape[1])]
+
+class NumpyRetriever:
+    """
+    Retriever over a NumpyVectorIndex with the invoke/ainvoke interface the RAG
+    pipeline (Module 8) uses. Returns LangChain Documents.
+    `index` may also be a zero-argument function returning the current index
+    (module14_resources.get_numpy_index, which swaps in a refreshed export in the
+    background after ingests); it is called once per search, so a refresh is
+    picked up by the next search.
+    """
+
+    def __init__(self, index: Union[NumpyVectorIndex, Callable[[], NumpyVectorIndex]], embedder, k: int = 1,
+                 approximate: bool = False, sources: Optional[List[str]] = None):
+        self._index = index
+        self.embedder = embedder
+        self.k = k
+        self.approximate = approximate
+        self.sources = sources
+
+    @property
+    def index(self) -> NumpyVectorIndex:
+        return self._index() if callable(self._index) else self._index
+
+    @staticmethod
+    def _documents(index: NumpyVectorIndex, hits: List[Tuple[int, float]]) -> List:
+        from langchain_core.documents import Document
+        return [
+            Document(
+                id=index.ids[row],
+                page_content=index.text(row),
+                metadata={"source": index.sources[index.source_codes[row]], "score": score}
+            )
+            for row, score in hits
+        ]
+
+    def invoke(self, question: str) -> List:
+        index = self.index  # One snapshot per search: rows and ids must come from the same export
+        hits = index.search(self.embedder.encode(question), self.k, self.sources, self.approximate)
+        return self._documents(index, hits)
+
+    def invoke_batch(self, questions: List[str]) -> List[List]:
+        """One embedding call for all questions; exact mode also scores them with one matrix multiply."""
+        index = self.index
+        queries = self.embedder.encode(questions)
+        if self.approximate or self.sources is not None:
+            hits = [index.search(q, self.k, self.sources, self.approximate) for q in queries]
+        else:
+            hits = index.search_batch(queries, self.k)
+        return [self._documents(index, h) for h in hits]
+
+    async def ainvoke(self, question: str) -> List:
+        import asyncio
+        return await asyncio.to_thread(self.invoke, question)
+
+# --- BENCHMARK ---
+
+def recall_at_k(truth: List[List[int]], found: List[List[int]]) -> float:
+    return float(np.mean([len(set(t) & set(f)) / len(t) for t, f in zip(truth, found) if t]))
+
+def benchmark(index: NumpyVectorIndex, collection=None, queries: int = 200, k: int = 10) -> List[Dict]:
+    """
+    Recall@k vs latency. Ground truth is exact search; queries are perturbed
+    copies of stored vectors. Chroma (HNSW) is measured on the same queries.
+    """
+    rng = np.random.default_rng(0)
+    picks = rng.choice(len(index), min(queries, len(index)), replace=False)
+    query_vectors = normalize_rows(index.vectors[picks] + rng.normal(0, 0.05, (len(picks), index.vectors.shape[1])))
+
+    def run(name, search):
+        start = time.perf_counter()
+        found = [search(q) for q in query_vectors]
+        ms = (time.perf_counter() - start) * 1000 / len(query_vectors)
+        return {"backend": name, "recall_at_k": round(recall_at_k(truth, found), 4), "ms_per_query": round(ms, 3)}
+
+    truth = [[r for r, _ in index.search(q, k)] for q in query_vectors]
+    results = [run("numpy-exact", lambda q: [r for r, _ in index.search(q, k)])]
+    if index.centroids is not None:
+        for nprobe in (1, 2, 4, 8, 16, 32):
+            results.append(run(f"numpy-ivf(nprobe={nprobe})",
+                               lambda q: [r for r, _ in index.search(q, k, approximate=True, nprobe=nprobe)]))
+    if collection is not None:
+        row_of = {chunk_id: row for row, chunk_id in enumerate(index.ids)}
+        results.append(run("chroma", lambda q: [
+            row_of[i] for i in collection.query(query_embeddings=[q.tolist()], n_results=k, include=[])["ids"][0]
+        ]))
+    return results
+
+if __name__ == "__main__":
+    import sys
+
+    # python module16_vector_index.py                     -> export Chroma, benchmark against it
+    # python module16_vector_index.py --synthetic 300000  -> random corpus of that size, no Chroma
+    if "--synthetic" in sys.argv:
+        n = int(sys.argv[sys.argv.index("--synthetic") + 1])
+        print(f"--- BUILDING SYNTHETIC INDEX ({n} x 384) ---")
+        rng = np.random.default_rng(1)
+        # Clustered data behaves like real embeddings far better than uniform noise
+        centers = rng.normal(size=(256, 384))
+        data = centers[rng.integers(0, 256, n)] + rng.normal(0, 0.6, (n, 384))
+        index = NumpyVectorIndex.build(INDEX_DIR.with_name("numpy_index_synthetic"), [str(i) for i in range(n)], data,
+                                       [""] * n, [f"file_{i % 20}" for i in range(n)], n_lists=int(np.sqrt(n)))
+        db_collection = None
+    else:
+        from module14_resources import get_collection
+        print("--- EXPORTING CHROMA COLLECTION TO NUMPY INDEX ---")
+        db_collection = get_collection()
+        index = NumpyVectorIndex.build_from_chroma(db_collection)
+
+    print(f"[+] Index ready: {len(index)} vectors, IVF={'yes' if index.centroids is not None else 'no'}")
+    print("\n--- RECALL@10 VS LATENCY ---")
+    for row in benchmark(index, db_collection):
+        print(f"    {row['backend']:<24} recall={row['recall_at_k']:<8} {row['ms_per_query']} ms/query")
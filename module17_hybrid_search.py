@@ -0,0 +1,258 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+import math
+import os
+import re
+import sqlite3
+import threading
+
+# --- CONFIGURATION ---
+# Dense (MiniLM) retrieval is weak on exact tokens like "extension 4455" or
+# "vpn.enterprise.local". A BM25 inverted index catches those; reciprocal
+# rank fusion (RRF) merges both rankings without having to calibrate scores.
+INDEX_PATH = Path("./chroma_storage/bm25.sqlite")
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60           # Standard RRF damping constant
+CANDIDATES = 20      # Results taken from each retriever before fusion
+EXPORT_BATCH = 5000  # Rows read from Chroma per page when rebuilding
+# Optional cap on the postings scored per query term (highest term frequency
+# first); 0 = exact BM25. A cap bounds query cost on very large corpora, but
+# when every query term is common it can miss documents that match them all.
+MAX_POSTINGS_PER_TERM = int(os.getenv("BM25_MAX_POSTINGS", "0"))
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[._@-][a-z0-9]+)*")
+# Function words appear in nearly every chunk: their postings would be the
+# largest in the index and their near-zero IDF adds nothing to the ranking.
+# Indexes built before this list existed still hold their postings; search
+# skips them, and a rebuild drops them.
+STOPWORDS = frozenset((
+    "a an and are as at be been but by can could did do does for from had has have he her his how i if in "
+    "into is it its me my no not of on or our she so than that the their them then there these they this "
+    "those to was we were what when where which who whom why will with would you your"
+).split())
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word tokens, without stopwords. Dotted/hyphenated compounds are
+    kept whole *and* split, so "vpn.enterprise.local" matches both itself and "vpn".
+    """
+    tokens = []
+    for match in _TOKEN_RE.findall(text.lower()):
+        if match not in STOPWORDS:
+            tokens.append(match)
+        parts = re.split(r"[._@-]", match)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part not in STOPWORDS)
+    return tokens
+
+class BM25Index:
+    """
+    Incremental BM25 inverted index stored in SQLite.
+
+    add()/delete() touch only the postings of the given chunks, so
+    re-ingesting one file never rebuilds the whole index. Corpus statistics
+    (document count, total length) are kept in a meta table.
+    search() scores inside SQLite, on a per-thread read connection (WAL), so
+    queries neither hold the writer's lock nor wait for each other.
+    """
+
+    def __init__(self, path: Path = INDEX_PATH):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()  # Serialises writes on self._db
+        self._readers = threading.local()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS docs (chunk_id TEXT PRIMARY KEY, source TEXT, length INTEGER, text TEXT);
+            CREATE TABLE IF NOT EXISTS postings (term TEXT, chunk_id TEXT, tf INTEGER, PRIMARY KEY (term, chunk_id)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_by_chunk ON postings (chunk_id);
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER);
+            INSERT OR IGNORE INTO meta VALUES ('doc_count', 0), ('total_length', 0);
+        """)
+        if MAX_POSTINGS_PER_TERM > 0:
+            self._db.execute("CREATE INDEX IF NOT EXISTS postings_by_tf ON postings (term, tf DESC)")
+
+    def _bump_stats(self, docs: int, length: int):
+        self._db.execute("UPDATE meta SET value = value + ? WHERE name = 'doc_count'", (docs,))
+        self._db.execute("UPDATE meta SET value = value + ? WHERE name = 'total_length'", (length,))
+
+    def _delete_locked(self, chunk_ids: List[str]):
+        for chunk_id in chunk_ids:
+            row = self._db.execute("SELECT length FROM docs WHERE chunk_id = ?", (chunk_id,)).fetchone()
+            if row is None:
+                continue
+            self._db.execute("DELETE FROM postings WHERE chunk_id = ?", (chunk_id,))
+            self._db.execute("DELETE FROM docs WHERE chunk_id = ?", (chunk_id,))
+            self._bump_stats(-1, -row[0])
+
+    def add(self, records: Iterable[Dict]):
+        """Indexes chunk records (chunk_id, text, source). Existing IDs are replaced."""
+        with self._lock, self._db:
+            for record in records:
+                terms = Counter(tokenize(record["text"]))
+                length = sum(terms.values())
+                self._delete_locked([record["chunk_id"]])
+                self._db.execute("INSERT INTO docs VALUES (?, ?, ?, ?)",
+                                 (record["chunk_id"], record["source"], length, record["text"]))
+                self._db.executemany("INSERT INTO postings VALUES (?, ?, ?)",
+                                     [(term, record["chunk_id"], tf) for term, tf in terms.items()])
+                self._bump_stats(1, length)
+
+    def delete(self, chunk_ids: List[str]):
+        with self._lock, self._db:
+            self._delete_locked(chunk_ids)
+
+    def _reader(self) -> sqlite3.Connection:
+        reader = getattr(self._readers, "db", None)
+        if reader is None:
+            reader = self._readers.db = sqlite3.connect(self.path, isolation_level=None)
+        return reader
+
+    def count(self) -> int:
+        return self._reader().execute("SELECT value FROM meta WHERE name = 'doc_count'").fetchone()[0]
+
+    def search(self, query: str, k: int = CANDIDATES) -> List[Tuple[str, float]]:
+        """Returns [(chunk_id, bm25 score)] best first."""
+        query_tf = Counter(tokenize(query))
+        if not query_tf:
+            return []
+        db = self._reader()
+        db.execute("BEGIN")  # One read snapshot: statistics and postings agree
+        try:
+            return self._score(db, query_tf, k)
+        finally:
+            db.execute("COMMIT")
+
+    @staticmethod
+    def _score(db: sqlite3.Connection, query_tf: Counter, k: int) -> List[Tuple[str, float]]:
+        stats = dict(db.execute("SELECT name, value FROM meta").fetchall())
+        n_docs = stats["doc_count"]
+        if n_docs == 0:
+            return []
+        placeholders = ",".join("?" * len(query_tf))
+        doc_freq = db.execute(
+            f"SELECT term, COUNT(*) FROM postings WHERE term IN ({placeholders}) GROUP BY term", list(query_tf)
+        ).fetchall()
+        if not doc_freq:
+            return []
+
+        # Per term: its weight (query tf x IDF) and its postings (the top ones by tf, if capped)
+        cap = " ORDER BY tf DESC LIMIT ?" if MAX_POSTINGS_PER_TERM > 0 else ""
+        parts, params = [], []
+        for term, df in doc_freq:
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            parts.append(f"SELECT * FROM (SELECT chunk_id, tf, ? AS weight FROM postings WHERE term = ?{cap})")
+            params += [query_tf[term] * idf, term] + ([MAX_POSTINGS_PER_TERM] if cap else [])
+        length_norm = f"{BM25_K1} * (1 - {BM25_B} + {BM25_B} * d.length / ?)"
+        return db.execute(
+            f"SELECT h.chunk_id, SUM(h.weight * h.tf * {BM25_K1 + 1} / (h.tf + {length_norm})) AS score "
+            f"FROM ({' UNION ALL '.join(parts)}) h JOIN docs d USING (chunk_id) "
+            "GROUP BY h.chunk_id ORDER BY score DESC LIMIT ?",
+            [stats["total_length"] / n_docs] + params + [k]  # The length-norm placeholder comes first
+        ).fetchall()
+
+    def documents(self, chunk_ids: List[str]) -> Dict[str, Tuple[str, str]]:
+        """chunk_id -> (text, source) for the given IDs."""
+        if not chunk_ids:
+            return {}
+        placeholders = ",".join("?" * len(chunk_ids))
+        rows = self._reader().execute(
+            f"SELECT chunk_id, text, source FROM docs WHERE chunk_id IN ({placeholders})", chunk_ids
+        ).fetchall()
+        return {chunk_id: (text, source) for chunk_id, text, source in rows}
+
+    def rebuild_from_chroma(self, collection):
+        """One-off bootstrap for collections ingested before the lexical index existed."""
+        offset = 0
+        while True:
+            page = collection.get(include=["documents", "metadatas"], limit=EXPORT_BATCH, offset=offset)
+            if not page["ids"]:
+                break
+            self.add({"chunk_id": i, "text": t, "source": (m or {}).get("source", "")}
+                     for i, t, m in zip(page["ids"], page["documents"], page["metadatas"]))
+            offset += len(page["ids"])
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Merges ranked ID lists: score(id) = sum over lists of 1 / (k + rank)."""
+    scores = Counter()
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] += 1.0 / (k + rank)
+    return scores.most_common()
+
+def _doc_key(doc) -> str:
+    # Chroma-backed Documents carry the chunk ID; fall back to the text itself
+    return getattr(doc, "id", None) or doc.page_content
+
+class HybridRetriever:
+    """
+    Runs dense and BM25 retrieval in parallel and fuses them with RRF.
+    Exposes the invoke/ainvoke interface the RAG pipeline (Module 8) uses.
+    `dense` should be configured to return `candidates` results.
+    """
+
+    _pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid")
+
+    def __init__(self, dense, lexical: BM25Index, k: int = 1, candidates: int = CANDIDATES):
+        self.dense = dense
+        self.lexical = lexical
+        self.k = k
+        self.candidates = candidates
+
+    def _fuse(self, dense_docs: List, lexical_hits: List[Tuple[str, float]]) -> List:
+        from langchain_core.documents import Document
+
+        by_key = {_doc_key(doc): doc for doc in dense_docs}
+        fused = reciprocal_rank_fusion([list(by_key), [chunk_id for chunk_id, _ in lexical_hits]])[: self.k]
+
+        # Lexical-only winners need their text fetched from the index
+        missing = [key for key, _ in fused if key not in by_key]
+        for chunk_id, (text, source) in self.lexical.documents(missing).items():
+            by_key[chunk_id] = Document(id=chunk_id, page_content=text, metadata={"source": source})
+        results = []
+        for key, score in fused:
+            if key in by_key:
+                by_key[key].metadata["score"] = score  # Fused score, used to order the context (Module 21)
+                results.append(by_key[key])
+        return results
+
+    def invoke(self, question: str) -> List:
+        lexical = self._pool.submit(self.lexical.search, question, self.candidates)
+        dense_docs = self.dense.invoke(question)
+        return self._fuse(dense_docs, lexical.result())
+
+    def invoke_batch(self, questions: List[str]) -> List[List]:
+        """Batched dense retrieval (the dense retriever must have invoke_batch) fused per question."""
+        lexical = [self._pool.submit(self.lexical.search, q, self.candidates) for q in questions]
+        dense_docs = self.dense.invoke_batch(questions)
+        return [self._fuse(docs, hits.result()) for docs, hits in zip(dense_docs, lexical)]
+
+    async def ainvoke(self, question: str) -> List:
+        import asyncio
+        dense_docs, lexical_hits = await asyncio.gather(
+            self.dense.ainvoke(question),
+            asyncio.to_thread(self.lexical.search, question, self.candidates)
+        )
+        return self._fuse(dense_docs, lexical_hits)
+
+if __name__ == "__main__":
+    import sys
+    from module14_resources import get_collection, get_lexical_index, get_retriever
+
+    # python module17_hybrid_search.py --rebuild  -> index everything already stored in Chroma
+    index = get_lexical_index()
+    if "--rebuild" in sys.argv or index.count() == 0:
+        print("--- BUILDING BM25 INDEX FROM CHROMA ---")
+        index.rebuild_from_chroma(get_collection())
+    print(f"[+] BM25 index holds {index.count()} chunks.")
+
+    retriever = get_retriever(k=3)
+    for question in ["Who do I call on extension 4455?", "vpn.enterprise.local"]:
+        print(f"\n--- QUERY: {question} ---")
+        print(f"BM25 : {index.search(question, 3)}")
+        for doc in retriever.invoke(question):
+            print(f"Fused: [{doc.metadata.get('source')}] {doc.page_content[:80]}")
@@ -0,0 +1,175 @@
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import re
+
+# --- CONFIGURATION ---
+# all-MiniLM-L6-v2 reads at most 256 word pieces (including [CLS] and [SEP]);
+# anything longer is silently truncated, so chunks are sized in *tokens*.
+TOKENIZER_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+CHUNK_TOKENS = 240     # Target upper bound per chunk (leaves room for special tokens)
+OVERLAP_TOKENS = 32    # Trailing sentences repeated at the start of the next chunk
+MIN_FILL = 0.5         # Only end a chunk at a paragraph break once it is at least this full
+SEGMENT_CHARS = 64 * 1024  # Streaming: max text carried while looking for a paragraph break
+
+# A paragraph ends at a blank line; a sentence ends at . ! ? (plus closing quotes/brackets)
+# or at a single line break (list items, headings).
+_PARAGRAPH_RE = re.compile(r"\n[ \t]*\n\s*")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])[\"')\]]*\s+|\n\s*")
+_WORD_RE = re.compile(r"\S+\s*")
+
+@lru_cache(maxsize=1)
+def get_token_counter() -> Callable[[List[str]], List[int]]:
+    """
+    Batched token counter using MiniLM's own (fast, Rust) tokenizer: one call
+    counts a whole list of sentences. Falls back to a word-based estimate when
+    transformers is not installed.
+    """
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(TOKENIZER_NAME)
+    except Exception as e:
+        print(f"[!] Tokenizer unavailable ({e}); estimating token counts.")
+        return lambda texts: [int(len(re.findall(r"\w+|[^\w\s]", t)) * 1.3) + 1 for t in texts]
+
+    def count(texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+    return count
+
+def split_units(text: str) -> List[Tuple[str, bool]]:
+    """
+    Splits text into sentence units, each keeping its trailing whitespace so
+    chunks can be re-joined without changing the original formatting.
+    Returns [(unit, starts_paragraph)].
+    """
+    units = []
+    position = 0
+    paragraph_ends = [m.end() for m in _PARAGRAPH_RE.finditer(text)] + [len(text)]
+    for end in paragraph_ends:
+        paragraph = text[position:end]
+        start = 0
+        first = True
+        for match in _SENTENCE_RE.finditer(paragraph):
+            if match.end() > start and paragraph[start:match.start()].strip():
+                units.append((paragraph[start:match.end()], first))
+                first = False
+                start = match.end()
+        if paragraph[start:].strip():
+            units.append((paragraph[start:], first))
+        position = end
+    return units
+
+class SentenceChunker:
+    """
+    Packs whole sentences into chunks of at most `max_tokens` MiniLM tokens,
+    preferring to end chunks at paragraph breaks, and repeats up to
+    `overlap_tokens` of trailing sentences at the start of the next chunk.
+    Sentences longer than the budget are split at word boundaries.
+
+    Works incrementally: stream() accepts text windows of any size.
+    """
+
+    def __init__(self, max_tokens: int = CHUNK_TOKENS, overlap_tokens: int = OVERLAP_TOKENS,
+                 count_tokens: Optional[Callable[[List[str]], List[int]]] = None):
+        if max_tokens <= 0 or not 0 <= overlap_tokens < max_tokens:
+            raise ValueError(f"Need max_tokens > overlap_tokens >= 0, got {max_tokens} / {overlap_tokens}")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self._count_tokens = count_tokens
+        self._pending: List[Tuple[str, int]] = []  # (unit text, tokens) in the chunk being built
+        self._pending_tokens = 0
+        self._fresh = 0  # Units added since the last emitted chunk
+
+    @property
+    def count_tokens(self):
+        if self._count_tokens is None:
+            self._count_tokens = get_token_counter()
+        return self._count_tokens
+
+    def settings(self) -> Dict:
+        """Part of the ingestion fingerprint: changing these must re-chunk the file."""
+        return {"strategy": "sentence", "max_tokens": self.max_tokens, "overlap_tokens": self.overlap_tokens}
+
+    def _split_long(self, unit: str) -> List[Tuple[str, int]]:
+        words = _WORD_RE.findall(unit)
+        pieces, current, current_tokens = [], "", 0
+        for word, tokens in zip(words, self.count_tokens([w.strip() for w in words])):
+            if current and current_tokens + tokens > self.max_tokens:
+                pieces.append((current, current_tokens))
+                current, current_tokens = "", 0
+            current += word
+            current_tokens += tokens
+        if current:
+            pieces.append((current, current_tokens))
+        return pieces
+
+    def _emit(self) -> str:
+        chunk = "".join(text for text, _ in self._pending).strip()
+        # Keep the tail (whole sentences, within the overlap budget) for the next chunk
+        keep, kept_tokens = [], 0
+        for text, tokens in reversed(self._pending):
+            if kept_tokens + tokens > self.overlap_tokens:
+                break
+            keep.insert(0, (text, tokens))
+            kept_tokens += tokens
+        self._pending, self._pending_tokens, self._fresh = keep, kept_tokens, 0
+        return chunk
+
+    def feed(self, text: str) -> Iterator[str]:
+        """Adds a segment of text (ideally ending at a paragraph break) and yields finished chunks."""
+        units = split_units(text)
+        # One batched tokenizer call for every sentence in the segment
+        counts = self.count_tokens([u.strip() for u, _ in units])
+        for (unit, starts_paragraph), tokens in zip(units, counts):
+            pieces = self._split_long(unit) if tokens > self.max_tokens else [(unit, tokens)]
+            for piece, piece_tokens in pieces:
+                overflow = self._pending_tokens + piece_tokens > self.max_tokens
+                paragraph_break = starts_paragraph and self._pending_tokens >= MIN_FILL * self.max_tokens
+                if self._pending and (overflow or paragraph_break):
+                    yield self._emit()
+                    # Overlap that no longer fits next to this piece is dropped
+                    while self._pending and self._pending_tokens + piece_tokens > self.max_tokens:
+                        self._pending_tokens -= self._pending.pop(0)[1]
+                self._pending.append((piece, piece_tokens))
+                self._pending_tokens += piece_tokens
+                self._fresh += 1
+                starts_paragraph = False
+
+    def flush(self) -> Iterator[str]:
+        """Yields the last partial chunk (unless it is only overlap already emitted)."""
+        if self._fresh:
+            yield self._emit()
+        self._pending, self._pending_tokens = [], 0
+
+    def stream(self, windows: Iterable[str]) -> Iterator[str]:
+        """
+        Chunks a stream of text windows (e.g. module2_ingest.iter_text_windows).
+        Text is handed to feed() in segments cut at paragraph breaks, so sentence
+        splitting never sees half a sentence from a window boundary.
+        """
+        buffer = ""
+        for window in windows:
+            buffer += window
+            cut = max((m.end() for m in _PARAGRAPH_RE.finditer(buffer)), default=-1)
+            if cut == -1 and len(buffer) > SEGMENT_CHARS:
+                # No paragraph break for a long stretch: cut at the last line or sentence end
+                cut = max((m.end() for m in _SENTENCE_RE.finditer(buffer)), default=len(buffer))
+            if cut > 0:
+                yield from self.feed(buffer[:cut])
+                buffer = buffer[cut:]
+        yield from self.feed(buffer)
+        yield from self.flush()
+
+if __name__ == "__main__":
+    from module2_ingest import CHUNK_SIZE, load_document, simple_chunker
+
+    print("--- COMPARING CHUNKERS ON sample_mission.txt ---")
+    text = load_document("sample_mission.txt")
+    fixed = simple_chunker(text, CHUNK_SIZE)
+    sentence = list(SentenceChunker(max_tokens=64, overlap_tokens=16).stream([text]))
+
+    print(f"[+] Fixed {CHUNK_SIZE}-char chunks: {len(fixed)} (first ends with: ...{fixed[0][-30:]!r})")
+    print(f"[+] Sentence-aware 64-token chunks: {len(sentence)}")
+    for i, chunk in enumerate(sentence):
+        print(f"\n    [{i}] {chunk}")
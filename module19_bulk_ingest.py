@@ -0,0 +1,368 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, List, Optional
+import json
+import os
+import threading
+import time
+import uuid
+
+try:
+    import fcntl  # Unix only; used to give each job to exactly one process
+except ImportError:
+    fcntl = None
+
+from module2_ingest import DATA_DIR, CHUNK_SIZE, file_fingerprint
+from module28_extractors import EXTRACT_WORKERS, extraction_pool, write_document
+
+# --- CONFIGURATION ---
+# A bulk job ingests every file under DATA_DIR matching a glob. Files are
+# processed by a small thread pool (embedding releases the GIL in torch,
+# upserts in Chroma's client). Extraction and chunking hold the GIL, so each
+# thread hands them to a shared process pool (Module 28) whose workers write
+# the chunk store directly. Progress is checkpointed after every file, so a
+# crashed server resumes where it stopped.
+JOB_DIR = Path("./chroma_storage/jobs")
+JOB_WORKERS = 4          # Files ingested concurrently per job
+MAX_IN_FLIGHT = 2        # Files queued per worker before the producer waits (backpressure)
+FINISHED = ("completed", "cancelled", "failed")
+
+class JobCancelled(Exception):
+    """Raised inside a worker to abandon the file it is ingesting."""
+
+def _lock_job(job_id: str) -> Optional[int]:
+    """
+    Exclusive, non-blocking lock on a job across processes (e.g. uvicorn
+    --workers N all resuming at startup). Returns the open lock file
+    descriptor, or None if another process already runs the job. The OS
+    drops the lock when its holder exits, so a crashed job can be resumed.
+    Without fcntl (Windows) every caller gets the job.
+    """
+    JOB_DIR.mkdir(parents=True, exist_ok=True)
+    fd = os.open(JOB_DIR / f"{job_id}.lock", os.O_RDWR | os.O_CREAT)
+    if fcntl is not None:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return None
+    return fd
+
+def make_chunker(chunking: Dict):
+    """Builds the chunker described by a job's settings (None = fixed-size characters)."""
+    if chunking.get("strategy", "sentence") != "sentence":
+        return None
+    from module18_chunking import CHUNK_TOKENS, OVERLAP_TOKENS, SentenceChunker
+    return SentenceChunker(chunking.get("chunk_tokens", CHUNK_TOKENS), chunking.get("overlap_tokens", OVERLAP_TOKENS))
+
+def resolve_pattern(pattern: str) -> List[str]:
+    """
+    Expands a glob (or a directory name) relative to DATA_DIR into sorted
+    filenames relative to DATA_DIR. Patterns may not leave DATA_DIR.
+    """
+    if Path(pattern).is_absolute() or ".." in Path(pattern).parts:
+        raise ValueError(f"Pattern must stay inside {DATA_DIR}: {pattern}")
+    if (DATA_DIR / pattern).is_dir():
+        pattern = str(Path(pattern) / "**" / "*")
+    return sorted(str(p.relative_to(DATA_DIR)) for p in DATA_DIR.glob(pattern) if p.is_file())
+
+class IngestJob:
+    """
+    One bulk ingestion run. All state that matters for resuming (file list,
+    files done/failed, settings) lives in a JSON checkpoint under JOB_DIR.
+    """
+
+    def __init__(self, job_id: str, pattern: str, files: List[str], chunking: Dict,
+                 force: bool = False, workers: int = JOB_WORKERS):
+        self.job_id = job_id
+        self.pattern = pattern
+        self.files = files
+        self.chunking = chunking
+        self.force = force
+        self.workers = workers
+        self.status = "queued"
+        self.done: List[str] = []
+        self.failed: Dict[str, str] = {}
+        self.chunks_processed = 0
+        self.chunks_embedded = 0
+        self.created_at = time.time()
+        self.error: Optional[str] = None
+        self.cancel_event = threading.Event()
+        self.lock_fd: Optional[int] = None  # Held (see _lock_job) while this process owns the job
+        self._lock = threading.Lock()
+        # Rates are measured over this run only (not over work done before a resume)
+        self._run_started: Optional[float] = None
+        self._run_finished: Optional[float] = None
+        self._run_bytes = 0
+        self._run_chunks = 0
+        self._sizes = {f: _size(f) for f in files}
+
+    @property
+    def path(self) -> Path:
+        return JOB_DIR / f"{self.job_id}.json"
+
+    def mark_running(self):
+        with self._lock:
+            self.status = "running"
+            self._run_started = time.perf_counter()
+            self._run_bytes = self._run_chunks = 0
+        self.checkpoint()
+
+    def mark_finished(self, status: str, error: Optional[str] = None):
+        with self._lock:
+            self.status, self.error = status, error
+            self._run_finished = time.perf_counter()
+        self.checkpoint()
+
+    def remaining(self) -> List[str]:
+        finished = set(self.done) | set(self.failed)
+        return [f for f in self.files if f not in finished]
+
+    def checkpoint(self):
+        """Writes the job state atomically (temp file + rename), like the Module 9 manifests."""
+        JOB_DIR.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            state = {
+                "job_id": self.job_id, "pattern": self.pattern, "files": self.files,
+                "chunking": self.chunking, "force": self.force, "workers": self.workers,
+                "status": self.status, "done": self.done, "failed": self.failed,
+                "chunks_processed": self.chunks_processed, "chunks_embedded": self.chunks_embedded,
+                "created_at": self.created_at, "error": self.error
+            }
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    @classmethod
+    def load(cls, path: Path) -> "IngestJob":
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        job = cls(state["job_id"], state["pattern"], state["files"], state["chunking"],
+                  state["force"], state["workers"])
+        job.status = state["status"]
+        job.done, job.failed = state["done"], state["failed"]
+        job.chunks_processed, job.chunks_embedded = state["chunks_processed"], state["chunks_embedded"]
+        job.created_at, job.error = state["created_at"], state["error"]
+        return job
+
+    def record_file(self, filename: str, stats: Optional[Dict] = None, error: Optional[str] = None):
+        with self._lock:
+            if error is None:
+                self.done.append(filename)
+                self.chunks_processed += stats["chunks_total"]
+                self.chunks_embedded += stats["chunks_indexed"]
+                self._run_chunks += stats["chunks_total"]
+            else:
+                self.failed[filename] = error
+            self._run_bytes += self._sizes.get(filename, 0)
+        self.checkpoint()
+
+    def progress(self) -> Dict:
+        """Status for the API: files done, throughput over this run and a byte-based ETA."""
+        with self._lock:
+            elapsed = (self._run_finished or time.perf_counter()) - self._run_started if self._run_started else 0.0
+            remaining_bytes = sum(self._sizes.get(f, 0) for f in self.remaining())
+            bytes_per_sec = self._run_bytes / elapsed if elapsed > 0 else 0.0
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "pattern": self.pattern,
+                "files_total": len(self.files),
+                "files_done": len(self.done),
+                "files_failed": len(self.failed),
+                "chunks_processed": self.chunks_processed,
+                "chunks_embedded": self.chunks_embedded,
+                "chunks_per_sec": round(self._run_chunks / elapsed, 1) if elapsed > 0 else 0.0,
+                "elapsed_s": round(elapsed, 1),
+                "eta_s": round(remaining_bytes / bytes_per_sec, 1) if bytes_per_sec > 0 and self.status == "running" else None,
+                "errors": dict(list(self.failed.items())[:20]),  # First few only; the checkpoint has them all
+                "error": self.error
+            }
+
+def _size(filename: str) -> int:
+    try:
+        return (DATA_DIR / filename).stat().st_size
+    except OSError:
+        return 0
+
+class JobManager:
+    """
+    Runs bulk ingestion jobs in the background, one job at a time, with
+    `job.workers` files in flight. Keeps every job (finished or not) in
+    memory for the status endpoints.
+    """
+
+    def __init__(self):
+        self.jobs: Dict[str, IngestJob] = {}
+        self._queue_lock = threading.Lock()
+        self._runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-job")
+        self._extractors = None  # Process pool, started with the first file that needs parsing
+        self._extractors_lock = threading.Lock()
+
+    def submit(self, pattern: str, chunking: Optional[Dict] = None, force: bool = False,
+               workers: int = JOB_WORKERS) -> IngestJob:
+        files = resolve_pattern(pattern)
+        if not files:
+            raise FileNotFoundError(f"No files in {DATA_DIR} match {pattern!r}")
+        job = IngestJob(uuid.uuid4().hex[:12], pattern, files, chunking or {"strategy": "sentence"}, force, workers)
+        job.lock_fd = _lock_job(job.job_id)
+        job.checkpoint()
+        self._start(job)
+        return job
+
+    def _start(self, job: IngestJob):
+        with self._queue_lock:
+            self.jobs[job.job_id] = job
+        self._runner.submit(self._run, job)
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[IngestJob]:
+        """Stops a job: files not started are skipped, files still being extracted are not embedded."""
+        job = self.jobs.get(job_id)
+        if job is not None and job.status not in FINISHED:
+            job.cancel_event.set()
+            if job.status == "queued":
+                job.status = "cancelled"
+                job.checkpoint()
+        return job
+
+    def resume_unfinished(self) -> List[str]:
+        """
+        Restarts every job whose checkpoint says it was still queued or running
+        (e.g. after a crash). Jobs locked by another process are left to it.
+        """
+        resumed = []
+        for path in sorted(JOB_DIR.glob("*.json")):
+            job = IngestJob.load(path)
+            if job.job_id in self.jobs:
+                continue
+            if job.status in FINISHED:
+                self.jobs[job.job_id] = job  # Still visible in /jobs
+                continue
+            lock_fd = _lock_job(job.job_id)
+            if lock_fd is None:
+                continue  # Another worker process is running (or resuming) it
+            job = IngestJob.load(path)  # Re-read under the lock: the owner may have finished it meanwhile
+            job.lock_fd = lock_fd
+            if job.status in FINISHED:
+                self._release(job)
+                self.jobs[job.job_id] = job
+                continue
+            job.status = "queued"
+            self._start(job)
+            resumed.append(job.job_id)
+        return resumed
+
+    @staticmethod
+    def _release(job: IngestJob):
+        if job.lock_fd is not None:
+            os.close(job.lock_fd)  # Closing the descriptor drops the flock
+            job.lock_fd = None
+
+    def _extraction_pool(self):
+        with self._extractors_lock:
+            if self._extractors is None:
+                self._extractors = extraction_pool(EXTRACT_WORKERS)
+            return self._extractors
+
+    def _ingest_file(self, job: IngestJob, filename: str, store, collection, embedder, lexical_index) -> Dict:
+        chunker = make_chunker(job.chunking)
+        chunk_size = job.chunking.get("chunk_size", CHUNK_SIZE)
+        fingerprint = file_fingerprint(filename, chunk_size, chunker)
+        from module20_chunk_store import sync_source
+        if job.force or store.fingerprint(filename) != fingerprint:
+            # The worker swaps the store file in only once it is complete, so a
+            # cancelled or crashed extraction never leaves half a file behind.
+            task = (filename, job.chunking, str(store.directory), fingerprint, str(DATA_DIR))
+            pool = self._extraction_pool()
+            try:
+                pool.submit(write_document, task).result()
+            except BrokenProcessPool:
+                # A worker died (e.g. out of memory on a huge file): this file fails, later ones get a fresh pool
+                with self._extractors_lock:
+                    if self._extractors is pool:
+                        self._extractors = None
+                raise
+        if job.cancel_event.is_set():
+            raise JobCancelled()  # Extracted and stored: a resumed job goes straight to embedding
+
+        def stop_if_cancelled():
+            # Called between embedding batches: a cancel does not wait for the rest of a large file.
+            # Chunks already upserted are not in the manifest yet, so a rerun simply upserts them again.
+            if job.cancel_event.is_set():
+                raise JobCancelled()
+
+        return sync_source(
+            store,
+            filename,
+            None,  # Already in the store
+            collection,
+            embedder,
+            fingerprint=fingerprint,
+            force=job.force,
+            lexical_index=lexical_index,
+            checkpoint=stop_if_cancelled
+        )
+
+    def _run(self, job: IngestJob):
+        try:
+            if not job.cancel_event.is_set():
+                self._run_files(job)
+        finally:
+            self._release(job)
+
+    def _run_files(self, job: IngestJob):
+        from module14_resources import get_chunk_store, get_collection, get_embedder, get_lexical_index
+
+        job.mark_running()
+        try:
+            store, collection = get_chunk_store(), get_collection()
+            embedder, lexical_index = get_embedder(), get_lexical_index()
+            with ThreadPoolExecutor(max_workers=job.workers, thread_name_prefix=f"ingest-{job.job_id}") as pool:
+                in_flight = {}
+                for filename in job.remaining():
+                    # Backpressure: never queue more than MAX_IN_FLIGHT files per worker
+                    while len(in_flight) >= job.workers * MAX_IN_FLIGHT:
+                        finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            self._collect(job, in_flight.pop(future), future)
+                    if job.cancel_event.is_set():
+                        break
+                    future = pool.submit(self._ingest_file, job, filename, store, collection, embedder, lexical_index)
+                    in_flight[future] = filename
+                for future in list(in_flight):
+                    self._collect(job, in_flight.pop(future), future)
+            job.mark_finished("cancelled" if job.cancel_event.is_set() else "completed")
+        except Exception as e:
+            job.mark_finished("failed", str(e))
+        print(f"[+] Ingestion job {job.job_id} {job.status}: {len(job.done)}/{len(job.files)} files.")
+
+    def _collect(self, job: IngestJob, filename: str, future):
+        try:
+            job.record_file(filename, stats=future.result())
+        except JobCancelled:
+            pass  # Not marked done, so a resumed or repeated job picks it up again
+        except Exception as e:
+            job.record_file(filename, error=str(e))
+
+if __name__ == "__main__":
+    import sys
+
+    # python module19_bulk_ingest.py "*.txt"   -> ingest every .txt file in data/
+    pattern = sys.argv[1] if len(sys.argv) > 1 else "**/*.txt"
+    manager = JobManager()
+
+    resumed = manager.resume_unfinished()
+    if resumed:
+        print(f"[+] Resumed unfinished jobs: {resumed}")
+
+    print(f"--- BULK INGESTION: {DATA_DIR / pattern} ---")
+    job = manager.submit(pattern)
+    while job.status not in FINISHED:
+        time.sleep(1)
+        print(f"[+] {job.progress()}")
+    print(f"\n[+] Final: {job.progress()}")
@@ -1,11 +1,10 @@
 import sys
-import pandas as pd
-import chromadb
+import time
 from datetime import datetime
 
 # --- PRODUCTION NOTE: LOGGING ---
-# In a real app, we would use the 'logging' library. 
-# For this Module 1 check, print statements are acceptable.
+# The API server logs through the 'logging' library, with per-stage metrics
+# and trace IDs (Module 24). For this Module 1 check, print statements are acceptable.
 
 def run_diagnostics():
     print(f"--- AI Agent Environment Check ---")
@@ -30,14 +29,20 @@ def run_diagnostics():
     print(f"[+] Dictionary Test: Configured payload for model '{llm_payload['model']}'.")
 
     # 3. TEST LIBRARIES
+    # Heavy libraries are imported here, not at the top of the file,
+    # so the checks above run instantly and each import cost is visible.
     try:
         # distinct check for pandas
+        start = time.perf_counter()
+        import pandas as pd
         df = pd.DataFrame({"status": ["active"], "latency_ms": [12]})
-        print(f"[+] Pandas Test: Library imported successfully.")
+        print(f"[+] Pandas Test: Library imported successfully ({time.perf_counter() - start:.2f}s).")
         
         # distinct check for ChromaDB
+        start = time.perf_counter()
+        import chromadb
         chroma_client = chromadb.Client()
-        print(f"[+] ChromaDB Test: Vector DB client initialized in-memory.")
+        print(f"[+] ChromaDB Test: Vector DB client initialized in-memory ({time.perf_counter() - start:.2f}s).")
         
         print(f"\n>>> SYSTEM READY. PROCEED TO MODULE 2. <<<")
         
@@ -0,0 +1,258 @@
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+import datetime
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from module2_ingest import BATCH_SIZE, Chunk, iter_chunk_ids, split_chunk
+from module9_indexing import EMBED_BATCH_SIZE, sync_chunk_stream
+
+# --- CONFIGURATION ---
+# One Parquet file per source document, written while the file is being
+# chunked: every ROW_GROUP_ROWS chunks are flushed as one row group, so
+# ingestion never holds more than one row group in memory. `source` is dictionary-encoded
+# (stored once per row group, not once per row) and timestamps are int64.
+# page/section (Module 28) are null for plain text; section is dictionary-encoded
+# too, since consecutive chunks usually share a heading.
+STORE_DIR = Path("./chunk_store")
+ROW_GROUP_ROWS = 16_384
+# Pages are decompressed on every read (memory_map only saves the read()
+# copy of the compressed bytes), so the default codec is the cheap-to-decode
+# LZ4; "none" makes scans truly zero-copy at ~2-3x the disk space, "zstd"
+# gives the smallest files.
+STORE_COMPRESSION = os.getenv("STORE_COMPRESSION", "lz4")
+READ_BATCH_SIZE = EMBED_BATCH_SIZE  # Rows per Arrow batch handed to the embedding stage
+INDEX_COLUMNS = ["chunk_id", "chunk_index", "text", "source", "created_at", "page", "section"]  # What Module 9 reads
+
+SCHEMA = pa.schema([
+    ("chunk_id", pa.string()),
+    ("chunk_index", pa.int32()),
+    ("text", pa.string()),
+    ("source", pa.dictionary(pa.int32(), pa.string())),
+    ("created_at", pa.timestamp("us", tz="UTC")),
+    ("char_count", pa.int32()),
+    ("page", pa.int32()),
+    ("section", pa.dictionary(pa.int32(), pa.string())),
+])
+
+def build_chunk_batch(chunk_ids: List[str], texts: List[str], source: str,
+                      first_index: int, created_at_us: int, pages: Optional[List] = None,
+                      sections: Optional[List] = None) -> pa.RecordBatch:
+    """Builds one Arrow batch column by column: no per-chunk dict, no per-chunk timestamp string."""
+    n = len(texts)
+    text_column = pa.array(texts, type=pa.string())
+    section_type = SCHEMA.field("section").type
+    return pa.RecordBatch.from_arrays([
+        pa.array(chunk_ids, type=pa.string()),
+        pa.array(np.arange(first_index, first_index + n, dtype=np.int32)),
+        text_column,
+        pa.DictionaryArray.from_arrays(pa.array(np.zeros(n, dtype=np.int32)), pa.array([source])),
+        pa.array(np.full(n, created_at_us, dtype=np.int64)).cast(SCHEMA.field("created_at").type),
+        pc.utf8_length(text_column).cast(pa.int32()),
+        pa.array(pages, type=pa.int32()) if pages else pa.nulls(n, pa.int32()),
+        pa.array(sections, type=pa.string()).dictionary_encode() if sections else pa.nulls(n, section_type),
+    ], schema=SCHEMA)
+
+def iter_chunk_batches(chunks: Iterable[Chunk], source: str, batch_size: int = BATCH_SIZE) -> Iterator[pa.RecordBatch]:
+    """Columnar counterpart of module2_ingest.iter_chunk_records."""
+    # One timestamp per ingestion run: UTC epoch microseconds in a UTC-typed column
+    created_at_us = int(datetime.datetime.now(datetime.timezone.utc).timestamp() * 1_000_000)
+    ids, texts, pages, sections, first_index = [], [], [], [], 0
+    for chunk, chunk_id in iter_chunk_ids(chunks, source):
+        ids.append(chunk_id)
+        if isinstance(chunk, str):
+            texts.append(chunk)
+        else:
+            text, meta = split_chunk(chunk)
+            texts.append(text)
+            # Back-fill nulls for the plain chunks before the first structured one
+            pages.extend([None] * (len(texts) - 1 - len(pages)))
+            sections.extend([None] * (len(texts) - 1 - len(sections)))
+            pages.append(meta.get("page"))
+            sections.append(meta.get("section"))
+        if len(texts) >= batch_size:
+            yield build_chunk_batch(ids, texts, source, first_index, created_at_us, pages, sections)
+            first_index += len(texts)
+            ids, texts, pages, sections = [], [], [], []
+    if texts:
+        yield build_chunk_batch(ids, texts, source, first_index, created_at_us, pages, sections)
+
+class ChunkStore:
+    """
+    Columnar on-disk store of every chunk, one Parquet file per source.
+
+    write_source() streams a source's chunks into a fresh file and swaps it
+    in atomically; scan() reads it back as Arrow batches from a memory-mapped
+    file, decoding only the requested columns (see STORE_COMPRESSION).
+    Stats come from Parquet footers and the small numeric columns only.
+    """
+
+    def __init__(self, directory: Path = STORE_DIR):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def path(self, source: str) -> Path:
+        # Hash the source name so any filename maps to a safe, flat file path
+        return self.directory / f"{hashlib.sha1(source.encode('utf-8')).hexdigest()}.parquet"
+
+    def has(self, source: str) -> bool:
+        return self.path(source).exists()
+
+    def fingerprint(self, source: str) -> Optional[Dict]:
+        """
+        File fingerprint saved with the source's chunks (read from the footer only).
+        None for files written with an older SCHEMA, so they get rewritten.
+        """
+        if not self.has(source):
+            return None
+        schema = pq.read_schema(self.path(source))
+        if schema.remove_metadata() != SCHEMA:
+            return None
+        metadata = schema.metadata or {}
+        raw = metadata.get(b"fingerprint")
+        return json.loads(raw) if raw else None
+
+    def write_source(self, source: str, batches: Iterable[pa.RecordBatch], fingerprint: Optional[Dict] = None) -> int:
+        """
+        Replaces the chunks of one source. Incoming batches are appended in
+        row groups of up to ROW_GROUP_ROWS, then the finished file is renamed
+        into place (temp file + rename, so readers never see half a file).
+        Returns the rows written.
+        """
+        path = self.path(source)
+        # Unique temp name: two jobs (or API workers) may rewrite the same source at once
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+        schema = SCHEMA.with_metadata({"source": source, "fingerprint": json.dumps(fingerprint)})
+        rows, pending, pending_rows = 0, [], 0
+        try:
+            with pq.ParquetWriter(tmp_path, schema, compression=STORE_COMPRESSION) as writer:
+                for batch in batches:
+                    pending.append(batch)
+                    pending_rows += batch.num_rows
+                    if pending_rows >= ROW_GROUP_ROWS:
+                        writer.write_table(pa.Table.from_batches(pending, schema=SCHEMA), row_group_size=ROW_GROUP_ROWS)
+                        rows += pending_rows
+                        pending, pending_rows = [], 0
+                if pending:
+                    writer.write_table(pa.Table.from_batches(pending, schema=SCHEMA), row_group_size=ROW_GROUP_ROWS)
+                    rows += pending_rows
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)  # Cancelled or failed: leave the old file as it was
+            raise
+        return rows
+
+    def delete_source(self, source: str):
+        self.path(source).unlink(missing_ok=True)
+
+    def scan(self, source: str, columns: Optional[List[str]] = None,
+             batch_size: int = READ_BATCH_SIZE) -> Iterator[pa.RecordBatch]:
+        """Batch-at-a-time read of one source from a memory-mapped file (only the requested columns are decoded)."""
+        if not self.has(source):
+            return
+        parquet_file = pq.ParquetFile(self.path(source), memory_map=True)
+        yield from parquet_file.iter_batches(batch_size=batch_size, columns=columns)
+
+    def chunk_ids(self, source: str) -> List[str]:
+        if not self.has(source):
+            return []
+        return pq.read_table(self.path(source), columns=["chunk_id"], memory_map=True).column("chunk_id").to_pylist()
+
+    def preview(self, source: str, chars: int = 200) -> Optional[str]:
+        """The start of the first chunk (reads a single row)."""
+        for batch in self.scan(source, columns=["text"], batch_size=1):
+            return batch.column("text")[0].as_py()[:chars]
+        return None
+
+    def stats(self, source: Optional[str] = None) -> Dict:
+        """
+        Row, row group, character and byte counts for one source or the whole
+        store. The text column is never read: rows come from the footer and
+        characters from the int32 char_count column.
+        """
+        paths = [self.path(source)] if source is not None else sorted(self.directory.glob("*.parquet"))
+        rows = row_groups = chars = size = 0
+        sources = 0
+        for path in paths:
+            if not path.exists():
+                continue
+            metadata = pq.read_metadata(path)
+            rows += metadata.num_rows
+            row_groups += metadata.num_row_groups
+            size += path.stat().st_size
+            sources += 1
+            if metadata.num_rows:
+                counts = pq.read_table(path, columns=["char_count"], memory_map=True).column("char_count")
+                chars += pc.sum(counts).as_py()
+        return {"sources": sources, "chunks": rows, "row_groups": row_groups, "chars": chars, "bytes_on_disk": size}
+
+def _checked(batches: Iterable[pa.RecordBatch], checkpoint: Callable[[], None]) -> Iterator[pa.RecordBatch]:
+    for batch in batches:
+        checkpoint()
+        yield batch
+
+def sync_source(store: ChunkStore, source: str, chunks: Optional[Iterable[Chunk]], collection, model,
+                fingerprint: Optional[Dict] = None, force: bool = False, lexical_index=None,
+                checkpoint: Optional[Callable[[], None]] = None) -> Dict:
+    """
+    Module 9's incremental sync, fed from the chunk store.
+    `chunks` is consumed (and the store rewritten) only when the file's
+    fingerprint changed; Chroma is then updated from Arrow batches read back from the store.
+    Pass chunks=None when the store was already written for this fingerprint
+    (e.g. by an extraction worker process, Module 28).
+    `checkpoint` is called before each batch is read and may raise to abandon
+    the sync (bulk jobs use it for cancellation); the manifest is then left
+    as it was, so the next sync redoes the file.
+    """
+    if chunks is not None and (force or fingerprint is None or store.fingerprint(source) != fingerprint):
+        store.write_source(source, iter_chunk_batches(chunks, source), fingerprint)
+    batches = store.scan(source, columns=INDEX_COLUMNS)
+    if checkpoint is not None:
+        batches = _checked(batches, checkpoint)
+    stats = sync_chunk_stream(
+        source, batches, collection, model,
+        fingerprint=fingerprint, force=force, lexical_index=lexical_index
+    )
+    stats["store"] = store.stats(source)
+    return stats
+
+if __name__ == "__main__":
+    import sys
+    import time
+    from module2_ingest import build_chunk_records
+
+    # python module20_chunk_store.py [n_chunks]  -> memory/size comparison on synthetic chunks
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    source = "synthetic/report.txt"
+    texts = [f"Chunk {i}: the quarterly VPN migration notes, section {i % 97}." for i in range(n)]
+
+    print(f"--- {n} CHUNKS: DICTS vs ARROW ---")
+    start = time.perf_counter()
+    records = list(build_chunk_records(texts, source))
+    dict_seconds = time.perf_counter() - start
+    # Rough object size: dict + its own strings (source and timestamp strings are shared objects)
+    dict_bytes = sum(sys.getsizeof(r) + sys.getsizeof(r["text"]) + sys.getsizeof(r["chunk_id"]) for r in records)
+    del records
+
+    start = time.perf_counter()
+    table = pa.Table.from_batches(list(iter_chunk_batches(texts, source, batch_size=65536)))
+    arrow_seconds = time.perf_counter() - start
+    print(f"[+] Dicts : {dict_seconds:.2f}s, ~{dict_bytes / 1e6:.0f} MB of Python objects")
+    print(f"[+] Arrow : {arrow_seconds:.2f}s, {table.nbytes / 1e6:.0f} MB of column buffers")
+
+    store = ChunkStore()
+    start = time.perf_counter()
+    store.write_source(source, table.to_batches(max_chunksize=BATCH_SIZE))
+    print(f"[+] Written in {time.perf_counter() - start:.2f}s: {store.stats(source)}")
+
+    start = time.perf_counter()
+    scanned = sum(b.num_rows for b in store.scan(source, columns=["chunk_id", "text"]))
+    print(f"[+] Scanned {scanned} rows in {time.perf_counter() - start:.2f}s")
+    store.delete_source(source)
@@ -0,0 +1,151 @@
+from typing import Callable, Dict, List, Tuple
+import math
+import os
+import re
+
+# --- CONFIGURATION ---
+# Retrieval returns a wide candidate set; this stage decides what actually
+# goes into the llama3 prompt. Every context token costs prefill time, so
+# the context is packed into a fixed token budget instead of "top k".
+CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "8"))         # Chunks retrieved per question
+CONTEXT_TOKENS = int(os.getenv("CONTEXT_TOKENS", "1500"))      # Token budget for the context block
+DUPLICATE_THRESHOLD = 0.8  # Shingle Jaccard similarity above which a chunk counts as a near-duplicate
+SHINGLE_WORDS = 3
+MIN_OVERLAP_CHARS = 20     # Shorter shared edges are left alone
+SEPARATOR = "\n\n"
+# Token counts are only exact with llama3's own tokenizer: set LLM_TOKENIZER
+# to a Hugging Face name or local path of it (needs transformers). Otherwise
+# counts are an APPROXIMATION: LangChain's get_num_tokens for ChatOllama
+# uses GPT-2's tokenizer, which undercounts code and non-English text for
+# llama3, so approximate counts are inflated by TOKEN_HEADROOM to keep the
+# packed prompt inside the model's real context window.
+LLM_TOKENIZER = os.getenv("LLM_TOKENIZER", "")
+TOKEN_HEADROOM = float(os.getenv("TOKEN_HEADROOM", "1.3"))
+
+_WORD_RE = re.compile(r"\w+")
+
+def make_token_counter(llm=None, tokenizer: str = LLM_TOKENIZER, headroom: float = TOKEN_HEADROOM) -> Callable[[str], int]:
+    """
+    Exact counts with the llama3 tokenizer named by `tokenizer`, when set and
+    loadable. Otherwise an approximation with `headroom`: the LLM's
+    get_num_tokens (GPT-2 based for ChatOllama) or ~3 characters per token,
+    multiplied by `headroom` and rounded up.
+    """
+    if tokenizer:
+        try:
+            from transformers import AutoTokenizer
+            exact = AutoTokenizer.from_pretrained(tokenizer)
+            return lambda text: len(exact.encode(text, add_special_tokens=False))
+        except Exception as e:
+            print(f"[!] Tokenizer {tokenizer} unavailable ({e}); approximating prompt tokens.")
+    if llm is not None:
+        try:
+            llm.get_num_tokens("warm-up")
+            return lambda text: math.ceil(llm.get_num_tokens(text) * headroom)
+        except Exception as e:
+            print(f"[!] LLM tokenizer unavailable ({e}); estimating prompt tokens.")
+    return lambda text: math.ceil((len(text) + 2) // 3 * headroom)
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)}
+    return {tuple(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+def edge_overlap(first: str, second: str) -> int:
+    """
+    Length of the longest suffix of `first` that is a prefix of `second`
+    (what the sentence chunker's overlap produces between neighbouring chunks).
+    """
+    probe = second[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    start = first.find(probe)
+    while start != -1:
+        if second.startswith(first[start:]):
+            return len(first) - start
+        start = first.find(probe, start + 1)
+    return 0
+
+class ContextPacker:
+    """
+    Candidate chunks -> prompt context within a token budget.
+
+    1. Candidates are ordered by retrieval score (rank order if the retriever
+       gives no score).
+    2. Near-duplicates of an already chosen chunk are dropped; text a chunk
+       shares with a chosen neighbour (chunk overlap) is trimmed.
+    3. Chunks are added best first while they fit the budget; a chunk that
+       does not fit is skipped so a smaller, lower-ranked one can still go in.
+    """
+
+    def __init__(self, count_tokens: Callable[[str], int], budget: int = CONTEXT_TOKENS,
+                 duplicate_threshold: float = DUPLICATE_THRESHOLD, prompt_overhead: int = 0):
+        self.count_tokens = count_tokens
+        self.budget = budget
+        self.duplicate_threshold = duplicate_threshold
+        self.prompt_overhead = prompt_overhead  # Tokens of the prompt template without context or question
+
+    def pack(self, docs: List, question: str = "") -> Tuple[List[str], Dict]:
+        """Returns (texts to put in the prompt, in order) and packing metrics."""
+        ranked = sorted(enumerate(docs), key=lambda item: (-item[1].metadata.get("score", 0.0), item[0]))
+        chosen: List[Tuple[str, set]] = []
+        used = duplicates = trimmed = skipped = 0
+        separator_tokens = self.count_tokens(SEPARATOR) if len(docs) > 1 else 0
+
+        for _, doc in ranked:
+            text = doc.page_content.strip()
+            signature = shingles(text)
+            if any(jaccard(signature, other) >= self.duplicate_threshold for _, other in chosen):
+                duplicates += 1
+                continue
+            for other, _ in chosen:
+                # Drop the part this chunk shares with a chosen neighbour on either side
+                before, after = edge_overlap(other, text), edge_overlap(text, other)
+                if before or after:
+                    text = text[before : len(text) - after].strip()
+                    trimmed += 1
+            if not text:
+                duplicates += 1
+                continue
+
+            tokens = self.count_tokens(text) + (separator_tokens if chosen else 0)
+            if used + tokens > self.budget:
+                skipped += 1
+                continue
+            chosen.append((text, shingles(text)))
+            used += tokens
+
+        return [text for text, _ in chosen], {
+            "candidates": len(docs),
+            "packed": len(chosen),
+            "duplicates_dropped": duplicates,
+            "overlaps_trimmed": trimmed,
+            "over_budget_skipped": skipped,
+            "context_tokens": used,
+            "context_budget": self.budget,
+            "budget_used": round(used / self.budget, 3) if self.budget else 0.0,
+            "prompt_tokens": self.prompt_overhead + (self.count_tokens(question) if question else 0) + used
+        }
+
+if __name__ == "__main__":
+    from langchain_core.documents import Document
+
+    print("--- PACKING A SYNTHETIC CANDIDATE SET ---")
+    memo = "The new VPN address is vpn.enterprise.local. Use your badge PIN to log in. "
+    docs = [
+        Document(page_content=memo + "Support is on extension 4455.", metadata={"score": 0.91}),
+        Document(page_content=memo + "Support is on extension 4455!", metadata={"score": 0.90}),  # Near-duplicate
+        Document(page_content="Support is on extension 4455. The old gateway shuts down on Friday.",
+                 metadata={"score": 0.75}),  # Overlaps the first chunk
+        Document(page_content="Quarterly report. " * 200, metadata={"score": 0.40}),  # Too big for the budget
+        Document(page_content="Badges are issued by the front desk.", metadata={"score": 0.30}),
+    ]
+    packer = ContextPacker(make_token_counter(), budget=120)
+    texts, metrics = packer.pack(docs)
+    for text in texts:
+        print(f"[+] {text}")
+    print(f"\n[+] Metrics: {metrics}")
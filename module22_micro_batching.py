@@ -0,0 +1,211 @@
+from typing import Callable, Dict, List, Optional
+import asyncio
+import os
+import threading
+import time
+
+# --- CONFIGURATION ---
+# Under load, concurrent /query requests each embed one question and run one
+# vector search. The micro-batcher holds the first request for at most
+# BATCH_WINDOW_MS (or until BATCH_MAX_SIZE requests have arrived), then embeds
+# and searches all of them in one call and hands each request its own result.
+MICRO_BATCH = os.getenv("MICRO_BATCH", "1") == "1"
+BATCH_WINDOW_MS = float(os.getenv("BATCH_WINDOW_MS", "5"))
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "32"))
+HISTOGRAM_BUCKETS = (1, 2, 4, 8, 16, 32, 64)  # Upper bounds for the batch-size histogram
+
+class MicroBatcher:
+    """
+    Collects items submitted from concurrent coroutines into batches for a
+    synchronous `handler(items) -> results` (run in a worker thread).
+
+    One batch is processed at a time; requests arriving meanwhile queue up
+    and form the next batch, so batches grow naturally with load while a
+    lone request waits at most `window_ms`.
+    """
+
+    def __init__(self, handler: Callable[[List], List], max_batch_size: int = BATCH_MAX_SIZE,
+                 window_ms: float = BATCH_WINDOW_MS):
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.window_s = window_ms / 1000
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.max_queue_depth = 0
+        self.wait_seconds = 0.0
+        self.handler_seconds = 0.0
+        self.histogram = {bound: 0 for bound in HISTOGRAM_BUCKETS + (float("inf"),)}
+
+    def _ensure_worker(self):
+        # The queue and worker task belong to the event loop that first uses them
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, item):
+        """Queues one item and waits for its result (exceptions from the handler are re-raised here)."""
+        self._ensure_worker()
+        future = self._loop.create_future()
+        self._queue.put_nowait((item, future, time.perf_counter()))
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return await future
+
+    async def _collect(self) -> List:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.window_s
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            started = time.perf_counter()
+            try:
+                results = await asyncio.to_thread(self.handler, [item for item, _, _ in batch])
+                if len(results) != len(batch):
+                    # Results could no longer be matched to requests: fail the whole batch
+                    raise RuntimeError(f"Batch handler returned {len(results)} results for {len(batch)} requests")
+            except Exception as e:
+                results, error = None, e
+            finished = time.perf_counter()
+
+            for i, (_, future, _) in enumerate(batch):
+                if future.done():  # The request was cancelled (e.g. client disconnected)
+                    continue
+                if results is None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(results[i])
+            self._record(batch, started, finished)
+
+    def _record(self, batch: List, started: float, finished: float):
+        with self._stats_lock:
+            self.batches += 1
+            self.requests += len(batch)
+            self.wait_seconds += sum(started - queued_at for _, _, queued_at in batch)
+            self.handler_seconds += finished - started
+            self.histogram[next(b for b in self.histogram if len(batch) <= b)] += 1
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            return {
+                "window_ms": self.window_s * 1000,
+                "max_batch_size": self.max_batch_size,
+                "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+                "max_queue_depth": self.max_queue_depth,
+                "batches": self.batches,
+                "requests": self.requests,
+                "avg_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+                "avg_wait_ms": round(self.wait_seconds * 1000 / self.requests, 2) if self.requests else 0.0,
+                "avg_batch_ms": round(self.handler_seconds * 1000 / self.batches, 2) if self.batches else 0.0,
+                "batch_size_histogram": {f"<={b}": n for b, n in self.histogram.items()}
+            }
+
+class ChromaBatchRetriever:
+    """
+    Dense Chroma retrieval with an invoke_batch(): all questions are embedded
+    in one call (through the shared embedding cache) and searched with one
+    collection.query over the list of query embeddings.
+    """
+
+    def __init__(self, collection, embedder, k: int = 1):
+        self.collection = collection
+        self.embedder = embedder
+        self.k = k
+
+    def invoke_batch(self, questions: List[str]) -> List[List]:
+        from langchain_core.documents import Document
+        results = self.collection.query(
+            query_embeddings=self.embedder.encode(questions).tolist(),
+            n_results=self.k,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [
+            [
+                Document(id=chunk_id, page_content=text, metadata={**(metadata or {}), "score": -distance})
+                for chunk_id, text, metadata, distance in zip(ids, texts, metadatas, distances)
+            ]
+            for ids, texts, metadatas, distances in zip(
+                results["ids"], results["documents"], results["metadatas"], results["distances"]
+            )
+        ]
+
+    def invoke(self, question: str) -> List:
+        return self.invoke_batch([question])[0]
+
+    async def ainvoke(self, question: str) -> List:
+        return await asyncio.to_thread(self.invoke, question)
+
+class BatchingRetriever:
+    """
+    Wraps a retriever that has invoke_batch(). Async callers (the FastAPI
+    /query path) go through the micro-batcher; sync callers (Streamlit, CLI)
+    call the retriever directly.
+    """
+
+    def __init__(self, retriever, max_batch_size: int = BATCH_MAX_SIZE, window_ms: float = BATCH_WINDOW_MS):
+        self.retriever = retriever
+        self.batcher = MicroBatcher(retriever.invoke_batch, max_batch_size, window_ms)
+
+    def invoke(self, question: str) -> List:
+        return self.retriever.invoke(question)
+
+    async def ainvoke(self, question: str) -> List:
+        return await self.batcher.submit(question)
+
+if __name__ == "__main__":
+    import numpy as np
+
+    # Simulated retrieval cost: a fixed overhead per call plus a little per
+    # question, roughly how SentenceTransformer.encode + a vector search behave.
+    # The lock models one embedding model on one CPU: calls run one at a time.
+    model_lock = threading.Lock()
+
+    def fake_search(questions: List[str]) -> List[str]:
+        with model_lock:
+            time.sleep(0.02 + 0.001 * len(questions))
+        return [f"results for {q}" for q in questions]
+
+    async def load_test(concurrency: int, batched: bool) -> Dict:
+        batcher = MicroBatcher(fake_search)
+
+        async def one(i: int) -> float:
+            start = time.perf_counter()
+            if batched:
+                await batcher.submit(f"q{i}")
+            else:
+                await asyncio.to_thread(fake_search, [f"q{i}"])
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one(i) for i in range(concurrency)))
+        report = {
+            "wall_s": round(time.perf_counter() - start, 3),
+            "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1),
+            "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 1)
+        }
+        if batched:
+            stats = batcher.stats()
+            report.update(batches=stats["batches"], avg_batch_size=stats["avg_batch_size"])
+        return report
+
+    print("--- MICRO-BATCHING vs ONE SEARCH PER REQUEST (simulated 20 ms search) ---")
+    for concurrency in (1, 8, 64):
+        print(f"[+] {concurrency:>3} concurrent | single: {asyncio.run(load_test(concurrency, False))}")
+        print(f"    {'':>14} | batched: {asyncio.run(load_test(concurrency, True))}")
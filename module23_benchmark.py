@@ -0,0 +1,363 @@
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+# --- CONFIGURATION ---
+# Every stage runs on synthetic, seeded data, and the LLM is the stub Ollama
+# server from Module 12, so two runs on the same machine are comparable and
+# two commits can be compared by diffing their JSON reports.
+SEED = 42
+SIZES = [1_000, 10_000, 100_000]  # Corpus sizes for the search stage
+DIM = 384                         # all-MiniLM-L6-v2 vector size
+QUERIES = 200                     # Queries per search measurement
+REPEATS = 5                       # Runs per ingestion / embedding measurement
+LLM_REQUESTS = 10
+STUB_TOKENS_PER_SEC = 40.0        # Generation speed of the fake model
+STUB_PREFILL_TOKENS_PER_SEC = 2000.0
+STUB_FIRST_TOKEN_DELAY = 0.05
+REGRESSION_THRESHOLD = 0.10       # --compare fails on a >10% slower p50
+RESULTS_PATH = Path("benchmark_results.json")
+
+VOCABULARY = (
+    "vpn address password reset helpdesk extension network gateway server policy badge office "
+    "project codename architecture memory store ingestion engine vector embedding model local "
+    "secure document report quarterly migration access account support ticket schedule update"
+).split()
+
+def percentiles(samples_s: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 (and mean) in milliseconds."""
+    ms = np.asarray(samples_s, dtype=np.float64) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "n": len(ms)
+    }
+
+def timed(fn: Callable, repeats: int) -> List[float]:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def synthetic_text(rng: np.random.Generator, sentences: int) -> str:
+    """Deterministic pseudo-prose: 6-18 word sentences, a paragraph break every 5."""
+    parts = []
+    for i in range(sentences):
+        words = rng.choice(VOCABULARY, rng.integers(6, 19))
+        parts.append(" ".join(words).capitalize() + ". ")
+        if i % 5 == 4:
+            parts.append("\n\n")
+    return "".join(parts)
+
+@contextmanager
+def synthetic_data_dir(files: Dict[str, str]):
+    """Writes files to a temp dir and points module2_ingest.DATA_DIR at it."""
+    import module2_ingest
+    original = module2_ingest.DATA_DIR
+    with tempfile.TemporaryDirectory() as directory:
+        for name, text in files.items():
+            (Path(directory) / name).write_text(text, encoding="utf-8")
+        module2_ingest.DATA_DIR = Path(directory)
+        try:
+            yield Path(directory)
+        finally:
+            module2_ingest.DATA_DIR = original
+
+# --- STAGES ---
+
+def bench_ingestion(repeats: int) -> Dict:
+    """Chunking throughput: the DataFrame pipeline vs the streaming and sentence-aware paths."""
+    from module2_ingest import iter_chunk_records, process_data_pipeline
+    from module18_chunking import SentenceChunker
+
+    text = synthetic_text(np.random.default_rng(SEED), 20_000)
+    mb = len(text.encode("utf-8")) / 1e6
+    results = {"input_mb": round(mb, 2)}
+    with synthetic_data_dir({"corpus.txt": text}):
+        runs = {
+            "process_data_pipeline": lambda: process_data_pipeline("corpus.txt"),
+            "stream_fixed": lambda: sum(len(b) for b in iter_chunk_records("corpus.txt")),
+            "stream_sentence": lambda: sum(len(b) for b in iter_chunk_records("corpus.txt", chunker=SentenceChunker()))
+        }
+        for name, run in runs.items():
+            with open(os.devnull, "w") as devnull, _redirect_stdout(devnull):
+                run()  # Warm-up: lazy imports, tokenizer load, page cache
+                samples = timed(run, repeats)
+            results[name] = {**percentiles(samples), "mb_per_sec": round(mb / float(np.median(samples)), 2)}
+    return results
+
+def bench_extraction(repeats: int) -> Dict:
+    """Mixed-format extraction + chunking (Module 28): serial vs process pool, plus per-format rates."""
+    from module28_extractors import EXTRACT_WORKERS, extraction_pool, profile_document, write_mixed_corpus
+
+    chunking = {"strategy": "fixed", "chunk_size": 800}  # Parsing cost, not tokenizer cost
+    with tempfile.TemporaryDirectory() as directory:
+        filenames = write_mixed_corpus(Path(directory), seed=SEED)
+        tasks = [(name, chunking, directory) for name in filenames]
+        mb = sum((Path(directory) / name).stat().st_size for name in filenames) / 1e6
+        results = {"input_mb": round(mb, 2), "files": len(filenames)}
+
+        per_file = list(map(profile_document, tasks))  # Warm-up
+        serial = timed(lambda: list(map(profile_document, tasks)), repeats)
+        with extraction_pool(EXTRACT_WORKERS) as pool:
+            list(pool.map(profile_document, tasks))  # Warm-up: spawn the workers
+            pooled = timed(lambda: list(pool.map(profile_document, tasks)), repeats)
+    for name, samples in (("serial", serial), (f"process_pool_{EXTRACT_WORKERS}", pooled)):
+        results[name] = {**percentiles(samples), "mb_per_sec": round(mb / float(np.median(samples)), 2)}
+    for fmt in sorted({r["format"] for r in per_file}):
+        rows = [r for r in per_file if r["format"] == fmt]
+        seconds = sum(r["seconds"] for r in rows)
+        results[f"format_{fmt}"] = {"mb_per_sec": round(sum(r["bytes"] for r in rows) / 1e6 / seconds, 2),
+                                    "ms_per_file": round(seconds * 1000 / len(rows), 3)}
+    return results
+
+@contextmanager
+def _redirect_stdout(stream):
+    # The pipelines print progress lines; keep the report readable
+    original, sys.stdout = sys.stdout, stream
+    try:
+        yield
+    finally:
+        sys.stdout = original
+
+def bench_embedding(repeats: int) -> Dict:
+    """Raw model throughput at several batch sizes (no cache in the way)."""
+    try:
+        from module14_resources import get_embedding_model
+        model = get_embedding_model()
+    except Exception as e:
+        return {"skipped": f"embedding model unavailable: {e}"}
+
+    rng = np.random.default_rng(SEED)
+    texts = [synthetic_text(rng, 3) for _ in range(256)]
+    model.encode(texts[:8])  # Warm-up
+    results = {}
+    for batch_size in (1, 16, 64):
+        samples = timed(lambda: model.encode(texts, batch_size=batch_size), repeats)
+        results[f"batch_{batch_size}"] = {
+            **percentiles(samples), "texts_per_sec": round(len(texts) / float(np.median(samples)), 1)
+        }
+    return results
+
+def bench_search(sizes: List[int], queries: int) -> Dict:
+    """Latency and recall@10 of exact, IVF and quantised NumPy search and BM25 at growing corpus sizes."""
+    from module16_vector_index import NumpyVectorIndex, normalize_rows, recall_at_k
+    from module25_quantization import QUANT_MODES, QuantizedVectorIndex
+    from module17_hybrid_search import BM25Index
+
+    results = {}
+    for size in sizes:
+        rng = np.random.default_rng(SEED)
+        # Clustered vectors, like real embeddings (uniform random ones make IVF look worse than it is)
+        centers = normalize_rows(rng.normal(size=(max(8, size // 500), DIM)))
+        vectors = normalize_rows(centers[rng.integers(0, len(centers), size)] + rng.normal(0, 0.04, (size, DIM)))
+        picks = rng.choice(size, min(queries, size), replace=False)
+        query_vectors = normalize_rows(vectors[picks] + rng.normal(0, 0.05, (len(picks), DIM)))
+        texts = [" ".join(rng.choice(VOCABULARY, 12)) + f" id{i}" for i in range(size)]
+
+        with tempfile.TemporaryDirectory() as directory:
+            index = NumpyVectorIndex.build(
+                Path(directory) / "index", [f"c{i}" for i in range(size)], vectors, texts,
+                ["bench"] * size, n_lists=max(1, int(np.sqrt(size)))
+            )
+            truth = [[row for row, _ in index.search(q, 10)] for q in query_vectors]
+            size_results = {}
+            searches = [("numpy_exact", index, False), ("numpy_ivf", index, True)]
+            searches += [(f"numpy_{mode}", QuantizedVectorIndex(index.directory, mode), False) for mode in QUANT_MODES]
+            for name, searcher, approximate in searches:
+                found, samples = [], []
+                for q in query_vectors:
+                    start = time.perf_counter()
+                    hits = searcher.search(q, 10, approximate=approximate)
+                    samples.append(time.perf_counter() - start)
+                    found.append([row for row, _ in hits])
+                size_results[name] = {**percentiles(samples), "recall_at_10": round(recall_at_k(truth, found), 4)}
+                if isinstance(searcher, QuantizedVectorIndex):
+                    size_results[name]["resident_mb"] = searcher.memory()["codes_mb"]
+
+            bm25 = BM25Index(Path(directory) / "bm25.sqlite")
+            start = time.perf_counter()
+            bm25.add({"chunk_id": f"c{i}", "text": t, "source": "bench"} for i, t in enumerate(texts))
+            index_seconds = time.perf_counter() - start
+            samples = timed_each([" ".join(rng.choice(VOCABULARY, 4)) for _ in range(len(picks))],
+                                 lambda q: bm25.search(q, 10))
+            size_results["bm25"] = {**percentiles(samples), "docs_per_sec_indexed": round(size / index_seconds, 1)}
+        results[str(size)] = size_results
+    return results
+
+def timed_each(items: List, fn: Callable) -> List[float]:
+    samples = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def bench_llm(requests: int, tokens_per_sec: float) -> Dict:
+    """TTFT, total latency and tokens/sec through the async client against the stub server."""
+    from module12_async_llm import AsyncOllamaClient, StubOllamaServer
+
+    reply = " ".join(["token"] * 40)
+    prompt = synthetic_text(np.random.default_rng(SEED), 40)  # ~500-word RAG-sized prompt
+
+    async def run(url: str, concurrency: int):
+        async with AsyncOllamaClient(base_url=url, max_concurrency=concurrency) as client:
+            return await asyncio.gather(*(client.generate(prompt) for _ in range(requests)))
+
+    results = {}
+    with StubOllamaServer(reply, token_delay=1 / tokens_per_sec, first_token_delay=STUB_FIRST_TOKEN_DELAY,
+                          prefill_tokens_per_sec=STUB_PREFILL_TOKENS_PER_SEC) as stub:
+        for concurrency in (1, 4):
+            stats = [s for _, s in asyncio.run(run(stub.url, concurrency))]
+            results[f"concurrency_{concurrency}"] = {
+                "ttft": percentiles([s.ttft_s for s in stats]),
+                "total": percentiles([s.total_s for s in stats]),
+                "tokens_per_sec_p50": round(float(np.median([s.tokens_per_sec for s in stats])), 1)
+            }
+    return results
+
+def bench_chain(requests: int, tokens_per_sec: float) -> Dict:
+    """Full RAG chain (retrieve + pack + generate) with llama3 replaced by the stub server."""
+    from module12_async_llm import StubOllamaServer
+
+    reply = " ".join(["token"] * 40)
+    with StubOllamaServer(reply, token_delay=1 / tokens_per_sec, first_token_delay=STUB_FIRST_TOKEN_DELAY,
+                          prefill_tokens_per_sec=STUB_PREFILL_TOKENS_PER_SEC) as stub:
+        try:
+            from langchain_ollama import ChatOllama
+            from module8_rag import LLM_MODEL, build_rag_chain, timed_stream
+            # A client of its own for the stub: OLLAMA_HOST and the shared LLM (Module 14) stay untouched
+            llm = ChatOllama(model=LLM_MODEL, temperature=0.1, base_url=stub.url)
+            with open(os.devnull, "w") as devnull, _redirect_stdout(devnull):
+                chain = build_rag_chain(use_answer_cache=False, llm=llm)
+        except Exception as e:
+            return {"skipped": f"RAG chain unavailable: {e}"}
+
+        rng = np.random.default_rng(SEED)
+        ttft, total, prompt_tokens = [], [], []
+        for _ in range(requests):
+            question = " ".join(rng.choice(VOCABULARY, 8)) + "?"
+            timings, info = {}, {}
+            for _ in timed_stream(chain.stream(question, info), timings):
+                pass
+            ttft.append(timings["ttft_s"])
+            total.append(timings["total_s"])
+            prompt_tokens.append(info.get("context", {}).get("prompt_tokens", 0))
+    return {"ttft": percentiles(ttft), "total": percentiles(total),
+            "prompt_tokens_p50": float(np.median(prompt_tokens))}
+
+# --- REPORTING ---
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=Path(__file__).resolve().parent).stdout.strip() or None
+    except OSError:
+        return None
+
+def flatten(report: Dict, prefix: str = "") -> Dict[str, float]:
+    """{"search": {"1000": {"numpy_exact": {"p50_ms": 1.2}}}} -> {"search.1000.numpy_exact.p50_ms": 1.2}"""
+    flat = {}
+    for key, value in report.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def print_table(stages: Dict):
+    flat = flatten(stages)
+    summary_keys = ("p50_ms", "p95_ms", "p99_ms", "mean_ms", "n")
+    print(f"\n{'metric':<58} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}  extra")
+    for name, value in flat.items():
+        if not name.endswith(".p50_ms"):
+            continue
+        base = name[: -len(".p50_ms")]
+        # Other numbers measured alongside this latency (throughput, recall, ...)
+        extra = ", ".join(f"{k[len(base) + 1:]}={v}" for k, v in flat.items()
+                          if k.startswith(base + ".") and k.count(".") == base.count(".") + 1
+                          and k.rsplit(".", 1)[1] not in summary_keys)
+        print(f"{base:<58} {value:>10.3f} {flat[base + '.p95_ms']:>10.3f} {flat[base + '.p99_ms']:>10.3f}  {extra}")
+    for name, value in stages.items():
+        if isinstance(value, dict) and "skipped" in value:
+            print(f"{name:<58} skipped: {value['skipped']}")
+
+def compare(old: Dict, new: Dict, threshold: float = REGRESSION_THRESHOLD) -> List[str]:
+    """Prints p50 changes between two reports; returns the metrics that got slower than `threshold`."""
+    old_flat, new_flat = flatten(old["stages"]), flatten(new["stages"])
+    regressions = []
+    print(f"\n--- COMPARED WITH {old.get('commit')} ---")
+    for name in sorted(set(old_flat) & set(new_flat)):
+        if not name.endswith("p50_ms") or old_flat[name] <= 0:
+            continue
+        change = (new_flat[name] - old_flat[name]) / old_flat[name]
+        flag = "REGRESSION" if change > threshold else ""
+        print(f"{name:<58} {old_flat[name]:>10.3f} -> {new_flat[name]:>10.3f} ({change:+.1%}) {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def run(stages: List[str], sizes: List[int], tokens_per_sec: float, repeats: int) -> Dict:
+    runners = {
+        "ingestion": lambda: bench_ingestion(repeats),
+        "extraction": lambda: bench_extraction(repeats),
+        "embedding": lambda: bench_embedding(repeats),
+        "search": lambda: bench_search(sizes, QUERIES),
+        "llm": lambda: bench_llm(LLM_REQUESTS, tokens_per_sec),
+        "chain": lambda: bench_chain(LLM_REQUESTS, tokens_per_sec)
+    }
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "params": {"seed": SEED, "sizes": sizes, "stub_tokens_per_sec": tokens_per_sec, "repeats": repeats},
+        "stages": {}
+    }
+    for stage in stages:
+        print(f"[+] Running stage: {stage}")
+        start = time.perf_counter()
+        report["stages"][stage] = runners[stage]()
+        print(f"    done in {time.perf_counter() - start:.1f}s")
+    return report
+
+if __name__ == "__main__":
+    # python module23_benchmark.py                          -> all stages, writes benchmark_results.json
+    # python module23_benchmark.py --stages search,llm --sizes 1000,10000
+    # python module23_benchmark.py --compare old.json       -> exit code 1 on a p50 regression
+    parser = argparse.ArgumentParser(description="End-to-end RAG benchmark")
+    parser.add_argument("--stages", default="ingestion,extraction,embedding,search,llm,chain")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)))
+    parser.add_argument("--tokens-per-sec", type=float, default=STUB_TOKENS_PER_SEC)
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--out", type=Path, default=RESULTS_PATH)
+    parser.add_argument("--compare", type=Path, help="Earlier report from the same machine")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    print("--- RAG BENCHMARK ---")
+    report = run(args.stages.split(","), [int(s) for s in args.sizes.split(",")], args.tokens_per_sec, args.repeats)
+    print_table(report["stages"])
+    args.out.write_text(json.dumps(report, indent=2, sort_keys=True))
+    print(f"\n[+] Report written to {args.out}")
+
+    if args.compare:
+        regressions = compare(json.loads(args.compare.read_text()), report, args.threshold)
+        if regressions:
+            print(f"[!] {len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
@@ -0,0 +1,371 @@
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+# --- CONFIGURATION ---
+# Every pipeline stage (load, chunk, embed, upsert, retrieve, prompt, generate)
+# runs inside a span: two perf_counter calls, one lock, one bisect. Spans feed
+# per-stage counters and latency histograms (served as Prometheus text on
+# /metrics) and, at DEBUG level, one structured log line each.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# PROFILE_SLOW_MS > 0 turns on the sampling profiler: while requests are in
+# flight, thread stacks are sampled every PROFILE_INTERVAL_MS, and requests
+# slower than PROFILE_SLOW_MS log their hottest stacks. 0 = off.
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+PROFILE_TOP_STACKS = 5
+PROFILE_STACK_DEPTH = 16
+# Threads whose innermost frame is in one of these files are idle (waiting on a queue, lock or socket)
+IDLE_FILES = ("threading.py", "queue.py", "selectors.py", "thread.py")
+
+logger = logging.getLogger("local_ai_agent")
+_trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+_started_at = time.time()
+
+def configure_logging(level: str = LOG_LEVEL):
+    """Plain logging setup for the API process: one timestamped line per record."""
+    logging.basicConfig(level=level.upper(), format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+def logfmt(**fields) -> str:
+    """key=value pairs, quoted when needed, so log lines stay greppable and machine-parseable."""
+    parts = []
+    for key, value in fields.items():
+        if value is None:
+            continue
+        if isinstance(value, float):
+            value = f"{value:.6f}"
+        value = str(value)
+        if not value or any(c in value for c in ' "='):
+            value = '"' + value.replace('"', '\\"') + '"'
+        parts.append(f"{key}={value}")
+    return " ".join(parts)
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+# --- METRICS ---
+
+def _key(name: str, labels: Dict) -> Tuple:
+    return name, tuple(sorted(labels.items()))
+
+def _format_labels(labels: Tuple, extra: Tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+class Metrics:
+    """
+    In-process counters, gauges and latency histograms with labels,
+    rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple, float] = {}
+        self._gauges: Dict[Tuple, float] = {}
+        self._histograms: Dict[Tuple, List] = {}  # key -> [count per bucket (+Inf last), sum]
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, text: str):
+        self._help[name] = text
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def add_gauge(self, name: str, amount: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + amount
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = _key(name, labels)
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            histogram[0][index] += 1
+            histogram[1] += seconds
+
+    def counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(_key(name, labels), 0)
+
+    def counter_total(self, name: str, **match) -> float:
+        """Sum of a counter over every label set containing the `match` labels."""
+        wanted = set(match.items())
+        with self._lock:
+            return sum(v for (n, labels), v in self._counters.items() if n == name and wanted <= set(labels))
+
+    def gauge(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._gauges.get(_key(name, labels), 0)
+
+    def render(self) -> str:
+        """Prometheus text format (version 0.0.4)."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted((k, [list(v[0]), v[1]]) for k, v in self._histograms.items())
+        lines, declared = [], set()
+
+        def declare(name: str, kind: str):
+            if name not in declared:
+                declared.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            declare(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for (name, labels), value in gauges:
+            declare(name, "gauge")
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for (name, labels), (counts, total) in histograms:
+            declare(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{name}_bucket{_format_labels(labels, (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+metrics.describe("rag_stage_seconds", "Latency of one pipeline stage span.")
+metrics.describe("rag_stage_total", "Pipeline stage spans by outcome (ok, error, cancelled).")
+metrics.describe("rag_stage_items_total", "Items (chunks, tokens, documents) processed per stage.")
+metrics.describe("rag_first_token_seconds", "Time from the start of generation to the first token.")
+metrics.describe("rag_http_requests_total", "HTTP requests by route and status code.")
+metrics.describe("rag_http_request_seconds", "HTTP request latency, including streamed bodies.")
+metrics.describe("rag_http_requests_in_flight", "HTTP requests currently being served.")
+
+# --- SPANS ---
+
+class Span:
+    """
+    Times one pipeline stage: `with span("embed", items=len(texts)): ...`.
+    Works in sync code, coroutines and generators; `seconds` is set on exit.
+    A span closed by GeneratorExit or CancelledError (client went away)
+    counts as "cancelled", any other exception as "error".
+    """
+    __slots__ = ("stage", "items", "attrs", "start", "seconds")
+
+    def __init__(self, stage: str, items: Optional[int] = None, **attrs):
+        self.stage = stage
+        self.items = items
+        self.attrs = attrs
+        self.seconds = 0.0
+
+    def __enter__(self) -> "Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.start
+        if exc_type is None:
+            status = "ok"
+        elif issubclass(exc_type, (GeneratorExit, asyncio.CancelledError)):
+            status = "cancelled"
+        else:
+            status = "error"
+        metrics.observe("rag_stage_seconds", self.seconds, stage=self.stage)
+        metrics.inc("rag_stage_total", stage=self.stage, status=status)
+        if self.items:
+            metrics.inc("rag_stage_items_total", self.items, stage=self.stage)
+        if logger.isEnabledFor(logging.DEBUG) or status == "error":
+            logger.log(
+                logging.DEBUG if status != "error" else logging.WARNING,
+                logfmt(event="span", stage=self.stage, status=status, seconds=self.seconds,
+                       items=self.items, trace=_trace_id.get(), error=exc_type.__name__ if exc_type else None,
+                       **self.attrs)
+            )
+        return False
+
+def span(stage: str, items: Optional[int] = None, **attrs) -> Span:
+    return Span(stage, items, **attrs)
+
+# --- SAMPLING PROFILER ---
+
+def _idle(frame) -> bool:
+    return frame.f_code.co_filename.endswith(IDLE_FILES)
+
+def _fold(frame, depth: int = PROFILE_STACK_DEPTH) -> str:
+    """One stack in folded format (outermost first, ';'-separated), as flame graph tools read it."""
+    names = []
+    while frame is not None and len(names) < depth:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class SamplingProfiler:
+    """
+    Statistical profiler for slow requests.
+
+    A daemon thread sleeps until a traced request begins, then samples every
+    thread's stack each `interval_ms` (sys._current_frames, no tracing hooks)
+    until no request is in flight. Each request accumulates the samples taken
+    during its lifetime; end() returns them so slow requests can be reported.
+    Samples are process-wide: with concurrent requests, each one also sees
+    the others' stacks.
+    """
+
+    def __init__(self, slow_ms: float = PROFILE_SLOW_MS, interval_ms: float = PROFILE_INTERVAL_MS,
+                 top: int = PROFILE_TOP_STACKS):
+        self.slow_ms = slow_ms
+        self.interval_s = interval_ms / 1000
+        self.top = top
+        self._lock = threading.Lock()
+        self._active: Dict[str, Counter] = {}
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.samples = 0
+
+    def begin(self, trace_id: str):
+        with self._lock:
+            self._active[trace_id] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def end(self, trace_id: str) -> Counter:
+        with self._lock:
+            return self._active.pop(trace_id, Counter())
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            self._wake.wait()
+            with self._lock:
+                if not self._active:
+                    self._wake.clear()
+                    continue
+            time.sleep(self.interval_s)
+            stacks = [_fold(frame) for thread_id, frame in sys._current_frames().items()
+                      if thread_id != own and not _idle(frame)]
+            with self._lock:
+                self.samples += 1
+                for counter in self._active.values():
+                    counter.update(stacks)
+
+    def report(self, trace_id: str, seconds: float, samples: Counter, **fields):
+        """Logs the hottest stacks of a request that took longer than slow_ms."""
+        if seconds * 1000 < self.slow_ms or not samples:
+            return
+        total = sum(samples.values())
+        lines = [logfmt(event="slow_request", trace=trace_id, seconds=seconds, samples=total, **fields)]
+        for stack, count in samples.most_common(self.top):
+            lines.append(f"  {count / total:6.1%} {stack}")
+        logger.warning("\n".join(lines))
+
+# --- HTTP MIDDLEWARE ---
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: gives every HTTP request a trace ID (returned as the
+    X-Trace-Id header and attached to span logs), and records request counts
+    and latency by route template. Streamed responses are timed until the
+    last chunk is sent.
+    """
+
+    def __init__(self, app, profiler: Optional[SamplingProfiler] = None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace_id = uuid.uuid4().hex[:16]
+        status = {"code": 500}
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-trace-id", trace_id.encode())]
+            await send(message)
+
+        token = _trace_id.set(trace_id)
+        metrics.add_gauge("rag_http_requests_in_flight", 1)
+        if self.profiler is not None:
+            self.profiler.begin(trace_id)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            seconds = time.perf_counter() - start
+            # Label by route template ("/jobs/{job_id}"), not the raw path, to bound cardinality
+            route = getattr(scope.get("route"), "path", "unmatched")
+            metrics.add_gauge("rag_http_requests_in_flight", -1)
+            metrics.inc("rag_http_requests_total", method=scope["method"], route=route, status=status["code"])
+            metrics.observe("rag_http_request_seconds", seconds, method=scope["method"], route=route)
+            logger.info(logfmt(event="request", method=scope["method"], route=route,
+                               status=status["code"], seconds=seconds, trace=trace_id))
+            if self.profiler is not None:
+                self.profiler.report(trace_id, seconds, self.profiler.end(trace_id), route=route)
+            _trace_id.reset(token)
+
+def health_summary() -> Dict:
+    """Live process numbers for /health (reads counters only)."""
+    return {
+        "uptime_s": round(time.time() - _started_at, 1),
+        "pid": os.getpid(),
+        "requests_in_flight": int(metrics.gauge("rag_http_requests_in_flight")),
+        "requests_total": int(metrics.counter_total("rag_http_requests_total")),
+        "stage_errors_total": int(metrics.counter_total("rag_stage_total", status="error"))
+    }
+
+if __name__ == "__main__":
+    import math
+
+    configure_logging("DEBUG")
+
+    print("--- SPAN OVERHEAD ---")
+    logger.setLevel(logging.INFO)  # Production setting: span logs off, metrics on
+    n = 200_000
+    start = time.perf_counter()
+    for _ in range(n):
+        with span("noop"):
+            pass
+    print(f"[+] {(time.perf_counter() - start) / n * 1e6:.2f} us per span")
+
+    print("\n--- PROFILING A SLOW 'REQUEST' ---")
+    profiler = SamplingProfiler(slow_ms=100, interval_ms=5)
+
+    def hot_loop(seconds: float) -> float:
+        end, x = time.perf_counter() + seconds, 0.0
+        while time.perf_counter() < end:
+            x += math.sqrt(12345.678)
+        return x
+
+    trace = uuid.uuid4().hex[:16]
+    profiler.begin(trace)
+    with span("generate", items=1):
+        worker = threading.Thread(target=hot_loop, args=(0.3,))
+        worker.start()
+        worker.join()
+    profiler.report(trace, 0.3, profiler.end(trace), route="demo")
+
+    print("\n--- /metrics ---")
+    print(metrics.render())
@@ -0,0 +1,237 @@
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import os
+import threading
+import time
+import numpy as np
+
+from module16_vector_index import INDEX_DIR, IVF_NPROBE, NumpyVectorIndex, normalize_rows, recall_at_k, top_k
+
+# --- CONFIGURATION ---
+# MiniLM gives 384 float32 dimensions per chunk = 1536 bytes. The quantised
+# modes keep only compact codes in RAM for the first pass and re-rank the
+# best RERANK_CANDIDATES rows against the float vectors, which stay in the
+# memory-mapped vectors.npy (only the re-ranked rows are ever paged in).
+#   int8   : 1 byte per dimension (4x smaller), per-dimension scale. A memory
+#            saving only: NumPy has no int8 matrix multiply that beats float32
+#            BLAS (int8 x int8 -> int32 via np.matmul/einsum measured 1.3-3x
+#            slower), so its first pass widens the codes to float32 and runs at
+#            about the speed of exact float search.
+#   binary : 1 bit per dimension (32x smaller), Hamming distance on sign bits.
+#            The fast first pass (~3.5x faster than exact at 100k vectors) and the default.
+QUANT_MODES = ("int8", "binary")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "200"))
+DECODE_BLOCK = 1024     # int8 rows widened to float32 per step (fits in L2 cache)
+BUILD_BLOCK = 65536     # float rows read per step while writing codes
+
+# NumPy >= 2.0 has a vectorised popcount; older versions use a lookup table
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def popcount_rows(bits: np.ndarray) -> np.ndarray:
+    """Set bits per row of a (n, bytes) uint8 array."""
+    if hasattr(np, "bitwise_count") and bits.shape[1] % 8 == 0:
+        return np.bitwise_count(bits.view(np.uint64)).sum(axis=1, dtype=np.int32)
+    return _POPCOUNT_TABLE[bits].sum(axis=1, dtype=np.int32)
+
+def _blocks(n: int, size: int = BUILD_BLOCK) -> Iterable[slice]:
+    return (slice(i, min(i + size, n)) for i in range(0, n, size))
+
+def int8_scale(vectors: np.ndarray) -> np.ndarray:
+    """Per-dimension symmetric scale: the largest |value| in each dimension maps to 127."""
+    peak = np.zeros(vectors.shape[1], dtype=np.float32)
+    for rows in _blocks(len(vectors)):
+        np.maximum(peak, np.abs(vectors[rows]).max(axis=0), out=peak)
+    return np.maximum(peak, 1e-12) / 127
+
+def quantize_int8(vectors: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    return np.clip(np.rint(vectors / scale), -127, 127).astype(np.int8)
+
+def quantize_binary(vectors: np.ndarray, center: np.ndarray) -> np.ndarray:
+    """
+    Sign bits of the centred vectors, packed 8 per byte and padded to whole
+    64-bit words. Centring first matters: embedding dimensions have non-zero
+    means, so raw signs would be nearly constant in some dimensions.
+    """
+    bits = np.packbits(vectors - center > 0, axis=1)
+    padding = -bits.shape[1] % 8
+    return np.pad(bits, ((0, 0), (0, padding))) if padding else bits
+
+class QuantizedVectorIndex(NumpyVectorIndex):
+    """
+    NumpyVectorIndex with a quantised first pass and float re-ranking.
+
+    The codes for `mode` are written next to the index on first use (and
+    rewritten whenever vectors.npy changes), then loaded fully into RAM.
+    Codes, parameters and the source stamp share one {mode}_codes.npz, written
+    to a temp file and renamed into place, so a reader in another process
+    never sees a torn file or codes from one build with params from another.
+    search() scores every row on the codes, keeps the `rerank` best and
+    re-scores those with the exact float vectors, so returned scores are
+    true cosines. `approximate` (IVF) is ignored: the code scan already is
+    the cheap pass.
+    """
+
+    def __init__(self, directory: Path = INDEX_DIR, mode: str = "binary", rerank: int = RERANK_CANDIDATES):
+        if mode not in QUANT_MODES:
+            raise ValueError(f"Unknown quantisation mode {mode!r}; expected one of {QUANT_MODES}")
+        super().__init__(directory)
+        self.mode = mode
+        self.rerank = rerank
+        if not self._codes_fresh():
+            self._write_codes()
+        with np.load(self._codes_path) as saved:
+            self.codes = saved["codes"]    # In RAM: the array every query scans
+            self.params = saved["params"]  # int8: scale, binary: center
+        self._buffer = np.empty((DECODE_BLOCK, self.vectors.shape[1]), dtype=np.float32) if mode == "int8" else None
+
+    # --- BUILD ---
+
+    def _source_stamp(self) -> Dict:
+        stat = (self.directory / "vectors.npy").stat()
+        return {"mode": self.mode, "count": len(self), "vectors_mtime_ns": stat.st_mtime_ns, "vectors_bytes": stat.st_size}
+
+    @property
+    def _codes_path(self) -> Path:
+        return self.directory / f"{self.mode}_codes.npz"
+
+    def _codes_fresh(self) -> bool:
+        try:
+            with np.load(self._codes_path) as saved:
+                return json.loads(str(saved["stamp"])) == self._source_stamp()
+        except FileNotFoundError:
+            return False
+
+    def _write_codes(self):
+        """Quantises the memory-mapped float vectors block by block (never all in RAM at once)."""
+        n, dim = self.vectors.shape
+        if self.mode == "int8":
+            params = int8_scale(self.vectors)
+            codes = np.empty((n, dim), dtype=np.int8)
+            for rows in _blocks(n):
+                codes[rows] = quantize_int8(self.vectors[rows], params)
+        else:
+            params = np.zeros(dim, dtype=np.float64)
+            for rows in _blocks(n):
+                params += self.vectors[rows].sum(axis=0)
+            params = (params / max(n, 1)).astype(np.float32)
+            codes = np.empty((n, -(-dim // 64) * 8), dtype=np.uint8)
+            for rows in _blocks(n):
+                codes[rows] = quantize_binary(self.vectors[rows], params)
+        # Unique temp name: several processes may quantise the same index at once (last rename wins)
+        tmp_path = self._codes_path.with_name(f"{self._codes_path.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, codes=codes, params=params, stamp=np.array(json.dumps(self._source_stamp())))
+            os.replace(tmp_path, self._codes_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    # --- SEARCH ---
+
+    def coarse_scores(self, queries: np.ndarray) -> np.ndarray:
+        """
+        (n, b) first-pass scores for b normalised queries, higher is better.
+        binary: minus the Hamming distance between sign-bit codes (the fast path).
+        int8: dot product of the float query with the dequantised codes,
+        decoded DECODE_BLOCK rows at a time into a cache-sized buffer. Costs
+        about as much as exact float search: int8 saves memory, not time.
+        """
+        n = len(self.codes)
+        if self.mode == "binary":
+            query_bits = quantize_binary(queries, self.params)
+            return np.stack([-popcount_rows(self.codes ^ bits) for bits in query_bits], axis=1).astype(np.float32)
+
+        # codes * scale . q == codes . (q * scale): fold the scale into the query once
+        scaled = (queries * self.params).T.astype(np.float32)
+        scores = np.empty((n, len(queries)), dtype=np.float32)
+        for start in range(0, n, DECODE_BLOCK):
+            block = self.codes[start : start + DECODE_BLOCK]
+            buffer = self._buffer[: len(block)]
+            np.copyto(buffer, block, casting="unsafe")
+            np.dot(buffer, scaled, out=scores[start : start + len(block)])
+        return scores
+
+    def _rerank(self, query: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        candidates = top_k(scores, max(k, self.rerank))
+        candidates = np.sort(candidates[np.isfinite(scores[candidates])])  # Ascending rows = forward reads of the memmap
+        exact = self.vectors[candidates] @ query
+        return [(int(candidates[i]), float(exact[i])) for i in top_k(exact, k)]
+
+    def search(self, query: np.ndarray, k: int = 4, sources: Optional[Iterable[str]] = None,
+               approximate: bool = False, nprobe: int = IVF_NPROBE) -> List[Tuple[int, float]]:
+        if not len(self):
+            return []
+        query = normalize_rows(query)
+        scores = self.coarse_scores(query[None])[:, 0]
+        if sources is not None:
+            scores = np.where(self.source_mask(sources), scores, -np.inf)
+        return self._rerank(query, scores, k)
+
+    def search_batch(self, queries: np.ndarray, k: int = 4) -> List[List[Tuple[int, float]]]:
+        if not len(self):
+            return [[] for _ in queries]
+        queries = normalize_rows(queries)
+        scores = self.coarse_scores(queries)
+        return [self._rerank(queries[j], scores[:, j], k) for j in range(len(queries))]
+
+    def memory(self) -> Dict:
+        """Bytes the first pass keeps resident vs the float matrix it replaces."""
+        float_bytes = self.vectors.shape[0] * self.vectors.shape[1] * 4
+        code_bytes = self.codes.nbytes + self.params.nbytes
+        return {"float_mb": round(float_bytes / 1e6, 2), "codes_mb": round(code_bytes / 1e6, 2),
+                "ratio": round(float_bytes / code_bytes, 1) if code_bytes else 0.0}
+
+# --- BENCHMARK ---
+
+def benchmark(directory: Path, queries: int = 200, k: int = 10,
+              reranks: Tuple[int, ...] = (10, 50, 200, 500)) -> List[Dict]:
+    """
+    Memory, latency and recall@k of each quantised mode vs exact float search.
+    rerank=k means the first pass alone picks the results (no extra candidates).
+    """
+    index = NumpyVectorIndex(directory)
+    rng = np.random.default_rng(0)
+    picks = rng.choice(len(index), min(queries, len(index)), replace=False)
+    query_vectors = normalize_rows(index.vectors[picks] + rng.normal(0, 0.05, (len(picks), index.vectors.shape[1])))
+
+    def run(name: str, search, memory: Dict) -> Dict:
+        search(query_vectors[0])  # Warm-up: page in the arrays
+        start = time.perf_counter()
+        found = [[row for row, _ in search(q)] for q in query_vectors]
+        ms = (time.perf_counter() - start) * 1000 / len(query_vectors)
+        return {"backend": name, "recall_at_k": round(recall_at_k(truth, found), 4), "ms_per_query": round(ms, 3), **memory}
+
+    truth = [[row for row, _ in index.search(q, k)] for q in query_vectors]
+    float_mb = round(index.vectors.nbytes / 1e6, 2)
+    results = [run("float32-exact", lambda q: index.search(q, k), {"resident_mb": float_mb})]
+    for mode in QUANT_MODES:
+        quantized = QuantizedVectorIndex(directory, mode)
+        for rerank in reranks:
+            quantized.rerank = rerank
+            results.append(run(f"{mode}(rerank={rerank})", lambda q: quantized.search(q, k),
+                               {"resident_mb": quantized.memory()["codes_mb"]}))
+    return results
+
+if __name__ == "__main__":
+    import sys
+
+    # python module25_quantization.py                     -> quantise the exported Chroma index (Module 16)
+    # python module25_quantization.py --synthetic 300000  -> clustered random corpus of that size
+    if "--synthetic" in sys.argv:
+        n = int(sys.argv[sys.argv.index("--synthetic") + 1])
+        print(f"--- BUILDING SYNTHETIC INDEX ({n} x 384) ---")
+        rng = np.random.default_rng(1)
+        centers = rng.normal(size=(256, 384))
+        data = centers[rng.integers(0, 256, n)] + rng.normal(0, 0.6, (n, 384))
+        directory = INDEX_DIR.with_name("numpy_index_synthetic")
+        NumpyVectorIndex.build(directory, [str(i) for i in range(n)], data, [""] * n, ["synthetic"] * n)
+    else:
+        from module14_resources import get_numpy_index
+        directory = get_numpy_index().directory
+
+    print("\n--- MEMORY / LATENCY / RECALL@10 VS FLOAT32 ---")
+    for row in benchmark(directory):
+        print(f"    {row['backend']:<20} recall={row['recall_at_k']:<7} {row['ms_per_query']:>8} ms/query "
+              f"{row['resident_mb']:>9} MB resident")
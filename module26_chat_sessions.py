@@ -0,0 +1,410 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Set, Tuple, TYPE_CHECKING
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+from module24_observability import span
+
+if TYPE_CHECKING:
+    from module13_semantic_cache import SemanticCache
+
+# --- CONFIGURATION ---
+# The LLM sees a bounded history: a running summary of older turns plus the
+# last WINDOW_TURNS turns verbatim, within HISTORY_TOKENS. Prefill time then
+# stays flat as a conversation grows instead of growing with every turn.
+SESSIONS_PATH = Path("./chroma_storage/sessions.sqlite")
+WINDOW_TURNS = int(os.getenv("CHAT_WINDOW_TURNS", "4"))       # Recent question/answer pairs kept verbatim
+HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "600"))  # Budget for summary + recent turns
+SUMMARY_SHARE = 0.5        # Most of HISTORY_TOKENS the summary may take (it is cut to fit)
+SUMMARY_WORDS = 120        # Target length of the running summary
+HELPER_MAX_TOKENS = 160    # Cap on tokens generated by the rewrite/summary calls
+SESSION_TTL_SECONDS = 7 * 24 * 3600
+
+# Follow-ups that lean on earlier turns ("what about its port?") are rewritten
+# into standalone queries before retrieval; self-contained questions skip the extra LLM call.
+_FOLLOW_UP_RE = re.compile(
+    r"\b(it|its|it's|that|this|those|these|they|them|their|he|she|him|her|there|same|above|"
+    r"previous|earlier|former|latter|else|more|instead)\b|^(and|but|also|so|what about|how about|why|"
+    r"which one|then)\b",
+    re.IGNORECASE
+)
+
+SYSTEM_PROMPT = (
+    "You are 'LOCAL_BRAIN', a secure, locally-hosted AI agent. "
+    "Answer the user's latest question based ONLY on the context given with it and the conversation so far. "
+    "If you do not know the answer based on the context, say \"I don't have that information in my local memory.\" "
+    "Do not make things up."
+)
+REWRITE_PROMPT = (
+    "Rewrite the user's last question as one standalone search query that can be understood without the "
+    "conversation. Keep names, numbers and technical terms. Reply with the query only."
+)
+SUMMARY_PROMPT = (
+    "Update the running summary of a conversation between a user and an assistant with the new exchanges. "
+    f"Keep facts, names and numbers the user may refer back to. At most {SUMMARY_WORDS} words. "
+    "Reply with the summary only."
+)
+
+@dataclass
+class Turn:
+    question: str
+    answer: str
+    standalone: str = ""  # The retrieval query the question was rewritten to
+
+@dataclass
+class Session:
+    session_id: str
+    summary: str = ""
+    summarized: int = 0      # Turns [0, summarized) are folded into the summary
+    turns: List[Turn] = field(default_factory=list)  # Turns [summarized, ...) verbatim, oldest first
+
+class SessionStore:
+    """
+    Server-side conversation state in SQLite, shared by the API and the
+    Streamlit app (and by every worker process on the machine).
+    Only the running summary and the not-yet-summarised turns are loaded per
+    request; the full transcript stays on disk for history().
+    """
+
+    def __init__(self, path: Path = SESSIONS_PATH, ttl_seconds: float = SESSION_TTL_SECONDS):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY, summary TEXT, summarized INTEGER, turns INTEGER, updated_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS turns (
+                session_id TEXT, turn INTEGER, question TEXT, answer TEXT, standalone TEXT, created_at REAL,
+                PRIMARY KEY (session_id, turn)
+            ) WITHOUT ROWID;
+        """)
+
+    def create(self) -> str:
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute("INSERT INTO sessions VALUES (?, '', 0, 0, ?)", (session_id, time.time()))
+        self.expire()
+        return session_id
+
+    def exists(self, session_id: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone() is not None
+
+    def load(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT summary, summarized FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            turns = self._db.execute(
+                "SELECT question, answer, standalone FROM turns WHERE session_id = ? AND turn >= ? ORDER BY turn",
+                (session_id, row[1])
+            ).fetchall()
+        return Session(session_id, row[0], row[1], [Turn(*t) for t in turns])
+
+    def add_turn(self, session_id: str, turn: Turn) -> int:
+        """Appends a turn; returns the session's total number of turns."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                count = self._db.execute("SELECT turns FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+                if count is None:
+                    raise KeyError(session_id)
+                self._db.execute("INSERT INTO turns VALUES (?, ?, ?, ?, ?, ?)",
+                                 (session_id, count[0], turn.question, turn.answer, turn.standalone, time.time()))
+                self._db.execute("UPDATE sessions SET turns = turns + 1, updated_at = ? WHERE session_id = ?",
+                                 (time.time(), session_id))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return count[0] + 1
+
+    def set_summary(self, session_id: str, summary: str, summarized: int):
+        with self._lock:
+            self._db.execute("UPDATE sessions SET summary = ?, summarized = ? WHERE session_id = ? AND summarized < ?",
+                             (summary, summarized, session_id, summarized))
+
+    def history(self, session_id: str) -> List[Dict]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT question, answer, standalone, created_at FROM turns WHERE session_id = ? ORDER BY turn",
+                (session_id,)
+            ).fetchall()
+        return [{"question": q, "answer": a, "standalone_query": s, "created_at": c} for q, a, s, c in rows]
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            self._db.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+            return self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount > 0
+
+    def expire(self) -> int:
+        """Deletes sessions idle for longer than the TTL."""
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            stale = [r[0] for r in self._db.execute("SELECT session_id FROM sessions WHERE updated_at < ?", (cutoff,))]
+            for session_id in stale:
+                self._db.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+                self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        return len(stale)
+
+def needs_rewrite(question: str, session: Session) -> bool:
+    """Only follow-ups in a conversation with history pay for a rewrite call."""
+    if not session.turns and not session.summary:
+        return False
+    return len(question.split()) <= 3 or _FOLLOW_UP_RE.search(question) is not None
+
+def _content(message) -> str:
+    return getattr(message, "content", message)
+
+class ChatPipeline:
+    """
+    Conversation-aware RAG: session history -> standalone query -> retrieve ->
+    packed context -> chat LLM.
+
+    The chat prompt is laid out so consecutive turns share a long identical
+    prefix (system prompt, summary, earlier turns; the new context and
+    question come last). With the model kept loaded (keep_alive), Ollama
+    reuses the cached prefix and only prefills what is new. Older turns are
+    folded into the running summary in a background thread after the answer
+    has been streamed, so summarising never delays a reply.
+    With an `answer_cache` (Module 13), answers are looked up and stored
+    under the standalone query and the packed context, so the chat UI gets
+    the same semantic cache hits as the single-shot chain.
+    """
+
+    def __init__(self, store: SessionStore, retriever, llm, helper_llm, packer, count_tokens: Callable[[str], int],
+                 window_turns: int = WINDOW_TURNS, history_tokens: int = HISTORY_TOKENS, reranker=None,
+                 answer_cache: Optional["SemanticCache"] = None):
+        self.store = store
+        self.answer_cache = answer_cache
+        self.retriever = retriever
+        self.reranker = reranker  # Optional cross-encoder stage (Module 27)
+        self.llm = llm
+        self.helper_llm = helper_llm  # Same model, capped output length
+        self.packer = packer
+        self.count_tokens = count_tokens
+        self.window_turns = window_turns
+        self.history_tokens = history_tokens
+        self._summarizer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-summary")
+        self._summarizing: Set[str] = set()
+        self._summarizing_lock = threading.Lock()
+
+    # --- HISTORY ---
+
+    def _truncate(self, text: str, max_tokens: int) -> Tuple[str, int]:
+        """Longest word prefix of `text` within `max_tokens` (binary search on the word count)."""
+        tokens = self.count_tokens(text)
+        if tokens <= max_tokens:
+            return text, tokens
+        words = text.split()
+        low, high = 0, len(words)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count_tokens(" ".join(words[:middle])) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        text = " ".join(words[:low])
+        return text, self.count_tokens(text) if text else 0
+
+    def _history(self, session: Session) -> Tuple[List[Tuple[str, str]], Dict]:
+        """Chat messages for the summary and the newest turns that fit in the history budget."""
+        system = SYSTEM_PROMPT
+        used = 0
+        if session.summary:
+            # The summary counts against the budget too; an over-long one is cut, never let through
+            summary, used = self._truncate(session.summary, int(self.history_tokens * SUMMARY_SHARE))
+            if summary:
+                system += f"\n\nSummary of the conversation so far: {summary}"
+        kept: List[Turn] = []
+        for turn in reversed(session.turns):
+            tokens = self.count_tokens(turn.question) + self.count_tokens(turn.answer)
+            if used + tokens > self.history_tokens:
+                break
+            kept.append(turn)
+            used += tokens
+        messages = [("system", system)]
+        for turn in reversed(kept):
+            messages += [("human", turn.question), ("ai", turn.answer)]
+        return messages, {"history_turns": len(kept), "history_tokens": used, "summarized_turns": session.summarized}
+
+    def _standalone(self, question: str, session: Session, history: List[Tuple[str, str]]) -> str:
+        if not needs_rewrite(question, session):
+            return question
+        with span("rewrite"):
+            try:
+                query = _content(self.helper_llm.invoke(
+                    history + [("human", question), ("human", REWRITE_PROMPT)]
+                )).strip().strip('"')
+            except Exception as e:
+                print(f"[!] Query rewrite failed ({e}); using the previous question as context.")
+                query = ""
+        if query:
+            return query
+        # Fallback keeps the previous question's terms in the retrieval query
+        return f"{session.turns[-1].question} {question}" if session.turns else question
+
+    def _prepare(self, session_id: str, question: str, info: Dict):
+        session = self.store.load(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        history, info["history"] = self._history(session)
+        standalone = self._standalone(question, session, history)
+        info["standalone_query"] = standalone
+        return session, history, standalone
+
+    def _rerank(self, standalone: str, docs: List, info: Dict) -> List:
+        if self.reranker is None:
+            return docs
+        with span("rerank", items=len(docs)):
+            docs, info["rerank"] = self.reranker.rerank(standalone, docs)
+        return docs
+
+    def _messages(self, history: List[Tuple[str, str]], question: str, standalone: str, docs: List, info: Dict):
+        """Prompt messages, the context fingerprint and a cached answer (or None)."""
+        from module13_semantic_cache import context_fingerprint
+        with span("prompt", items=len(docs)):
+            texts, info["context"] = self.packer.pack(docs, question)
+            info["context"]["prompt_tokens"] += info["history"]["history_tokens"]
+            context = "\n\n".join(texts)
+            context_key = context_fingerprint(texts)
+            cached = self.answer_cache.lookup(standalone, context_key) if self.answer_cache else None
+            info["cache_hit"] = cached is not None
+            return history + [("human", f"Context:\n{context}\n\nQuestion: {question}")], context_key, cached
+
+    def _remember(self, standalone: str, context_key: str, answer: str):
+        if self.answer_cache is not None and answer:
+            self.answer_cache.store(standalone, context_key, answer)
+
+    # --- SUMMARY ---
+
+    def _finish(self, session_id: str, session: Session, question: str, answer: str, standalone: str):
+        total = self.store.add_turn(session_id, Turn(question, answer, standalone))
+        if total - session.summarized > self.window_turns:
+            with self._summarizing_lock:
+                if session_id in self._summarizing:
+                    return
+                self._summarizing.add(session_id)
+            self._summarizer.submit(self._summarize, session_id)
+
+    def _summarize(self, session_id: str):
+        """Folds the turns that slid out of the window into the running summary."""
+        try:
+            session = self.store.load(session_id)
+            if session is None:
+                return
+            fold = session.turns[: max(0, len(session.turns) - self.window_turns)]
+            if not fold:
+                return
+            exchanges = "\n".join(f"User: {t.question}\nAssistant: {t.answer}" for t in fold)
+            with span("summarize", items=len(fold)):
+                summary = _content(self.helper_llm.invoke([
+                    ("system", SUMMARY_PROMPT),
+                    ("human", f"Current summary: {session.summary or '(empty)'}\n\nNew exchanges:\n{exchanges}")
+                ])).strip()
+            self.store.set_summary(session_id, summary, session.summarized + len(fold))
+        except Exception as e:
+            print(f"[!] Summary update failed for session {session_id}: {e}")
+        finally:
+            with self._summarizing_lock:
+                self._summarizing.discard(session_id)
+
+    # --- CHAT ---
+
+    def stream(self, session_id: str, question: str, info: Optional[Dict] = None) -> Iterator[str]:
+        info = {} if info is None else info
+        session, history, standalone = self._prepare(session_id, question, info)
+        with span("retrieve"):
+            docs = self.retriever.invoke(standalone)
+        docs = self._rerank(standalone, docs, info)
+        messages, context_key, cached = self._messages(history, question, standalone, docs, info)
+        if cached is not None:
+            yield cached
+            self._finish(session_id, session, question, cached, standalone)
+            return
+        tokens = []
+        with span("generate") as generate:
+            for chunk in self.llm.stream(messages):
+                token = _content(chunk)
+                if token:
+                    tokens.append(token)
+                    yield token
+            generate.items = len(tokens)
+        self._remember(standalone, context_key, "".join(tokens))
+        self._finish(session_id, session, question, "".join(tokens), standalone)
+
+    async def astream(self, session_id: str, question: str, info: Optional[Dict] = None) -> AsyncIterator[str]:
+        import asyncio
+        info = {} if info is None else info
+        # Session load and the (rare) rewrite call are blocking: keep them off the event loop
+        session, history, standalone = await asyncio.to_thread(self._prepare, session_id, question, info)
+        with span("retrieve"):
+            docs = await self.retriever.ainvoke(standalone)
+        if self.reranker is not None:
+            docs = await asyncio.to_thread(self._rerank, standalone, docs, info)
+        messages, context_key, cached = self._messages(history, question, standalone, docs, info)
+        if cached is not None:
+            yield cached
+            await asyncio.to_thread(self._finish, session_id, session, question, cached, standalone)
+            return
+        tokens = []
+        with span("generate") as generate:
+            async for chunk in self.llm.astream(messages):
+                token = _content(chunk)
+                if token:
+                    tokens.append(token)
+                    yield token
+            generate.items = len(tokens)
+        self._remember(standalone, context_key, "".join(tokens))
+        await asyncio.to_thread(self._finish, session_id, session, question, "".join(tokens), standalone)
+
+    def invoke(self, session_id: str, question: str, info: Optional[Dict] = None) -> str:
+        return "".join(self.stream(session_id, question, info))
+
+def build_chat_pipeline(store: Optional[SessionStore] = None) -> ChatPipeline:
+    """
+    Builds the chat pipeline from the shared registry (Module 14): same
+    retriever, LLM and context packing as the single-shot RAG chain.
+    Use module14_resources.get_chat_pipeline() to share one per process.
+    """
+    from module14_resources import get_answer_cache, get_llm, get_reranker, get_retriever, get_session_store
+    from module21_context_packing import CANDIDATES, CONTEXT_TOKENS, ContextPacker, make_token_counter
+    from module27_reranking import RERANK, RERANK_TOP_N
+
+    llm = get_llm()
+    # Same model, options and keep_alive (so Ollama never reloads it); only the output length differs
+    helper_llm = llm.model_copy(update={"num_predict": HELPER_MAX_TOKENS})
+    count_tokens = make_token_counter(llm)
+    packer = ContextPacker(count_tokens, budget=CONTEXT_TOKENS, prompt_overhead=count_tokens(SYSTEM_PROMPT))
+    return ChatPipeline(store or get_session_store(), get_retriever(k=RERANK_TOP_N if RERANK else CANDIDATES),
+                        llm, helper_llm, packer, count_tokens, reranker=get_reranker() if RERANK else None,
+                        answer_cache=get_answer_cache())
+
+if __name__ == "__main__":
+    from module8_rag import timed_stream
+    from module14_resources import get_chat_pipeline, get_session_store
+
+    print("--- MULTI-TURN CHAT ---")
+    chat = get_chat_pipeline()
+    session_id = get_session_store().create()
+    for question in ["What is the new VPN address for the company?",
+                     "And what do I log in with?",
+                     "Who do I call if that doesn't work?"]:
+        print(f"\nUser: {question}\nLOCAL_BRAIN Agent: ", end="")
+        timings, info = {}, {}
+        for token in timed_stream(chat.stream(session_id, question, info), timings):
+            print(token, end="", flush=True)
+        print(f"\n[+] Retrieval query: {info['standalone_query']!r}")
+        print(f"[+] First token after {timings.get('ttft_s', 0):.2f}s, prompt {info['context']['prompt_tokens']} tokens, "
+              f"history {info['history']}")
@@ -0,0 +1,208 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import os
+import threading
+import time
+
+from module24_observability import logger
+
+# --- CONFIGURATION ---
+# The bi-encoder (MiniLM) ranks chunks by vector distance; a cross-encoder
+# reads query and chunk together and ranks far more precisely, at a cost per
+# pair. So: retrieve RERANK_TOP_N cheaply, score those pairs in one batched
+# forward pass, and hand only the best RERANK_KEEP to the prompt.
+RERANK = os.getenv("RERANK", "0") == "1"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "20"))        # Candidates fetched from the vector store
+RERANK_KEEP = int(os.getenv("RERANK_KEEP", "4"))           # Chunks passed on to the context packer
+RERANK_THRESHOLD = float(os.getenv("RERANK_THRESHOLD", "-2.0"))  # ms-marco logit; clearly irrelevant pairs score below
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "250"))   # Scoring time allowed per request
+RERANK_BATCH_SIZE = 32       # Pairs per forward pass (>= RERANK_TOP_N: one pass per request)
+MAX_LENGTH = 512             # Tokens per (query, chunk) pair
+CACHE_ENTRIES = 20_000       # (query hash, chunk text hash) -> score, LRU
+
+def load_cross_encoder(model_name: str = RERANK_MODEL):
+    print(f"--- LOADING CROSS-ENCODER: {model_name} ---")
+    start = time.time()
+    from sentence_transformers import CrossEncoder
+    model = CrossEncoder(model_name, max_length=MAX_LENGTH)
+    print(f"[+] Cross-encoder loaded in {time.time() - start:.2f} seconds.")
+    return model
+
+def query_hash(question: str) -> str:
+    """Case- and whitespace-insensitive, so trivially different spellings share cached scores."""
+    return hashlib.sha1(" ".join(question.lower().split()).encode("utf-8")).hexdigest()
+
+def chunk_key(doc) -> str:
+    # Keyed on the text, not the ID: some IDs are stable across content changes
+    # (e.g. Module 6's seeded "doc_N"), and a score must never outlive its text
+    return hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+class Reranker:
+    """
+    Cross-encoder re-ranking of retrieved Documents.
+
+    - Scores already computed for (query hash, chunk text hash) come from an LRU cache.
+    - The remaining pairs are scored in retrieval order, in batches of
+      `batch_size` (normally a single forward pass), while the latency budget
+      allows: the expected batch cost comes from a running per-pair average.
+    - Results are sorted by score and cut at the first one below `threshold`;
+      at most `keep` are returned, each with metadata["score"] set to its
+      cross-encoder score (so the context packer orders by it).
+    If nothing could be scored in budget, the retrieval order is kept; if
+    everything scored falls below the threshold, the single best candidate
+    is still kept (never an empty context) and the fallback is counted.
+    """
+
+    def __init__(self, model, keep: int = RERANK_KEEP, threshold: float = RERANK_THRESHOLD,
+                 budget_ms: float = RERANK_BUDGET_MS, batch_size: int = RERANK_BATCH_SIZE,
+                 cache_entries: int = CACHE_ENTRIES):
+        self.model = model
+        self.keep = keep
+        self.threshold = threshold
+        self.budget_s = budget_ms / 1000
+        self.batch_size = batch_size
+        self.cache_entries = cache_entries
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.seconds_per_pair: Optional[float] = None  # Running average, learned from real batches
+        self.requests = 0
+        self.pairs_scored = 0
+        self.cache_hits = 0
+        self.budget_cutoffs = 0
+        self.threshold_fallbacks = 0
+
+    def warm_up(self):
+        """One tiny forward pass, so the first request does not pay for kernel initialisation."""
+        self.model.predict([("warm-up", "warm-up")], show_progress_bar=False)
+
+    def _cached(self, key: Tuple[str, str]) -> Optional[float]:
+        with self._lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _remember(self, keys: List[Tuple[str, str]], scores: List[float]):
+        with self._lock:
+            for key, score in zip(keys, scores):
+                self._cache[key] = score
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+
+    def _affordable(self, remaining_s: float, wanted: int) -> int:
+        """How many of `wanted` pairs fit in the remaining budget (always at least one batch before any estimate)."""
+        if self.seconds_per_pair is None:
+            return wanted
+        return max(0, min(wanted, int(remaining_s / self.seconds_per_pair)))
+
+    def rerank(self, question: str, docs: List) -> Tuple[List, Dict]:
+        start = time.perf_counter()
+        qhash = query_hash(question)
+        keys = [(qhash, chunk_key(doc)) for doc in docs]
+        scores: Dict[int, float] = {}
+        for i, key in enumerate(keys):
+            score = self._cached(key)
+            if score is not None:
+                scores[i] = score
+        hits = len(scores)
+
+        pending = [i for i in range(len(docs)) if i not in scores]
+        cut_by_budget = False
+        while pending:
+            remaining = self.budget_s - (time.perf_counter() - start)
+            batch = pending[: self._affordable(remaining, min(self.batch_size, len(pending)))]
+            if not batch:
+                cut_by_budget = True
+                break
+            batch_start = time.perf_counter()
+            predicted = self.model.predict([(question, docs[i].page_content) for i in batch],
+                                           batch_size=self.batch_size, show_progress_bar=False)
+            per_pair = (time.perf_counter() - batch_start) / len(batch)
+            self.seconds_per_pair = per_pair if self.seconds_per_pair is None else 0.8 * self.seconds_per_pair + 0.2 * per_pair
+            batch_scores = [float(s) for s in predicted]
+            self._remember([keys[i] for i in batch], batch_scores)
+            scores.update(zip(batch, batch_scores))
+            pending = pending[len(batch):]
+            # Early exit: enough good chunks already, and this whole batch fell below the threshold
+            if sum(s >= self.threshold for s in scores.values()) >= self.keep and max(batch_scores) < self.threshold:
+                break
+
+        ranked = sorted(scores.items(), key=lambda item: -item[1])
+        kept, below = [], 0
+        for n, (i, score) in enumerate(ranked):
+            if score < self.threshold:
+                below = len(ranked) - n  # Sorted: everything from here on is below too
+                break
+            if len(kept) < self.keep:
+                docs[i].metadata["score"] = score
+                kept.append(docs[i])
+        threshold_fallback = bool(ranked) and not kept
+        if not scores:
+            kept = docs[: self.keep]  # Nothing scored in budget: fall back to retrieval order
+        elif threshold_fallback:
+            # Everything fell below the threshold (common for BM25 candidates): keep the best one anyway
+            i, score = ranked[0]
+            docs[i].metadata["score"] = score
+            kept = [docs[i]]
+            logger.info(f"rerank threshold cut all {len(ranked)} candidates (best {score:.2f}); keeping the top one")
+
+        with self._lock:
+            self.requests += 1
+            self.pairs_scored += len(scores) - hits
+            self.cache_hits += hits
+            self.budget_cutoffs += cut_by_budget
+            self.threshold_fallbacks += threshold_fallback
+        return kept, {
+            "candidates": len(docs),
+            "scored": len(scores) - hits,
+            "cache_hits": hits,
+            "unscored": len(docs) - len(scores),
+            "below_threshold": below,
+            "kept": len(kept),
+            "budget_exhausted": cut_by_budget,
+            "threshold_fallback": threshold_fallback,
+            "ms": round((time.perf_counter() - start) * 1000, 2)
+        }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.pairs_scored + self.cache_hits
+            return {
+                "requests": self.requests,
+                "pairs_scored": self.pairs_scored,
+                "cache_hits": self.cache_hits,
+                "hit_rate": round(self.cache_hits / lookups, 4) if lookups else 0.0,
+                "cache_entries": len(self._cache),
+                "budget_cutoffs": self.budget_cutoffs,
+                "threshold_fallbacks": self.threshold_fallbacks,
+                "ms_per_pair": round(self.seconds_per_pair * 1000, 3) if self.seconds_per_pair else None
+            }
+
+if __name__ == "__main__":
+    from langchain_core.documents import Document
+
+    reranker = Reranker(load_cross_encoder())
+    reranker.warm_up()
+    question = "What is the new VPN address for the company?"
+    docs = [
+        Document(id=str(i), page_content=text, metadata={"score": 1.0 - i / 10})
+        for i, text in enumerate([
+            "The cafeteria is closed on Fridays for maintenance.",
+            "Employees should use their badge PIN to log in to the VPN.",
+            "The new VPN address is vpn.enterprise.local.",
+            "Quarterly revenue grew by four percent.",
+            "Support for the old VPN gateway ends on Friday.",
+        ])
+    ]
+
+    print("\n--- RE-RANKING (cold, then cached) ---")
+    for attempt in ("cold", "cached"):
+        kept, stats = reranker.rerank(question, [Document(id=d.id, page_content=d.page_content, metadata=dict(d.metadata))
+                                                 for d in docs])
+        print(f"[+] {attempt}: {stats}")
+    for doc in kept:
+        print(f"    {doc.metadata['score']:6.2f}  {doc.page_content}")
+    print(f"\n[+] Reranker stats: {reranker.stats()}")
@@ -0,0 +1,524 @@
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from html.parser import HTMLParser
+from itertools import groupby, zip_longest
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple, TYPE_CHECKING
+import csv
+import importlib.util
+import multiprocessing
+import os
+import random
+import re
+import tempfile
+import time
+import zipfile
+from xml.etree import ElementTree
+
+import module2_ingest
+from module2_ingest import CHUNK_SIZE, stream_chunker
+
+if TYPE_CHECKING:
+    from module18_chunking import SentenceChunker
+
+# --- CONFIGURATION ---
+# Every extractor is a generator of TextBlocks: a page of a PDF, or a run of
+# paragraphs under one heading. Blocks are chunked as they arrive, so a
+# document is never held in memory whole. Files with a suffix nobody
+# registered are read as plain UTF-8 text (module2_ingest.iter_text_windows).
+# Parsing is CPU-bound and holds the GIL, so bulk ingestion runs it on a
+# process pool of EXTRACT_WORKERS.
+BLOCK_CHARS = 64 * 1024    # Max text per block (bounds memory on long sections)
+READ_CHARS = 64 * 1024     # Characters read per step from HTML files
+CSV_ROWS_PER_BLOCK = 500   # Rows per block; the block's section is "rows a-b"
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+
+class TextBlock(NamedTuple):
+    text: str
+    page: Optional[int]     # 1-based; None when the format has no pages
+    section: Optional[str]  # Heading path ("Policy > Remote access"), or None
+
+Extractor = Callable[[Path], Iterator[TextBlock]]
+EXTRACTORS: Dict[str, Extractor] = {}
+
+def register_extractor(*suffixes: str):
+    """Decorator: registers an extractor for the given file suffixes (".pdf", ...)."""
+    def register(extractor: Extractor) -> Extractor:
+        for suffix in suffixes:
+            EXTRACTORS[suffix.lower()] = extractor
+        return extractor
+    return register
+
+def is_plain_text(filename: str) -> bool:
+    return Path(filename).suffix.lower() not in EXTRACTORS
+
+def extract(filename: str) -> Iterator[TextBlock]:
+    """Streams the text blocks of a file under module2_ingest.DATA_DIR."""
+    return EXTRACTORS[Path(filename).suffix.lower()](module2_ingest.DATA_DIR / filename)
+
+class _BlockWriter:
+    """Joins paragraphs into TextBlocks, starting a new block when the page or section changes."""
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.size = 0
+        self.page: Optional[int] = None
+        self.section: Optional[str] = None
+
+    def add(self, text: str, page: Optional[int], section: Optional[str]) -> Iterator[TextBlock]:
+        if self.parts and (page, section) != (self.page, self.section):
+            yield from self.flush()
+        self.page, self.section = page, section
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= BLOCK_CHARS:
+            yield from self.flush()
+
+    def flush(self) -> Iterator[TextBlock]:
+        text = "".join(self.parts)
+        self.parts, self.size = [], 0
+        if text.strip():
+            yield TextBlock(text, self.page, self.section)
+
+def _heading_path(stack: List[str], level: int, title: str) -> str:
+    """Updates the open headings with one at `level` (1 = top) and returns the path to it."""
+    del stack[level - 1:]
+    stack.extend([""] * (level - 1 - len(stack)))  # A skipped level (h1 -> h3) leaves a gap
+    stack.append(title)
+    return " > ".join(t for t in stack if t)
+
+# --- MARKDOWN ---
+
+_MD_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)[\s#]*$")
+
+@register_extractor(".md", ".markdown")
+def extract_markdown(path: Path) -> Iterator[TextBlock]:
+    writer, stack, section, fenced = _BlockWriter(), [], None, False
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if line.lstrip().startswith(("```", "~~~")):
+                fenced = not fenced  # "# comment" inside a code block is not a heading
+            elif not fenced and (match := _MD_HEADING_RE.match(line)):
+                section = _heading_path(stack, len(match.group(1)), match.group(2))
+                yield from writer.add(match.group(2) + "\n\n", None, section)
+                continue
+            yield from writer.add(line, None, section)
+    yield from writer.flush()
+
+# --- HTML ---
+
+_SPACES_RE = re.compile(r"\s+")
+
+class _HTMLText(HTMLParser):
+    """Incremental HTML -> text: block tags become paragraph breaks, h1-h6 open sections."""
+
+    SKIP = {"head", "script", "style", "noscript", "template", "svg"}
+    HEADINGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+    BREAKS = {"p", "div", "br", "li", "tr", "ul", "ol", "table", "pre", "blockquote", "section",
+              "article", "header", "footer", "main", "nav", "aside", "dd", "dt", "figcaption"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.writer = _BlockWriter()
+        self.ready: List[TextBlock] = []
+        self.stack: List[str] = []
+        self.section: Optional[str] = None
+        self.skip = 0
+        self.pre = 0
+        self.heading: Optional[str] = None
+        self.heading_text: List[str] = []
+        self.at_break = True
+
+    def _add(self, text: str):
+        self.ready.extend(self.writer.add(text, None, self.section))
+
+    def _break(self):
+        if not self.at_break:
+            self._add("\n\n")
+            self.at_break = True
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self.skip += 1
+        elif tag in self.HEADINGS:
+            self.heading, self.heading_text = tag, []
+        elif tag in self.BREAKS:
+            self.pre += tag == "pre"
+            self._break()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self.skip = max(0, self.skip - 1)
+        elif tag == self.heading:
+            self.heading = None
+            title = " ".join("".join(self.heading_text).split())
+            if title:
+                self._break()
+                self.section = _heading_path(self.stack, int(tag[1]), title)
+                self._add(title + "\n\n")
+        elif tag in self.BREAKS:
+            self.pre = max(0, self.pre - (tag == "pre"))
+            self._break()
+
+    def handle_data(self, data):
+        if self.skip:
+            return
+        if self.heading is not None:
+            self.heading_text.append(data)
+            return
+        text = data if self.pre else _SPACES_RE.sub(" ", data)
+        if text.strip():
+            self._add(text.lstrip() if self.at_break else text)
+            self.at_break = False
+
+@register_extractor(".html", ".htm", ".xhtml")
+def extract_html(path: Path) -> Iterator[TextBlock]:
+    parser = _HTMLText()
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        while data := f.read(READ_CHARS):
+            parser.feed(data)
+            yield from parser.ready
+            parser.ready.clear()
+    parser.close()
+    yield from parser.ready
+    yield from parser.writer.flush()
+
+# --- CSV ---
+
+@register_extractor(".csv", ".tsv")
+def extract_csv(path: Path) -> Iterator[TextBlock]:
+    """One "column: value; ..." line per row, so every chunk can be read without the header."""
+    with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+        reader = csv.reader(f, delimiter="\t" if path.suffix.lower() == ".tsv" else ",")
+        header = [h.strip() for h in next(reader, [])]
+        lines, first = [], 2  # Spreadsheet row numbers: the header is row 1
+        for number, row in enumerate(reader, 2):
+            # Ragged rows: cells past the header are kept, without a "column:" prefix
+            cells = zip_longest(header, row, fillvalue="")
+            line = "; ".join(f"{h}: {v.strip()}" if h else v.strip() for h, v in cells if v.strip())
+            if line:
+                lines.append(line)
+            if len(lines) >= CSV_ROWS_PER_BLOCK:
+                yield TextBlock("\n".join(lines) + "\n", None, f"rows {first}-{number}")
+                lines, first = [], number + 1
+        if lines:
+            yield TextBlock("\n".join(lines) + "\n", None, f"rows {first}-{number}")
+
+# --- DOCX ---
+# A .docx is a zip of XML parts; the body is word/document.xml. It is parsed
+# with iterparse and every top-level body element (paragraph, table) is
+# detached once read, so memory stays flat however long the document is.
+# Pages come from the layout Word rendered when the file was saved
+# (w:lastRenderedPageBreak), so they match what the author saw. Explicit page
+# breaks are only used for documents without a rendered layout: Word records
+# a rendered break after every explicit one, so counting both would double it.
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_DOCX_HEADING_RE = re.compile(r"^(?:heading\s*(\d)|title)$", re.IGNORECASE)
+_RENDERED_BREAK = b"lastRenderedPageBreak"
+
+def _docx_has_rendered_breaks(archive: zipfile.ZipFile) -> bool:
+    """Byte scan of the body part: far cheaper than a second XML parse."""
+    tail = b""
+    with archive.open("word/document.xml") as xml:
+        while chunk := xml.read(1 << 20):
+            if _RENDERED_BREAK in tail + chunk:
+                return True
+            tail = chunk[-len(_RENDERED_BREAK):]
+    return False
+
+def _docx_paragraph(paragraph, rendered: bool) -> Tuple[str, int]:
+    """Text of one w:p element and the number of page breaks in it (rendered or explicit)."""
+    parts, breaks = [], 0
+    for element in paragraph.iter():
+        if element.tag == _W + "t":
+            parts.append(element.text or "")
+        elif element.tag == _W + "tab":
+            parts.append("\t")
+        elif rendered and element.tag == _W + "lastRenderedPageBreak":
+            breaks += 1
+        elif not rendered and element.tag == _W + "br" and element.get(_W + "type") == "page":
+            breaks += 1
+    return "".join(parts), breaks
+
+@register_extractor(".docx")
+def extract_docx(path: Path) -> Iterator[TextBlock]:
+    writer, stack, section, page = _BlockWriter(), [], None, 1
+    body, depth, body_depth = None, 0, None
+    with zipfile.ZipFile(path) as archive:
+        rendered = _docx_has_rendered_breaks(archive)
+        with archive.open("word/document.xml") as xml:
+            for event, element in ElementTree.iterparse(xml, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if element.tag == _W + "body":
+                        body, body_depth = element, depth
+                    continue
+                depth -= 1
+                if element.tag == _W + "p":
+                    text, breaks = _docx_paragraph(element, rendered)
+                    style = element.find(f"{_W}pPr/{_W}pStyle")
+                    element.clear()
+                    page += breaks
+                    if text.strip():
+                        match = _DOCX_HEADING_RE.match(style.get(_W + "val", "")) if style is not None else None
+                        if match:
+                            section = _heading_path(stack, int(match.group(1) or 1), text.strip())
+                        yield from writer.add(text + "\n\n", page, section)
+                if body is not None and depth == body_depth:
+                    # A finished top-level element: detach it, or the emptied
+                    # elements stay attached to w:body for the whole parse
+                    body.remove(element)
+    yield from writer.flush()
+
+# --- PDF ---
+# pypdf (optional: pip install pypdf) parses one page object at a time.
+# Sections come from the document outline (bookmarks), when it has one.
+
+def _pdf_outline(reader) -> List[Tuple[int, str]]:
+    """[(first page, heading path)] sorted by page."""
+    starts = []
+
+    def walk(items, path):
+        title = None
+        for item in items:
+            if isinstance(item, list):  # Children of the entry just before
+                walk(item, path + [title] if title else path)
+                continue
+            title = item.title
+            try:
+                starts.append((reader.get_destination_page_number(item) + 1, " > ".join(path + [title])))
+            except Exception:
+                pass  # Entries pointing at actions or external files have no page
+
+    try:
+        walk(reader.outline, [])
+    except Exception:
+        return []
+    return sorted(starts, key=lambda start: start[0])
+
+@register_extractor(".pdf")
+def extract_pdf(path: Path) -> Iterator[TextBlock]:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ImportError(f"Extracting {path.name} needs pypdf: pip install pypdf") from None
+    reader = PdfReader(path)
+    outline = _pdf_outline(reader)
+    first_pages = [page for page, _ in outline]
+    for number, page in enumerate(reader.pages, 1):
+        text = page.extract_text() or ""
+        if text.strip():
+            at = bisect_right(first_pages, number) - 1
+            yield TextBlock(text + "\n\n", number, outline[at][1] if at >= 0 else None)
+
+# --- CHUNKING ---
+
+def iter_document_chunks(
+    filename: str, chunk_size: int = CHUNK_SIZE, chunker: Optional["SentenceChunker"] = None
+) -> Iterator[Tuple[str, Dict]]:
+    """
+    Chunks a structured document into (text, {"page", "section"}).
+    Consecutive blocks on the same page and under the same heading are
+    chunked as one stream, so no chunk straddles a page or section boundary
+    (the sentence chunker's flush also stops overlap from crossing one).
+    """
+    for (page, section), blocks in groupby(extract(filename), key=lambda block: (block.page, block.section)):
+        texts = (block.text for block in blocks)
+        meta = {"page": page, "section": section}
+        chunks = chunker.stream(texts) if chunker is not None else stream_chunker(texts, chunk_size)
+        for chunk in chunks:
+            yield chunk, meta
+
+# --- PARALLEL EXTRACTION ---
+
+def extraction_pool(workers: int = EXTRACT_WORKERS) -> ProcessPoolExecutor:
+    # "spawn", not fork: the API process runs threads (uvicorn, torch,
+    # tokenizers), and a forked copy of a held lock would hang the worker.
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+@contextmanager
+def _data_dir(directory: str):
+    # Spawned workers start with the default DATA_DIR; serial runs must not keep the override
+    original = module2_ingest.DATA_DIR
+    module2_ingest.DATA_DIR = Path(directory)
+    try:
+        yield
+    finally:
+        module2_ingest.DATA_DIR = original
+
+def write_document(task: Tuple[str, Dict, str, Optional[Dict], str]) -> Dict:
+    """
+    Process-pool task: extracts, chunks and writes one file straight into the
+    chunk store (Module 20), so only a small stats dict crosses back to the
+    parent, which then embeds from the memory-mapped store.
+    task = (filename, chunking settings, store directory, fingerprint, data directory).
+    """
+    filename, chunking, store_dir, fingerprint, data_dir = task
+    from module19_bulk_ingest import make_chunker
+    from module20_chunk_store import ChunkStore, iter_chunk_batches
+    start = time.perf_counter()
+    with _data_dir(data_dir):
+        chunks = module2_ingest.iter_chunks(filename, chunking.get("chunk_size", CHUNK_SIZE), make_chunker(chunking))
+        rows = ChunkStore(Path(store_dir)).write_source(filename, iter_chunk_batches(chunks, filename), fingerprint)
+    return {"file": filename, "chunks": rows, "seconds": round(time.perf_counter() - start, 4)}
+
+def profile_document(task: Tuple[str, Dict, str]) -> Dict:
+    """Benchmark task: extracts and chunks one file without storing anything."""
+    filename, chunking, data_dir = task
+    from module19_bulk_ingest import make_chunker
+    start = time.perf_counter()
+    with _data_dir(data_dir):
+        chunks = module2_ingest.iter_chunks(filename, chunking.get("chunk_size", CHUNK_SIZE), make_chunker(chunking))
+        count = chars = 0
+        for chunk in chunks:
+            count += 1
+            chars += len(chunk if isinstance(chunk, str) else chunk[0])
+        size = (module2_ingest.DATA_DIR / filename).stat().st_size
+    return {"file": filename, "format": Path(filename).suffix.lstrip(".") or "txt", "bytes": size,
+            "chunks": count, "chars": chars, "seconds": time.perf_counter() - start}
+
+# --- MIXED-FORMAT CORPUS (benchmarks) ---
+
+_WORDS = (
+    "vpn address password reset helpdesk extension network gateway server policy badge office "
+    "invoice payment vendor quarterly budget approval leave holiday manager contract renewal "
+    "meeting agenda action owner deadline migration access account support ticket schedule"
+).split()
+
+def _prose(rng: random.Random, sentences: int) -> str:
+    return " ".join(" ".join(rng.choices(_WORDS, k=rng.randint(6, 18))).capitalize() + "." for _ in range(sentences))
+
+def _write_docx(path: Path, paragraphs: List[Tuple[str, Optional[str], bool]]):
+    """Minimal WordprocessingML: (text, style or None, page break before) per paragraph."""
+    body = []
+    for text, style, page_break in paragraphs:
+        properties = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ""
+        brk = '<w:r><w:br w:type="page"/></w:r>' if page_break else ""
+        body.append(f'<w:p>{properties}{brk}<w:r><w:t xml:space="preserve">{text}</w:t></w:r></w:p>')
+    document = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                f'<w:document xmlns:w="{_W[1:-1]}"><w:body>{"".join(body)}</w:body></w:document>')
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml",
+                         '<?xml version="1.0" encoding="UTF-8"?>'
+                         '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                         '<Default Extension="xml" ContentType="application/xml"/>'
+                         '<Override PartName="/word/document.xml" ContentType="application/'
+                         'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/></Types>')
+        archive.writestr("word/document.xml", document)
+
+def _write_pdf(path: Path, pages: List[str]):
+    """Minimal text-only PDF (Helvetica, one content stream per page)."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", "", "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        words, lines = text.split(), []
+        for i in range(0, len(words), 14):
+            lines.append(" ".join(words[i : i + 14]).replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)"))
+        stream = "BT /F1 10 Tf 12 TL 50 800 Td " + " ".join(f"({line}) '" for line in lines[:60]) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out, offsets = bytearray(b"%PDF-1.4\n"), []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    path.write_bytes(bytes(out))
+
+def write_mixed_corpus(directory: Path, files_per_format: int = 8, sections: int = 40, seed: int = 42) -> List[str]:
+    """
+    Deterministic corpus of .txt, .md, .html, .csv and .docx files (plus .pdf
+    when pypdf is installed to read them back). Returns their filenames.
+    """
+    rng = random.Random(seed)
+    formats = ["txt", "md", "html", "csv", "docx"] + (["pdf"] if importlib.util.find_spec("pypdf") else [])
+    filenames = []
+    for n in range(files_per_format):
+        parts = [(f"Section {s}: {rng.choice(_WORDS)} {rng.choice(_WORDS)}",
+                  [_prose(rng, 5) for _ in range(3)]) for s in range(sections)]
+        for fmt in formats:
+            name, path = f"doc_{n:03d}.{fmt}", directory / f"doc_{n:03d}.{fmt}"
+            if fmt == "txt":
+                path.write_text("".join(f"{title}\n\n" + "\n\n".join(paras) + "\n\n" for title, paras in parts),
+                                encoding="utf-8")
+            elif fmt == "md":
+                path.write_text("".join(f"## {title}\n\n" + "\n\n".join(paras) + "\n\n" for title, paras in parts),
+                                encoding="utf-8")
+            elif fmt == "html":
+                path.write_text("<html><head><style>p {margin: 0}</style></head><body>" + "".join(
+                    f"<h2>{title}</h2>" + "".join(f"<p>{p}</p>" for p in paras) for title, paras in parts)
+                    + "</body></html>", encoding="utf-8")
+            elif fmt == "csv":
+                with open(path, "w", encoding="utf-8", newline="") as f:
+                    writer = csv.writer(f)
+                    writer.writerow(["ticket", "owner", "status", "notes"])
+                    for s, (title, paras) in enumerate(parts):
+                        for p, para in enumerate(paras):
+                            writer.writerow([f"T-{s * 10 + p}", rng.choice(_WORDS), rng.choice(["open", "closed"]), para])
+            elif fmt == "docx":
+                _write_docx(path, [(text, style, brk) for s, (title, paras) in enumerate(parts)
+                                   for text, style, brk in [(title, "Heading1", s > 0 and s % 4 == 0)]
+                                   + [(p, None, False) for p in paras]])
+            else:
+                _write_pdf(path, [" ".join(title + ". " + " ".join(paras) for title, paras in parts[s : s + 4])
+                                  for s in range(0, sections, 4)])
+            filenames.append(name)
+    return filenames
+
+# --- BENCHMARK ---
+
+def benchmark(directory: Path, filenames: List[str], chunking: Dict, workers: int = EXTRACT_WORKERS) -> Dict:
+    """Extraction + chunking throughput over the corpus: serial vs the process pool, plus per-format rates."""
+    tasks = [(name, chunking, str(directory)) for name in filenames]
+    total_mb = sum((directory / name).stat().st_size for name in filenames) / 1e6
+    results = {}
+
+    start = time.perf_counter()
+    per_file = list(map(profile_document, tasks))
+    serial_s = time.perf_counter() - start
+
+    with extraction_pool(workers) as pool:
+        list(pool.map(profile_document, tasks[:workers]))  # Warm-up: spawn the workers, import the modules
+        start = time.perf_counter()
+        pooled = list(pool.map(profile_document, tasks))
+        pool_s = time.perf_counter() - start
+
+    chunks = sum(r["chunks"] for r in per_file)
+    assert chunks == sum(r["chunks"] for r in pooled), "Pool and serial runs produced different chunks"
+    for mode, seconds in (("serial", serial_s), (f"process_pool_{workers}", pool_s)):
+        results[mode] = {"seconds": round(seconds, 3), "files_per_sec": round(len(tasks) / seconds, 1),
+                         "mb_per_sec": round(total_mb / seconds, 2), "chunks_per_sec": round(chunks / seconds, 1)}
+    for fmt in sorted({r["format"] for r in per_file}):
+        rows = [r for r in per_file if r["format"] == fmt]
+        seconds = sum(r["seconds"] for r in rows)
+        results[fmt] = {"files": len(rows), "mb_per_sec": round(sum(r["bytes"] for r in rows) / 1e6 / seconds, 2),
+                        "chunks": sum(r["chunks"] for r in rows), "ms_per_file": round(seconds * 1000 / len(rows), 2)}
+    return results
+
+if __name__ == "__main__":
+    import sys
+
+    # python module28_extractors.py              -> mixed-format benchmark, fixed-size chunks
+    # python module28_extractors.py --sentence   -> same, with the sentence-aware chunker (Module 18)
+    # python module28_extractors.py FILE [FILE...] -> print the blocks of files under DATA_DIR
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if args:
+        for filename in args:
+            print(f"--- {filename} ---")
+            for block in extract(filename):
+                print(f"[page {block.page}] [{block.section}] {block.text[:120]!r}")
+        sys.exit(0)
+
+    chunking = {"strategy": "sentence"} if "--sentence" in sys.argv else {"strategy": "fixed", "chunk_size": 800}
+    with tempfile.TemporaryDirectory() as directory:
+        filenames = write_mixed_corpus(Path(directory))
+        print(f"--- MIXED-FORMAT CORPUS: {len(filenames)} files, chunking={chunking} ---")
+        for name, row in benchmark(Path(directory), filenames, chunking).items():
+            print(f"    {name:<18} {row}")
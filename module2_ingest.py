@@ -1,15 +1,38 @@
-import pandas as pd
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple, Union, TYPE_CHECKING
+import codecs
 import datetime
+import hashlib
+
+if TYPE_CHECKING:
+    import pandas as pd  # Imported lazily in process_data_pipeline; the streaming path never needs it
+    from module18_chunking import SentenceChunker
 
 # --- CONFIGURATION ---
 DATA_DIR = Path("data")
 CHUNK_SIZE = 200  # Characters per chunk (Simulating token limits)
+READ_WINDOW_BYTES = 1024 * 1024  # Bytes read from disk per window in streaming mode
+BATCH_SIZE = 256  # Chunk records held in memory at once in streaming mode
+# Chunk timestamps are UTC, formatted the same way by the dict path (here) and
+# the Arrow path (Modules 9 and 20), so Chroma metadata never depends on which one ran.
+CREATED_AT_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# A chunk is its text, or (text, {"page": ..., "section": ...}) when it comes
+# from a structured document (PDF, DOCX, HTML, ... via Module 28's extractors).
+Chunk = Union[str, Tuple[str, Dict]]
+
+def split_chunk(chunk: Chunk) -> Tuple[str, Dict]:
+    return (chunk, {}) if isinstance(chunk, str) else chunk
 
 def load_document(filename: str) -> str:
-    """Reads a text file and returns raw string."""
+    """Reads a document and returns raw string (non-text formats go through Module 28's extractors)."""
     file_path = DATA_DIR / filename
+    from module28_extractors import is_plain_text, extract
+    if not is_plain_text(filename):
+        if not file_path.exists():
+            print(f"[!] Error: File {filename} not found in {DATA_DIR}")
+            return ""
+        return "\n\n".join(block.text for block in extract(filename))
     try:
         with open(file_path, "r", encoding="utf-8") as f:
             return f.read()
@@ -25,8 +48,130 @@ def simple_chunker(text: str, size: int) -> List[str]:
     # List comprehension to slice the string
     return [text[i : i + size] for i in range(0, len(text), size)]
 
-def process_data_pipeline(filename: str) -> pd.DataFrame:
+def iter_text_windows(filename: str, window_bytes: int = READ_WINDOW_BYTES) -> Iterator[str]:
+    """
+    Streams a text file as decoded windows instead of loading it whole.
+    An incremental decoder holds back any multi-byte UTF-8 character that is
+    split across two reads, so no window ever contains half a character.
+    """
+    file_path = DATA_DIR / filename
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        with open(file_path, "rb") as f:
+            while raw := f.read(window_bytes):
+                text = decoder.decode(raw)
+                if text:
+                    yield text
+    except FileNotFoundError:
+        print(f"[!] Error: File {filename} not found in {DATA_DIR}")
+        return
+
+    # Flush the decoder (raises UnicodeDecodeError on a truncated final character)
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+def stream_chunker(windows: Iterable[str], size: int) -> Iterator[str]:
+    """
+    Streaming version of simple_chunker.
+    Yields exactly the same chunks, but only keeps one window plus a partial
+    chunk carried over from the previous window in memory.
+    """
+    if size <= 0:
+        raise ValueError(f"Chunk size must be positive, got {size}")
+
+    carry = ""
+    for window in windows:
+        buffer = carry + window
+        cut = len(buffer) - len(buffer) % size
+        for i in range(0, cut, size):
+            yield buffer[i : i + size]
+        carry = buffer[cut:]
+
+    if carry:
+        yield carry
+
+def make_chunk_id(source: str, text: str, occurrence: int = 0) -> str:
+    """
+    Stable chunk ID derived from the source and the chunk's content.
+    `occurrence` disambiguates identical chunks repeated within one source.
+    Unchanged chunks keep their ID across runs, which is what lets
+    re-ingestion skip them.
+    """
+    digest = hashlib.sha1(f"{source}\0{occurrence}\0{text}".encode("utf-8")).hexdigest()
+    return digest[:32]
+
+def iter_chunk_ids(chunks: Iterable[Chunk], source: str) -> Iterator[Tuple[Chunk, str]]:
+    """Pairs each chunk with its content-hash ID (repeats of the same text get distinct IDs)."""
+    seen = {}  # content digest -> times seen so far
+    for chunk in chunks:
+        text, _ = split_chunk(chunk)
+        content_digest = hashlib.sha1(text.encode("utf-8")).digest()
+        occurrence = seen.get(content_digest, 0)
+        seen[content_digest] = occurrence + 1
+        yield chunk, make_chunk_id(source, text, occurrence)
+
+def build_chunk_records(chunks: Iterable[Chunk], source: str) -> Iterator[Dict]:
+    """Attaches metadata (content-hash ID, position, source, timestamp, page/section) to each chunk."""
+    created_at = datetime.datetime.now(datetime.timezone.utc).strftime(CREATED_AT_FORMAT)  # One per ingestion run
+    for i, (chunk, chunk_id) in enumerate(iter_chunk_ids(chunks, source)):
+        text, meta = split_chunk(chunk)
+        yield {
+            "chunk_id": chunk_id,
+            "chunk_index": i,
+            "text": text,
+            "source": source,
+            "created_at": created_at,
+            "char_count": len(text),
+            "page": meta.get("page"),
+            "section": meta.get("section")
+        }
+
+def file_fingerprint(
+    filename: str, chunk_size: int = CHUNK_SIZE, chunker: Optional["SentenceChunker"] = None
+) -> Dict:
+    """Cheap change detector (size + mtime + chunking settings), no file read needed."""
+    stat = (DATA_DIR / filename).stat()
+    settings = chunker.settings() if chunker is not None else {"chunk_size": chunk_size}
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, **settings}
+
+def iter_chunks(
+    filename: str, chunk_size: int = CHUNK_SIZE, chunker: Optional["SentenceChunker"] = None
+) -> Iterator[Chunk]:
+    """
+    Streams the chunks of a file. Pass a module18_chunking.SentenceChunker
+    to chunk on sentence/token boundaries instead of every `chunk_size` characters.
+    Text files yield plain strings; PDF, DOCX, HTML, Markdown and CSV files
+    yield (text, {"page", "section"}) from Module 28's streaming extractors.
+    """
+    from module28_extractors import is_plain_text, iter_document_chunks
+    if not is_plain_text(filename):
+        return iter_document_chunks(filename, chunk_size, chunker)
+    windows = iter_text_windows(filename)
+    return chunker.stream(windows) if chunker is not None else stream_chunker(windows, chunk_size)
+
+def iter_chunk_records(
+    filename: str, chunk_size: int = CHUNK_SIZE, batch_size: int = BATCH_SIZE,
+    chunker: Optional["SentenceChunker"] = None
+) -> Iterator[List[Dict]]:
+    """
+    Streaming ETL: yields chunk records in batches of at most `batch_size`.
+    Records have the same shape as the rows of process_data_pipeline, so peak
+    memory depends on the batch size rather than on the file size.
+    """
+    batch = []
+    for record in build_chunk_records(iter_chunks(filename, chunk_size, chunker), filename):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+def process_data_pipeline(filename: str) -> "pd.DataFrame":
     """Orchestrates the ETL process."""
+    import pandas as pd
     print(f"--- STARTING ETL PIPELINE FOR: {filename} ---")
     
     # 1. EXTRACT
@@ -43,19 +188,15 @@ def process_data_pipeline(filename: str) -> pd.DataFrame:
     # 3. LOAD (Structuring)
     # We add metadata (source, timestamp) to every chunk.
     # This is CRITICAL for RAG so you know *where* the answer came from.
-    data_payload = []
-    for i, chunk in enumerate(chunks):
-        record = {
-            "chunk_id": i,
-            "text": chunk,
-            "source": filename,
-            "created_at": datetime.datetime.now().isoformat(),
-            "char_count": len(chunk)
-        }
-        data_payload.append(record)
+    # chunk_id is a content hash, so re-ingesting an unchanged chunk gives the same ID.
+    # Columns are built in Arrow (Module 20) instead of one dict per chunk:
+    # `source` becomes a pandas Categorical and `created_at` a datetime64 column.
+    import pyarrow as pa
+    from module20_chunk_store import iter_chunk_batches
+    table = pa.Table.from_batches(list(iter_chunk_batches(chunks, filename)))
 
     # Convert to Pandas DataFrame
-    df = pd.DataFrame(data_payload)
+    df = table.to_pandas()
     return df
 
 if __name__ == "__main__":
@@ -71,5 +212,9 @@ if __name__ == "__main__":
         # Verify we can export it (simulating a database save)
         # df_result.to_json("debug_storage.json", orient="records")
         # print("[+] Saved debug snapshot to JSON.")
+
+        # Streaming mode: same chunks, but only one batch in memory at a time
+        streamed = sum(len(batch) for batch in iter_chunk_records("sample_mission.txt"))
+        print(f"[+] Streaming mode produced {streamed} chunks.")
     else:
         print("[!] Pipeline failed.")
\ No newline at end of file
@@ -5,6 +5,11 @@ import time
 # --- CONFIGURATION ---
 OLLAMA_URL = "http://localhost:11434/api/generate"
 MODEL_NAME = "llama3" # Change to "phi3" if you downloaded that instead
+TIMEOUT = (5, 120) # (connect, read) seconds
+
+# Reuse one HTTP connection across calls instead of opening a new one each time.
+# For streaming, concurrency and latency metrics, see the async client in Module 12.
+session = requests.Session()
 
 def query_local_llm(prompt: str) -> str:
     """
@@ -20,7 +25,7 @@ def query_local_llm(prompt: str) -> str:
         start_time = time.time()
         
         # 1. SEND REQUEST (The API Call)
-        response = requests.post(OLLAMA_URL, json=payload)
+        response = session.post(OLLAMA_URL, json=payload, timeout=TIMEOUT)
         response.raise_for_status() # Raise error if status is not 200
         
         # 2. PARSE RESPONSE
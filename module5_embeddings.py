@@ -1,26 +1,32 @@
-from sentence_transformers import SentenceTransformer
 import time
-import numpy as np
 
 # --- CONFIGURATION ---
 # This model is the "standard" for lightweight local RAG.
 # It converts any text into a list of 384 numbers.
 MODEL_NAME = "all-MiniLM-L6-v2"
 
-def load_embedding_model():
-    print(f"--- LOADING EMBEDDING MODEL: {MODEL_NAME} ---")
+def load_embedding_model(model_name: str = MODEL_NAME):
+    print(f"--- LOADING EMBEDDING MODEL: {model_name} ---")
     start = time.time()
-    model = SentenceTransformer(MODEL_NAME)
+    # Imported here: sentence_transformers pulls in torch, which takes seconds to import
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(model_name)
     print(f"[+] Model loaded in {time.time() - start:.2f} seconds.")
     return model
 
 def generate_embedding(model, text: str):
-    """Converts string -> vector"""
+    """
+    Converts string -> vector
+    `model` can also be the EmbeddingCache from Module 10, which only calls
+    the real model for texts it has never seen before.
+    """
     # encode() returns a numpy array
     vector = model.encode(text)
     return vector
 
 if __name__ == "__main__":
+    import numpy as np
+
     # 1. Initialize the Brain
     embedder = load_embedding_model()
     
@@ -1,23 +1,50 @@
-import chromadb
-from chromadb.utils import embedding_functions
-
 # --- CONFIGURATION ---
 # We use a persistent client so our data saves to disk, 
 # rather than vanishing when the script stops.
 DB_PATH = "./chroma_storage"
 COLLECTION_NAME = "local_brain_docs"
 
-def setup_database():
+class EmbedderFunction:
+    """
+    Chroma embedding function backed by one of our embedders (e.g. the shared
+    EmbeddingCache from Module 10), so Chroma never loads a model of its own.
+    """
+
+    def __init__(self, embedder):
+        self.embedder = embedder
+
+    def __call__(self, input):
+        return self.embedder.encode(list(input)).tolist()
+
+def setup_database(client=None, model=None, embedder=None):
+    """
+    Connects to the collection. The shared resource registry (Module 14) passes
+    its own `client` and shared `embedder` so nothing is created twice in one
+    process. Standalone scripts may pass an already-loaded SentenceTransformer
+    `model` instead.
+    """
     print(f"--- INITIALIZING CHROMADB ---")
+    # Imported on first use so importing this module stays cheap
+    import chromadb
+    from chromadb.utils import embedding_functions
     
     # 1. Create a Persistent Client
     # This will create a folder called 'chroma_storage' in your project directory
-    client = chromadb.PersistentClient(path=DB_PATH)
+    if client is None:
+        client = chromadb.PersistentClient(path=DB_PATH)
     
     # 2. Define the Embedding Function
     # Chroma is smart; we can tell it to use the exact model you downloaded in Module 5.
     # It will automatically convert text to vectors when we add/query data.
-    embed_fn = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
+    if embedder is not None:
+        # Loads nothing: the embedder's model (or multi-process engine) starts on first use
+        embed_fn = EmbedderFunction(embedder)
+    else:
+        # Chroma keeps loaded models in a class-level dict; seeding it reuses our copy.
+        models = getattr(embedding_functions.SentenceTransformerEmbeddingFunction, "models", None)
+        if model is not None and isinstance(models, dict):
+            models.setdefault("all-MiniLM-L6-v2", model)
+        embed_fn = embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
     
     # 3. Create or Get Collection
     # A 'collection' is like a table in a relational database.
@@ -31,8 +58,13 @@ def setup_database():
     
     return collection
 
-def seed_database(collection):
-    """Inserts sample data into the database."""
+def seed_database(collection, embedder=None, lexical_index=None):
+    """
+    Inserts sample data into the database.
+    Pass an `embedder` (e.g. the shared EmbeddingCache from Module 10) to
+    upsert precomputed vectors instead of letting Chroma embed them again,
+    and a `lexical_index` (Module 17) to make the docs keyword-searchable too.
+    """
     print("\n--- SEEDING DATABASE ---")
     
     # Let's add 3 distinct "knowledge" chunks
@@ -50,21 +82,33 @@ def seed_database(collection):
     collection.upsert(
         documents=documents,
         ids=ids,
-        metadatas=metadatas
+        metadatas=metadatas,
+        embeddings=embedder.encode(documents) if embedder is not None else None
     )
+    if lexical_index is not None:
+        lexical_index.add(
+            {"chunk_id": i, "text": d, "source": m["source"]} for i, d, m in zip(ids, documents, metadatas)
+        )
     
     print(f"[+] Successfully embedded and stored {len(documents)} documents.")
     print(f"[+] New document count: {collection.count()}")
 
-def search_database(collection, query_text):
+def search_database(collection, query_text, embedder=None):
     """Searches the database using Semantic Similarity."""
     print(f"\n--- QUERYING DATABASE ---")
     print(f"User Question: '{query_text}'")
     
-    results = collection.query(
-        query_texts=[query_text],
-        n_results=1 # We only want the top 1 most relevant result
-    )
+    if embedder is not None:
+        # Repeated questions are served from the embedding cache
+        results = collection.query(
+            query_embeddings=embedder.encode([query_text]),
+            n_results=1
+        )
+    else:
+        results = collection.query(
+            query_texts=[query_text],
+            n_results=1 # We only want the top 1 most relevant result
+        )
     
     # Extracting the best match from the results dictionary
     best_match = results['documents'][0][0]
@@ -77,12 +121,17 @@ def search_database(collection, query_text):
     print(f"    - Distance Score: {distance:.4f}")
 
 if __name__ == "__main__":
+    from module10_embedding_cache import get_embedding_cache
+    from module14_resources import get_lexical_index
+
     # 1. Connect
     db_collection = setup_database()
+    cache = get_embedding_cache()
     
     # 2. Add Data
-    seed_database(db_collection)
+    seed_database(db_collection, embedder=cache, lexical_index=get_lexical_index())
     
     # 3. Search Data
     test_query = "What is the new web address for the virtual private network?"
-    search_database(db_collection, test_query)
\ No newline at end of file
+    search_database(db_collection, test_query, embedder=cache)
+    print(f"\n[+] Embedding cache: {cache.stats()}")
\ No newline at end of file
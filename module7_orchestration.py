@@ -1,12 +1,11 @@
-from langchain_ollama import ChatOllama
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-
 # --- CONFIGURATION ---
 LLM_MODEL = "llama3" # Or phi3, whatever you pulled in Module 4
 
 def test_langchain_primitives():
     print("--- TESTING LANGCHAIN PRIMITIVES ---")
+    from langchain_ollama import ChatOllama
+    from langchain_core.prompts import PromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
     
     # 1. THE LLM (The Engine)
     print(f"[+] Initializing ChatOllama ({LLM_MODEL})...")
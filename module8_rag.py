@@ -1,35 +1,143 @@
-from langchain_ollama import ChatOllama
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
-from langchain_core.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
+from module14_resources import (
+    VECTOR_BACKEND, get_answer_cache, get_embedder, get_llm, get_rag_chain, get_reranker, get_retriever
+)
+from module24_observability import metrics, span
+from typing import AsyncIterator, Dict, Iterator, List, Optional, TYPE_CHECKING
+import asyncio
+import time
+
+if TYPE_CHECKING:
+    from module13_semantic_cache import SemanticCache
+    from module21_context_packing import ContextPacker
+    from module27_reranking import Reranker
 
 # --- CONFIGURATION ---
 LLM_MODEL = "llama3"
-DB_PATH = "./chroma_storage"
-COLLECTION_NAME = "local_brain_docs"
 
-def build_and_run_rag():
+# Helper function to format the retrieved documents into a single string
+# (used when no ContextPacker is configured)
+def format_docs(docs) -> str:
+    return "\n\n".join(doc.page_content for doc in docs)
+
+class RAGPipeline:
+    """
+    Retriever -> (semantic answer cache) -> Prompt -> LLM.
+
+    Exposes invoke/stream/astream like a LangChain runnable. When the answer
+    cache has a similar question with the same retrieved context, the cached
+    answer is returned without calling the LLM. A `packer` (Module 21) turns
+    the retrieved candidates into a deduplicated, token-budgeted context.
+    Pass `info={}` to learn whether a call was served from the cache and,
+    with a packer, how many prompt tokens it used. A `reranker` (Module 27)
+    narrows the retrieved candidates with a cross-encoder before packing.
+    Each call records retrieve/rerank/prompt/generate spans (Module 24).
+    """
+
+    def __init__(self, retriever, answer_chain, answer_cache: Optional["SemanticCache"] = None,
+                 packer: Optional["ContextPacker"] = None, reranker: Optional["Reranker"] = None):
+        self.retriever = retriever
+        self.answer_chain = answer_chain
+        self.answer_cache = answer_cache
+        self.packer = packer
+        self.reranker = reranker
+
+    def _rerank(self, question: str, docs: List, info: Dict) -> List:
+        if self.reranker is None:
+            return docs
+        with span("rerank", items=len(docs)):
+            docs, info["rerank"] = self.reranker.rerank(question, docs)
+        return docs
+
+    def _prepare(self, question: str, docs: List, info: Dict):
+        with span("prompt", items=len(docs)):
+            return self._build_prompt(question, docs, info)
+
+    def _build_prompt(self, question: str, docs: List, info: Dict):
+        from module13_semantic_cache import context_fingerprint
+        if self.packer is not None:
+            texts, info["context"] = self.packer.pack(docs, question)
+        else:
+            texts = [doc.page_content for doc in docs]
+        context_key = context_fingerprint(texts)
+        cached = self.answer_cache.lookup(question, context_key) if self.answer_cache else None
+        info["cache_hit"] = cached is not None
+        return {"context": "\n\n".join(texts), "question": question}, context_key, cached
+
+    def _remember(self, question: str, context_key: str, tokens: List[str]):
+        if self.answer_cache is not None:
+            self.answer_cache.store(question, context_key, "".join(tokens))
+
+    def stream(self, question: str, info: Optional[Dict] = None) -> Iterator[str]:
+        info = {} if info is None else info
+        with span("retrieve"):
+            docs = self.retriever.invoke(question)
+        docs = self._rerank(question, docs, info)
+        inputs, context_key, cached = self._prepare(question, docs, info)
+        if cached is not None:
+            yield cached
+            return
+        tokens = []
+        with span("generate") as generate:
+            for token in self.answer_chain.stream(inputs):
+                if not tokens:
+                    metrics.observe("rag_first_token_seconds", time.perf_counter() - generate.start)
+                tokens.append(token)
+                yield token
+            generate.items = len(tokens)
+        self._remember(question, context_key, tokens)
+
+    async def astream(self, question: str, info: Optional[Dict] = None) -> AsyncIterator[str]:
+        info = {} if info is None else info
+        with span("retrieve"):
+            docs = await self.retriever.ainvoke(question)
+        if self.reranker is not None:
+            # A forward pass is CPU-bound: keep it off the event loop
+            docs = await asyncio.to_thread(self._rerank, question, docs, info)
+        inputs, context_key, cached = self._prepare(question, docs, info)
+        if cached is not None:
+            yield cached
+            return
+        tokens = []
+        with span("generate") as generate:
+            async for token in self.answer_chain.astream(inputs):
+                if not tokens:
+                    metrics.observe("rag_first_token_seconds", time.perf_counter() - generate.start)
+                tokens.append(token)
+                yield token
+            generate.items = len(tokens)
+        self._remember(question, context_key, tokens)
+
+    def invoke(self, question: str, info: Optional[Dict] = None) -> str:
+        return "".join(self.stream(question, info))
+
+def build_rag_chain(use_answer_cache: bool = True, context_tokens: Optional[int] = None, llm=None) -> RAGPipeline:
+    """
+    Builds the RAG pipeline. Use module14_resources.get_rag_chain() to share one
+    instance per process (the Streamlit app and the API in main.py do).
+    `llm` replaces the shared ChatOllama (e.g. one pointed at a stub server).
+    """
     print("--- 1. CONNECTING TO MEMORY (ChromaDB) ---")
-    # We use the exact same embedding model to ensure the math matches
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    
-    # Connect to the database we built in Module 6
-    vector_store = Chroma(
-        collection_name=COLLECTION_NAME,
-        persist_directory=DB_PATH,
-        embedding_function=embeddings
-    )
+    # LangChain is imported here, not at module level, so importing this
+    # module (e.g. from the API server) stays fast.
+    from langchain_core.prompts import PromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
+    from module21_context_packing import CANDIDATES, CONTEXT_TOKENS, ContextPacker, make_token_counter
+    from module27_reranking import RERANK, RERANK_TOP_N
+    # We use the exact same embedding model to ensure the math matches.
+    # It is wrapped in the shared embedding cache (Module 10), a drop-in for HuggingFaceEmbeddings.
+    # Model, Chroma client and LLM come from the shared registry (Module 14).
+    embeddings = get_embedder()
     
-    # Turn the database into a LangChain "Retriever"
-    # k=1 means "Retrieve the top 1 most relevant document chunk"
-    retriever = vector_store.as_retriever(search_kwargs={"k": 1})
-    print(f"[+] Connected to database. Total docs available: {vector_store._collection.count()}")
+    # Connect to the database we built in Module 6 and turn it into a "Retriever".
+    # VECTOR_BACKEND picks Chroma or the in-process NumPy index (Module 16).
+    # We retrieve a wider candidate set (CANDIDATES chunks); the context packer
+    # (Module 21) then decides what fits in the prompt's token budget.
+    # With RERANK=1 we fetch more (RERANK_TOP_N) and a cross-encoder keeps the best few (Module 27).
+    retriever = get_retriever(k=RERANK_TOP_N if RERANK else CANDIDATES)
+    print(f"[+] Connected to database ({VECTOR_BACKEND} backend).")
 
     print("\n--- 2. WAKING UP THE BRAIN (Ollama) ---")
-    # Temperature 0.1 keeps the AI focused and factual, reducing hallucinations
-    llm = ChatOllama(model=LLM_MODEL, temperature=0.1)
+    llm = llm if llm is not None else get_llm()
     
     print("\n--- 3. ASSEMBLING THE RAG PIPELINE ---")
     # This prompt forces the AI to ONLY use the provided context.
@@ -48,34 +156,75 @@ def build_and_run_rag():
     """
     prompt = PromptTemplate.from_template(template)
 
-    # Helper function to format the retrieved documents into a single string
-    def format_docs(docs):
-        return "\n\n".join(doc.page_content for doc in docs)
-
     # THE LCEL CHAIN (The core of modern LangChain)
-    # 1. Takes the user question and passes it to the retriever.
-    # 2. Formats the retrieved docs into the 'context' variable.
-    # 3. Passes the original question into the 'question' variable.
-    # 4. Feeds both to the Prompt -> LLM -> Output Parser.
-    rag_chain = (
-        {"context": retriever | format_docs, "question": RunnablePassthrough()}
-        | prompt
-        | llm
-        | StrOutputParser()
+    # Feeds 'context' and 'question' to the Prompt -> LLM -> Output Parser.
+    # Retrieval runs first inside RAGPipeline, so the semantic cache can
+    # check the retrieved context before we pay for the LLM.
+    answer_chain = prompt | llm | StrOutputParser()
+
+    # Context is packed into a token budget counted with the LLM's tokenizer
+    count_tokens = make_token_counter(llm)
+    packer = ContextPacker(
+        count_tokens,
+        budget=context_tokens or CONTEXT_TOKENS,
+        prompt_overhead=count_tokens(template.format(context="", question=""))
     )
+
+    # One answer cache per process, shared with the chat pipeline (Module 26)
+    answer_cache = get_answer_cache() if use_answer_cache else None
+    reranker = get_reranker() if RERANK else None
+    rag_chain = RAGPipeline(retriever, answer_chain, answer_cache, packer, reranker)
     print("[+] Pipeline assembled successfully.")
+    return rag_chain
+
+# --- STREAMING WITH LATENCY METRICS ---
+# Time-to-first-token (what the user *feels*) is reported separately from
+# total latency (what the LLM actually costs).
+
+def timed_stream(tokens: Iterator[str], timings: Dict) -> Iterator[str]:
+    """Passes tokens through, recording ttft_s and total_s into `timings`."""
+    start = time.perf_counter()
+    for token in tokens:
+        if "ttft_s" not in timings:
+            timings["ttft_s"] = time.perf_counter() - start
+        yield token
+    timings["total_s"] = time.perf_counter() - start
+
+async def atimed_stream(tokens: AsyncIterator[str], timings: Dict) -> AsyncIterator[str]:
+    """Async version of timed_stream, for chain.astream()."""
+    start = time.perf_counter()
+    async for token in tokens:
+        if "ttft_s" not in timings:
+            timings["ttft_s"] = time.perf_counter() - start
+        yield token
+    timings["total_s"] = time.perf_counter() - start
+
+def build_and_run_rag():
+    rag_chain = get_rag_chain()
 
     # --- EXECUTION ---
     print("\n--- 4. INITIATING QUERY ---")
     
-    # Try asking a question that relies entirely on the custom data we seeded in Module 6
-    user_question = "What is the new VPN address for the company?"
-    print(f"User: {user_question}")
-    
-    print("\nProcessing... (Retrieving docs and generating answer)\n")
-    response = rag_chain.invoke(user_question)
-    
-    print(f"LOCAL_BRAIN Agent:\n{response}")
+    # Try asking a question that relies entirely on the custom data we seeded in Module 6.
+    # The second, reworded question should be answered from the semantic cache.
+    for user_question in ["What is the new VPN address for the company?",
+                          "What's the company's new VPN address?"]:
+        print(f"\nUser: {user_question}")
+        
+        print("\nProcessing... (Retrieving docs and generating answer)\n")
+        print("LOCAL_BRAIN Agent:")
+        timings, info = {}, {}
+        for token in timed_stream(rag_chain.stream(user_question, info), timings):
+            print(token, end="", flush=True)
+        
+        print(f"\n\n[+] First token after {timings.get('ttft_s', 0):.2f}s, full answer after {timings['total_s']:.2f}s "
+              f"({'semantic cache hit' if info['cache_hit'] else 'generated'}).")
+        print(f"[+] Context: {info['context']}")
+        if "rerank" in info:
+            print(f"[+] Re-ranking: {info['rerank']}")
+
+    print(f"\n[+] Embedding cache: {get_embedder().stats()}")
+    print(f"[+] Answer cache: {rag_chain.answer_cache.stats()}")
 
 if __name__ == "__main__":
     build_and_run_rag()
\ No newline at end of file
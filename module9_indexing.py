@@ -0,0 +1,286 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+import hashlib
+import json
+import os
+import time
+
+from module24_observability import span
+
+# --- CONFIGURATION ---
+# Embedding is the expensive stage, so we feed the model big batches.
+# Upserts are split into smaller batches to stay under Chroma's request limits.
+EMBED_BATCH_SIZE = 512    # Chunks embedded per pipeline step
+MODEL_BATCH_SIZE = 64     # Batch size used inside SentenceTransformer.encode
+UPSERT_BATCH_SIZE = 1000  # Chunks written to Chroma per upsert call
+DELETE_BATCH_SIZE = 1000  # Stale chunk IDs removed from Chroma per delete call
+
+# One manifest per source file: which chunk IDs are currently stored for it.
+MANIFEST_DIR = Path("./chroma_storage/manifests")
+
+# A "record batch" is either a list of dicts (module2_ingest.iter_chunk_records)
+# or an Arrow RecordBatch read from the columnar chunk store (Module 20).
+
+def _column(records, name: str) -> List:
+    if isinstance(records, list):
+        return [r[name] for r in records]
+    return records.column(name).to_pylist()
+
+def _optional_column(records, name: str) -> List:
+    """Like _column, but all None when the column is missing (records from before Module 28)."""
+    if isinstance(records, list):
+        return [r.get(name) for r in records]
+    if name not in records.schema.names:
+        return [None] * len(records)
+    return records.column(name).to_pylist()
+
+def _metadata(source: str, chunk_index: int, created_at: str, page: Optional[int], section: Optional[str]) -> Dict:
+    metadata = {"source": source, "chunk_index": chunk_index, "created_at": created_at}
+    # Chroma rejects None values: page/section are only set for structured documents
+    if page is not None:
+        metadata["page"] = page
+    if section is not None:
+        metadata["section"] = section
+    return metadata
+
+def _concat(parts: List):
+    if isinstance(parts[0], list):
+        return [r for part in parts for r in part]
+    import pyarrow as pa
+    return pa.concat_batches(parts)  # One copy per embedding batch, not per row
+
+def _select(records, keep: List[bool]):
+    if isinstance(records, list):
+        return [r for r, k in zip(records, keep) if k]
+    import pyarrow as pa
+    return records.filter(pa.array(keep, type=pa.bool_()))
+
+def rebatch(batches: Iterable, size: int) -> Iterator:
+    """Regroups a stream of record batches into batches of exactly `size` (last one may be smaller)."""
+    buffer, buffered = [], 0
+    for batch in batches:
+        buffer.append(batch)
+        buffered += len(batch)
+        while buffered >= size:
+            merged = _concat(buffer)
+            yield merged[:size]
+            rest = merged[size:]
+            buffer, buffered = ([rest] if len(rest) else []), len(rest)
+    if buffered:
+        yield _concat(buffer)
+
+def _timed(batches: Iterable, timings: Dict[str, float]) -> Iterator:
+    """Wraps the chunk stream so time spent reading + chunking is booked to the 'chunk' stage."""
+    iterator = iter(batches)
+    while True:
+        with span("chunk") as chunk:
+            batch = next(iterator, None)
+            chunk.items = len(batch) if batch is not None else None
+        timings["chunk"] += chunk.seconds
+        if batch is None:
+            return
+        yield batch
+
+def upsert_embeddings(collection, records, vectors, batch_size: int, timings: Dict[str, float],
+                      lexical_index=None, texts: Optional[List[str]] = None):
+    """
+    Writes records with precomputed embeddings, so Chroma never re-embeds them.
+    If a BM25 `lexical_index` (Module 17) is given, the same records are added to it.
+    """
+    with span("upsert", items=len(records)) as upsert:
+        _upsert(collection, records, vectors, batch_size, lexical_index, texts)
+    timings["upsert"] += upsert.seconds
+
+def _upsert(collection, records, vectors, batch_size: int, lexical_index=None, texts: Optional[List[str]] = None):
+    # Chroma's client takes Python lists, so Arrow columns are converted here (one
+    # to_pylist per column per batch, not per row; `texts` is reused from the embedding step)
+    ids, sources = _column(records, "chunk_id"), _column(records, "source")
+    texts = texts if texts is not None else _column(records, "text")
+    indexes = _column(records, "chunk_index")
+    if isinstance(records, list):
+        created = _column(records, "created_at")
+    else:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        from module2_ingest import CREATED_AT_FORMAT
+        # Arrow UTC timestamps -> the same strings the dict path writes, formatted in one vectorised call
+        # (cast to whole seconds first: Arrow's %S prints the sub-second digits of a "us" column)
+        seconds = records.column("created_at").cast(pa.timestamp("s", tz="UTC"), safe=False)
+        created = pc.strftime(seconds, format=CREATED_AT_FORMAT).to_pylist()
+    pages, sections = _optional_column(records, "page"), _optional_column(records, "section")
+    for i in range(0, len(ids), batch_size):
+        collection.upsert(
+            ids=ids[i : i + batch_size],
+            documents=texts[i : i + batch_size],
+            embeddings=vectors[i : i + batch_size],
+            metadatas=[
+                _metadata(*fields)
+                for fields in zip(sources[i : i + batch_size], indexes[i : i + batch_size], created[i : i + batch_size],
+                                  pages[i : i + batch_size], sections[i : i + batch_size])
+            ]
+        )
+    if lexical_index is not None:
+        lexical_index.add({"chunk_id": i, "text": t, "source": s} for i, t, s in zip(ids, texts, sources))
+
+def index_chunk_stream(
+    batches: Iterable,
+    collection,
+    model,
+    embed_batch_size: int = EMBED_BATCH_SIZE,
+    upsert_batch_size: int = UPSERT_BATCH_SIZE,
+    lexical_index=None
+) -> Dict:
+    """
+    Embeds a stream of chunk records and upserts them into Chroma.
+
+    The two stages are pipelined: while a background thread upserts batch N,
+    the main thread is already embedding batch N+1. At most one upsert is in
+    flight, so memory stays bounded to roughly two embedding batches.
+    """
+    timings = {"chunk": 0.0, "embed": 0.0, "upsert": 0.0}
+    chunks_indexed = 0
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=1) as upserter:
+        pending = None
+        for records in rebatch(_timed(batches, timings), embed_batch_size):
+            # The encoder's tokenizer needs Python strings: convert the text column once per batch
+            texts = _column(records, "text")
+            with span("embed", items=len(records)) as embed:
+                vectors = model.encode(
+                    texts,
+                    batch_size=MODEL_BATCH_SIZE,
+                    convert_to_numpy=True
+                )
+            timings["embed"] += embed.seconds
+
+            # Wait for the previous upsert before queuing the next one (backpressure)
+            if pending is not None:
+                pending.result()
+            pending = upserter.submit(
+                upsert_embeddings, collection, records, vectors, upsert_batch_size, timings, lexical_index, texts
+            )
+            chunks_indexed += len(records)
+
+        if pending is not None:
+            pending.result()
+
+    duration = time.perf_counter() - start
+    return {
+        "chunks_indexed": chunks_indexed,
+        "seconds": round(duration, 3),
+        "chunks_per_sec": round(chunks_indexed / duration, 1) if duration > 0 else 0.0,
+        "stage_seconds": {stage: round(seconds, 3) for stage, seconds in timings.items()}
+    }
+
+# --- INCREMENTAL RE-INGESTION ---
+
+def _manifest_path(source: str) -> Path:
+    # Hash the source name so any filename maps to a safe, flat file path
+    return MANIFEST_DIR / f"{hashlib.sha1(source.encode('utf-8')).hexdigest()}.json"
+
+def load_manifest(source: str) -> Dict:
+    """Returns the stored manifest for a source, or an empty one if it was never ingested."""
+    try:
+        with open(_manifest_path(source), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"source": source, "fingerprint": None, "chunk_ids": []}
+
+def save_manifest(source: str, chunk_ids: List[str], fingerprint: Optional[Dict] = None):
+    """Writes the manifest atomically (temp file + rename) so a crash never leaves it half-written."""
+    MANIFEST_DIR.mkdir(parents=True, exist_ok=True)
+    path = _manifest_path(source)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"source": source, "fingerprint": fingerprint, "chunk_ids": chunk_ids}, f)
+    os.replace(tmp_path, path)
+
+def sync_chunk_stream(
+    source: str,
+    batches: Iterable,
+    collection,
+    model,
+    fingerprint: Optional[Dict] = None,
+    force: bool = False,
+    lexical_index=None
+) -> Dict:
+    """
+    Incrementally re-ingests one source.
+
+    - If the file fingerprint matches the manifest, nothing is read or embedded.
+    - Chunks whose content-hash ID is already in the manifest are skipped.
+    - Only new or changed chunks are embedded and upserted.
+    - IDs in the manifest that no longer appear in the source are deleted from Chroma.
+    `force=True` ignores the manifest and re-embeds everything.
+    The optional BM25 `lexical_index` receives the same adds and deletes.
+    """
+    manifest = load_manifest(source)
+    if not force and fingerprint is not None and manifest["fingerprint"] == fingerprint:
+        return {
+            "status": "unchanged",
+            "chunks_total": len(manifest["chunk_ids"]),
+            "chunks_skipped": len(manifest["chunk_ids"]),
+            "chunks_indexed": 0,
+            "chunks_deleted": 0,
+            "chunks_per_sec": 0.0,
+            "stage_seconds": {}
+        }
+
+    known_ids = set() if force else set(manifest["chunk_ids"])
+    current_ids = []
+
+    def new_chunks_only():
+        for batch in batches:
+            batch_ids = _column(batch, "chunk_id")
+            current_ids.extend(batch_ids)
+            fresh = _select(batch, [chunk_id not in known_ids for chunk_id in batch_ids])
+            if len(fresh):
+                yield fresh
+
+    stats = index_chunk_stream(new_chunks_only(), collection, model, lexical_index=lexical_index)
+
+    # Remove chunks that disappeared from the source
+    current_set = set(current_ids)
+    stale_ids = [chunk_id for chunk_id in manifest["chunk_ids"] if chunk_id not in current_set]
+    for i in range(0, len(stale_ids), DELETE_BATCH_SIZE):
+        collection.delete(ids=stale_ids[i : i + DELETE_BATCH_SIZE])
+        if lexical_index is not None:
+            lexical_index.delete(stale_ids[i : i + DELETE_BATCH_SIZE])
+
+    # Only record the new state once Chroma has been fully updated
+    save_manifest(source, current_ids, fingerprint)
+    if stats["chunks_indexed"] or stale_ids:
+        from module13_semantic_cache import bump_generation
+        bump_generation()  # Invalidates cached answers (Module 13) built on the old content
+
+    stats.update({
+        "status": "synced",
+        "chunks_total": len(current_ids),
+        "chunks_skipped": len(current_ids) - stats["chunks_indexed"],
+        "chunks_deleted": len(stale_ids)
+    })
+    return stats
+
+if __name__ == "__main__":
+    from module2_ingest import iter_chunk_records, file_fingerprint
+    from module14_resources import get_collection, get_embedder, get_lexical_index
+
+    print("--- INDEXING SAMPLE DOCUMENT ---")
+    db_collection = get_collection()
+    embedder = get_embedder()
+
+    # Run twice: the second pass should skip everything
+    for attempt in (1, 2):
+        stats = sync_chunk_stream(
+            "sample_mission.txt",
+            iter_chunk_records("sample_mission.txt"),
+            db_collection,
+            embedder,
+            fingerprint=file_fingerprint("sample_mission.txt"),
+            lexical_index=get_lexical_index()
+        )
+        print(f"[+] Pass {attempt}: {stats['status']}, indexed {stats['chunks_indexed']}, "
+              f"skipped {stats['chunks_skipped']}, deleted {stats['chunks_deleted']}.")
+        print(f"    Stage timings (s): {stats['stage_seconds']}")